@@ -0,0 +1,37 @@
+from functools import lru_cache
+from auth.credential_manager import get_credential_manager
+from db.database import connect
+from email_service.email_service import EmailService
+from config import DB_PATH
+
+
+def get_credentials():
+    """Shared in-memory credentials, refreshed in the background before they expire."""
+    return get_credential_manager().get_credentials()
+
+
+@lru_cache(maxsize=None)
+def shared_email_service():
+    """The process-wide EmailService on the shared credentials.
+
+    Its Gmail client, transports and quota limiter are built once; the httplib2
+    connections behind them are kept per worker thread, and the credentials are
+    refreshed in place, so none of it goes stale.
+    """
+    return EmailService(get_credentials())
+
+
+def get_email_service():
+    """The shared EmailService, with rules, keywords and the classifier reloaded if they changed."""
+    email_service = shared_email_service()
+    email_service.refresh()
+    return email_service
+
+
+def get_db_connection():
+    """A pooled connection for the request, returned to the pool when the response is sent."""
+    conn = connect(DB_PATH)
+    try:
+        yield conn
+    finally:
+        conn.close()
@@ -1,10 +1,11 @@
 from fastapi import FastAPI
-from api.routers import auth
+from api.routers import auth, emails
 
 app = FastAPI()
 
 # Include the auth router
 app.include_router(auth.router, prefix="/auth", tags=["auth"])
+app.include_router(emails.router, prefix="/emails", tags=["emails"])
 
 @app.get("/")
 async def root():
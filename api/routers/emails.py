@@ -0,0 +1,20 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from api.dependencies import get_email_service, get_db_connection
+from email_service.email_service import EmailService
+from email_service.search import search_emails
+from config import SEARCH_PAGE_SIZE
+
+router = APIRouter()
+
+@router.post("/sync")
+def sync_emails(email_service: EmailService = Depends(get_email_service)):
+    try:
+        summary = email_service.sync_incremental()
+        return {"status": "success", "summary": summary}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/search")
+def search(q: str = Query(..., min_length=1), page: int = Query(1, ge=1),
+           per_page: int = Query(SEARCH_PAGE_SIZE, ge=1, le=100), conn=Depends(get_db_connection)):
+    return search_emails(conn, q, page, per_page)
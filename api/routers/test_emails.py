@@ -0,0 +1,63 @@
+from fastapi.testclient import TestClient
+from api.main import app
+from api.dependencies import get_email_service, get_db_connection, shared_email_service
+from db.database import Database
+from unittest.mock import Mock, patch
+import sqlite3
+
+client = TestClient(app)
+
+def test_sync_emails_success():
+    email_service = Mock()
+    email_service.sync_incremental.return_value = {'added': 2, 'deleted': 0, 'relabeled': 1, 'full_resync': False}
+    app.dependency_overrides[get_email_service] = lambda: email_service
+    try:
+        response = client.post("/emails/sync")
+    finally:
+        app.dependency_overrides.clear()
+    assert response.status_code == 200
+    assert response.json() == {"status": "success",
+                               "summary": {'added': 2, 'deleted': 0, 'relabeled': 1, 'full_resync': False}}
+
+def test_sync_emails_failure():
+    email_service = Mock()
+    email_service.sync_incremental.side_effect = Exception("Sync failed")
+    app.dependency_overrides[get_email_service] = lambda: email_service
+    try:
+        response = client.post("/emails/sync")
+    finally:
+        app.dependency_overrides.clear()
+    assert response.status_code == 500
+    assert response.json() == {"detail": "Sync failed"}
+
+def test_email_service_is_built_once_per_process_and_refreshed_per_request():
+    shared_email_service.cache_clear()
+    try:
+        with patch('api.dependencies.get_credentials', return_value='creds'), \
+             patch('api.dependencies.EmailService') as mock_service:
+            first, second = get_email_service(), get_email_service()
+    finally:
+        shared_email_service.cache_clear()
+    assert first is second
+    mock_service.assert_called_once_with('creds')
+    assert first.refresh.call_count == 2
+
+def test_search_emails(tmpdir):
+    db = Database(str(tmpdir.join("test_taskeroo.db")))
+    conn = sqlite3.connect(db.db_path, check_same_thread=False)
+    conn.executemany("INSERT INTO emails (id, subject, sender_email, email_body) VALUES (?, ?, ?, ?)",
+                     [('m1', 'Summer sale', 'deals@shop.com', 'Everything must go'),
+                      ('m2', 'Lunch', 'friend@example.com', 'After the sale?')])
+    conn.commit()
+    app.dependency_overrides[get_db_connection] = lambda: conn
+    try:
+        response = client.get("/emails/search", params={"q": "sale", "per_page": 1})
+        missing_query = client.get("/emails/search")
+    finally:
+        app.dependency_overrides.clear()
+        conn.close()
+    assert response.status_code == 200
+    body = response.json()
+    assert (body['total'], body['ranked'], body['page'], body['per_page']) == (2, 2, 1, 1)
+    assert [email['id'] for email in body['results']] == ['m1']
+    assert missing_query.status_code == 422
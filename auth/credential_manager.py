@@ -0,0 +1,104 @@
+# taskeroo/auth/credential_manager.py
+import logging
+import threading
+from datetime import datetime
+from google.auth.transport.requests import Request
+from google.auth.exceptions import RefreshError
+from auth.gmail_auth import GmailAuth, GmailAuthError
+from config import TOKEN_REFRESH_MARGIN
+
+# Wait before retrying a background refresh that failed for a transient reason
+REFRESH_RETRY_SECONDS = 30
+
+
+class CredentialManager:
+    """Keep Gmail credentials in memory and refresh them in the background before they expire.
+
+    Every caller shares one Credentials object, so API handlers and fetch workers
+    never unpickle token.pickle or refresh inline; a single lock serialises refreshes.
+    """
+
+    logger = logging.getLogger(__name__)
+
+    def __init__(self, gmail_auth=None, refresh_margin=TOKEN_REFRESH_MARGIN, now=datetime.utcnow,
+                 timer_factory=threading.Timer):
+        self.gmail_auth = gmail_auth or GmailAuth()
+        self.refresh_margin = refresh_margin
+        self.now = now
+        self.timer_factory = timer_factory
+        self.creds = None
+        self.lock = threading.Lock()
+        self.timer = None
+
+    def get_credentials(self):
+        """Return the shared credentials, loading them on first use."""
+        if self.creds is None:
+            with self.lock:
+                if self.creds is None:
+                    self.creds = self.gmail_auth.authenticate()
+                    self._schedule_refresh()
+        if self.needs_refresh():
+            self.refresh()
+        return self.creds
+
+    def seconds_until_refresh(self):
+        """Seconds until the token enters the refresh margin, or None if it never expires."""
+        expiry = getattr(self.creds, 'expiry', None)
+        if expiry is None:
+            return None
+        return (expiry - self.now()).total_seconds() - self.refresh_margin
+
+    def needs_refresh(self):
+        remaining = self.seconds_until_refresh()
+        return remaining is not None and remaining <= 0
+
+    def refresh(self):
+        """Refresh and persist the token unless another thread already did."""
+        with self.lock:
+            if not self.needs_refresh():
+                return self.creds
+            if not getattr(self.creds, 'refresh_token', None):
+                raise GmailAuthError("Token is about to expire and no refresh token is available. Please log in again.")
+            self.creds.refresh(Request())
+            self.gmail_auth.save_credentials(self.creds)
+            self.logger.info(f"Refreshed Gmail token; it now expires at {self.creds.expiry}")
+            self._schedule_refresh()
+            return self.creds
+
+    def stop(self):
+        """Cancel the pending background refresh."""
+        if self.timer:
+            self.timer.cancel()
+            self.timer = None
+
+    def _schedule_refresh(self, delay=None):
+        if delay is None:
+            delay = self.seconds_until_refresh()
+        if delay is None:
+            return
+        self.stop()
+        self.timer = self.timer_factory(max(0, delay), self._background_refresh)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _background_refresh(self):
+        try:
+            self.refresh()
+        except RefreshError as e:
+            self.logger.error(f"Background token refresh was rejected: {e}")
+        except Exception as e:
+            self.logger.warning(f"Background token refresh failed, retrying in {REFRESH_RETRY_SECONDS}s: {e}")
+            self._schedule_refresh(REFRESH_RETRY_SECONDS)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_credential_manager():
+    """Return the process-wide CredentialManager."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = CredentialManager()
+        return _manager
@@ -1,6 +1,8 @@
 # taskeroo/gmail_auth.py
 import os.path
 import pickle
+import logging
+import tempfile
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
@@ -13,6 +15,7 @@ class GmailAuthError(Exception):
 
 class GmailAuth:
     SCOPES = ['https://www.googleapis.com/auth/gmail.readonly']
+    logger = logging.getLogger(__name__)
 
     def load_credentials(self):
         """Load credentials from the token.pickle file if it exists."""
@@ -26,10 +29,21 @@ class GmailAuth:
         return None    
 
     def save_credentials(self, creds):
-        """Save credentials to the token.pickle file."""
+        """Save credentials to the token.pickle file.
+
+        The pickle is written to a temporary file and renamed into place, so a reader
+        never sees a half-written token even while another thread is saving.
+        """
         try:
-            with open('token.pickle', 'wb') as token:
-                pickle.dump(creds, token)
+            fd, tmp_path = tempfile.mkstemp(prefix='token.pickle.', dir='.')
+            try:
+                with os.fdopen(fd, 'wb') as token:
+                    pickle.dump(creds, token)
+                os.replace(tmp_path, 'token.pickle')
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
         except IOError as e:
             self.logger.error(f"Failed to save credentials: {e}")
             raise GmailAuthError(f"Failed to save credentials: {e}")
@@ -0,0 +1,100 @@
+# taskeroo/auth/test_credential_manager.py
+import threading
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+from auth.credential_manager import CredentialManager
+from auth.gmail_auth import GmailAuthError
+
+NOW = datetime(2024, 7, 25, 12, 0, 0)
+
+
+class FakeCreds:
+    def __init__(self, expires_in, refresh_token='refresh_token'):
+        self.expiry = NOW + timedelta(seconds=expires_in)
+        self.refresh_token = refresh_token
+        self.refresh_calls = 0
+
+    def refresh(self, request):
+        self.refresh_calls += 1
+        self.expiry = NOW + timedelta(hours=1)
+
+
+class FakeTimer:
+    started = []
+
+    def __init__(self, delay, callback):
+        self.delay = delay
+        self.callback = callback
+        FakeTimer.started.append(self)
+
+    def start(self):
+        pass
+
+    def cancel(self):
+        pass
+
+
+@pytest.fixture
+def gmail_auth():
+    return MagicMock()
+
+
+def make_manager(gmail_auth, creds):
+    gmail_auth.authenticate.return_value = creds
+    FakeTimer.started = []
+    return CredentialManager(gmail_auth, refresh_margin=300, now=lambda: NOW, timer_factory=FakeTimer)
+
+
+def test_credentials_are_loaded_once(gmail_auth):
+    creds = FakeCreds(expires_in=3600)
+    manager = make_manager(gmail_auth, creds)
+
+    assert manager.get_credentials() is creds
+    assert manager.get_credentials() is creds
+    gmail_auth.authenticate.assert_called_once()
+
+
+def test_refresh_is_scheduled_before_expiry(gmail_auth):
+    manager = make_manager(gmail_auth, FakeCreds(expires_in=3600))
+    manager.get_credentials()
+
+    assert FakeTimer.started[-1].delay == 3300
+
+
+def test_background_refresh_refreshes_and_persists(gmail_auth):
+    creds = FakeCreds(expires_in=3600)
+    manager = make_manager(gmail_auth, creds)
+    manager.get_credentials()
+    creds.expiry = NOW + timedelta(seconds=60)
+
+    FakeTimer.started[-1].callback()
+
+    assert creds.refresh_calls == 1
+    gmail_auth.save_credentials.assert_called_once_with(creds)
+    assert FakeTimer.started[-1].delay == 3300
+
+
+def test_concurrent_refreshes_run_once(gmail_auth):
+    creds = FakeCreds(expires_in=3600)
+    manager = make_manager(gmail_auth, creds)
+    manager.get_credentials()
+    creds.expiry = NOW + timedelta(seconds=60)
+
+    threads = [threading.Thread(target=manager.get_credentials) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert creds.refresh_calls == 1
+    gmail_auth.save_credentials.assert_called_once()
+
+
+def test_refresh_without_refresh_token_fails(gmail_auth):
+    manager = make_manager(gmail_auth, FakeCreds(expires_in=3600, refresh_token=None))
+    manager.get_credentials()
+    manager.creds.expiry = NOW
+
+    with pytest.raises(GmailAuthError):
+        manager.refresh()
@@ -0,0 +1,113 @@
+# benchmarks/bench_categorization_memo.py
+"""Compare keyword scoring with and without the categorization memo, and with the previous memo
+(regex-normalized keys and a SELECT per LRU miss), as the share of templated mail varies.
+
+    python benchmarks/bench_categorization_memo.py --templated 0 0.5 0.9
+"""
+import argparse
+import hashlib
+import os
+import random
+import re
+import string
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.database import Database
+from email_service.email_service import EmailService, load_keywords
+from email_service.categorization_memo import CategorizationMemo, MEMO_FIELDS
+from config import EMAIL_BODY_TRUNCATION_LENGTH
+
+NON_WORD = re.compile(r'[\W_]+')
+DIGITS = re.compile(r'\d+')
+
+
+def legacy_key(version, email):
+    """The previous key: every field reduced to lower-case words by two regex passes."""
+    digest = hashlib.sha1(version.encode('utf-8'))
+    for field in MEMO_FIELDS:
+        text = DIGITS.sub('0', (email.get(field) or '').lower())
+        digest.update(b'\x1e' + NON_WORD.sub(' ', text).strip().encode('utf-8'))
+    labels = ','.join(sorted(set((email.get('label_ids') or '').split(','))))
+    digest.update(f"\x1e{labels}\x1e{bool(email.get('is_read'))}:{bool(email.get('is_important'))}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def legacy_scores(cache, db, version, email, compute):
+    """The previous lookup: the LRU, then a one-row SELECT on a pooled connection, then compute."""
+    key = legacy_key(version, email)
+    scores = cache.get(key)
+    if scores is None:
+        conn = db.connect()
+        try:
+            row = conn.execute("SELECT scores FROM categorization_memo WHERE hash = ?", (key,)).fetchone()
+        finally:
+            conn.close()
+        scores = cache[key] = dict(compute(email)) if row is None else row[0]
+    return scores
+
+
+def sample_emails(count, templated, rng):
+    """count emails; the templated share repeats 20 digests that differ only in dates and counts."""
+    vocabulary = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(5000)]
+    words = lambda n: ' '.join(rng.choice(vocabulary) for _ in range(n))
+    templates = [(words(6), words(400)) for _ in range(20)]
+    emails = []
+    for i in range(count):
+        if rng.random() < templated:
+            subject, body = rng.choice(templates)
+            day, stories = rng.randint(10, 28), rng.randint(10, 99)
+            subject, body = f'{subject} for Oct {day}', f'{stories} new stories {body}'
+        else:
+            subject, body = words(6), words(400)
+        emails.append({'subject': subject, 'email_body': body[:EMAIL_BODY_TRUNCATION_LENGTH],
+                       'sender_email': f'news@sender{rng.randrange(50)}.example.com', 'label_ids': 'INBOX,UNREAD'})
+    return emails
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--templated', type=float, nargs='+', default=[0, 0.5, 0.9],
+                        help='Share of emails that repeat a template')
+    parser.add_argument('--emails', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    service = EmailService.parser(load_keywords())
+    print(f"{'templated':>9} {'no memo us':>11} {'legacy us':>10} {'memo us':>8} {'restart us':>11} {'speedup':>8}")
+    for templated in args.templated:
+        emails = sample_emails(args.emails, templated, rng)
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(os.path.join(tmp, 'bench.db'))
+            best = lambda fn: min(timeit.repeat(fn, number=1, repeat=3))
+            direct = best(lambda: [service.score_email(email) for email in emails])
+
+            version = CategorizationMemo(service.matcher).version
+            legacy = best(lambda: [legacy_scores(cache, db, version, email, service.score_email)
+                                   for cache in [{}] for email in emails])
+
+            # Each repeat starts from an empty memo and table
+            current = best(lambda: [memo.scores(email, service.score_email)
+                                    for memo in [CategorizationMemo(service.matcher, db)] for email in emails])
+            memo = CategorizationMemo(service.matcher, db)
+            for email in emails:
+                memo.scores(email, service.score_email)
+            conn = db.connect()
+            memo.flush(conn)
+            conn.commit()
+            conn.close()
+
+            # A new process: the memo warms its LRU from the table in one query
+            restart = best(lambda: [restarted.scores(email, service.score_email)
+                                    for restarted in [CategorizationMemo(service.matcher, db)] for email in emails])
+        per_email = lambda seconds: seconds / len(emails) * 1e6
+        print(f"{templated:>9.0%} {per_email(direct):>11.1f} {per_email(legacy):>10.1f} {per_email(current):>8.1f} "
+              f"{per_email(restart):>11.1f} {direct / current:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+# benchmarks/bench_decode_body.py
+"""Compare full-payload body decoding with the bounded decode path on large synthetic emails.
+
+    python benchmarks/bench_decode_body.py --sizes 10000 1000000 5000000
+"""
+import argparse
+import base64
+import logging
+import os
+import sys
+import timeit
+from email import message_from_bytes
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_service.email_service import EmailService
+from config import EMAIL_BODY_TRUNCATION_LENGTH
+
+
+def legacy_get_email_body(payload):
+    """The previous implementation: decode the first text part in full, MIME-parse it, then truncate."""
+    if 'body' in payload and 'data' in payload['body']:
+        return legacy_decode_body(payload['body']['data'])
+    for part in payload.get('parts', []):
+        if part['mimeType'] in ['text/plain', 'text/html']:
+            return legacy_decode_body(part['body'].get('data', ''))
+        elif 'parts' in part:
+            body = legacy_get_email_body(part)
+            if body:
+                return body
+    return ''
+
+
+def legacy_decode_body(data):
+    email_msg = message_from_bytes(base64.urlsafe_b64decode(data))
+    if email_msg.is_multipart():
+        for part in email_msg.walk():
+            if part.get_content_type() in ['text/plain', 'text/html']:
+                return part.get_payload(decode=True).decode('utf-8', errors='replace')
+    return email_msg.get_payload(decode=True).decode('utf-8', errors='replace')
+
+
+def newsletter_payload(size):
+    """A multipart/alternative newsletter with an HTML part first and a plain-text part of size characters."""
+    html = ('<table><tr><td style="font-family:Arial">Weekly deals on everything</td></tr></table>' * size)[:size]
+    text = ('Weekly deals on everything, up to 50% off this week only. ' * size)[:size]
+    encode = lambda s: base64.urlsafe_b64encode(s.encode()).decode()
+    return {
+        'mimeType': 'multipart/alternative',
+        'body': {'size': 0},
+        'parts': [
+            {'mimeType': 'text/html', 'body': {'data': encode(html)}},
+            {'mimeType': 'text/plain', 'body': {'data': encode(text)}},
+        ],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 1_000_000, 5_000_000],
+                        help='Characters in each synthetic body part')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    service = EmailService.__new__(EmailService)
+    print(f"{'size':>10} {'legacy ms':>12} {'bounded ms':>12} {'speedup':>9}")
+    for size in args.sizes:
+        payload = newsletter_payload(size)
+        legacy = min(timeit.repeat(lambda: legacy_get_email_body(payload)[:EMAIL_BODY_TRUNCATION_LENGTH],
+                                   number=1, repeat=args.repeat))
+        bounded = min(timeit.repeat(lambda: service.get_email_body(payload), number=1, repeat=args.repeat))
+        print(f"{size:>10} {legacy * 1000:>12.2f} {bounded * 1000:>12.3f} {legacy / bounded:>8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
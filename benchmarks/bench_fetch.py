@@ -0,0 +1,100 @@
+# benchmarks/bench_fetch.py
+"""Measure EmailService.fetch_emails throughput against a recorded Gmail session, offline.
+
+Record a session first with GMAIL_RECORD_PATH=session.jsonl python cli.py fetch --date=...
+or let the benchmark synthesise one:
+
+    python benchmarks/bench_fetch.py --recording session.jsonl --latency 0.05
+    python benchmarks/bench_fetch.py --synthetic 2000 --latency 0.05 --error-rate 0.02
+"""
+import argparse
+import base64
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def write_synthetic_recording(path, count, query='', page_size=500):
+    """Write a recording of count inbox messages (and an empty trash) listed page_size at a time."""
+    from email_service.replay import request_key
+
+    def list_key(label_ids, page_token):
+        params = {'userId': 'me', 'q': query, 'maxResults': page_size}
+        if label_ids:
+            params['labelIds'] = label_ids
+        if page_token:
+            params['pageToken'] = page_token
+        return request_key('users.messages.list', params)
+
+    body = base64.urlsafe_b64encode(('Your order has shipped. ' * 200).encode()).decode()
+    with open(path, 'w') as f:
+        for start in range(0, count, page_size):
+            page = {'messages': [{'id': f'm{i}'} for i in range(start, min(start + page_size, count))]}
+            if start + page_size < count:
+                page['nextPageToken'] = f'p{start + page_size}'
+            f.write(json.dumps({'key': list_key(None, f'p{start}' if start else None), 'response': page}) + '\n')
+        f.write(json.dumps({'key': list_key(['TRASH'], None), 'response': {}}) + '\n')
+        for i in range(count):
+            message = {
+                'id': f'm{i}', 'threadId': f't{i}', 'labelIds': ['INBOX', 'UNREAD', 'CATEGORY_UPDATES'],
+                'snippet': 'Your order has shipped', 'internalDate': str(1721900000000 + i),
+                'payload': {
+                    'mimeType': 'text/plain',
+                    'headers': [{'name': 'Subject', 'value': f'Order {i} shipped'},
+                                {'name': 'From', 'value': 'Shop <orders@shop.example.com>'},
+                                {'name': 'Date', 'value': 'Thu, 25 Jul 2024 10:00:00 +0000'}],
+                    'body': {'data': body, 'size': len(body)},
+                },
+            }
+            key = request_key('users.messages.get', {'id': f'm{i}'})
+            f.write(json.dumps({'key': key, 'response': message}) + '\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--recording', help='JSON Lines recording captured with GMAIL_RECORD_PATH')
+    source.add_argument('--synthetic', type=int, help='Number of synthetic messages to generate')
+    parser.add_argument('--latency', type=float, default=0.0, help='Seconds added to every round trip')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Probability of an injected 429 per call')
+    parser.add_argument('--query', default='', help='Gmail query the recording was made with')
+    parser.add_argument('--quota', type=int, help='Quota units per second (0 disables the limiter)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='taskeroo-bench-')
+    recording = args.recording
+    if args.synthetic:
+        recording = os.path.join(workdir, 'synthetic.jsonl')
+        write_synthetic_recording(recording, args.synthetic, query=args.query)
+
+    # config reads the environment at import time, so set it before importing the service
+    os.environ['GMAIL_REPLAY_PATH'] = recording
+    os.environ['GMAIL_REPLAY_LATENCY'] = str(args.latency)
+    os.environ['GMAIL_REPLAY_ERROR_RATE'] = str(args.error_rate)
+    os.environ['DB_PATH'] = os.path.join(workdir, 'bench.db')
+    os.environ.setdefault('FETCH_BACKOFF_BASE', '0.01')
+    if args.quota is not None:
+        os.environ['GMAIL_QUOTA_UNITS_PER_SECOND'] = str(args.quota)
+
+    import builtins
+    from email_service.email_service import EmailService
+
+    email_service = EmailService(None)
+    quiet_print, builtins.print = builtins.print, lambda *a, **k: None
+    started = time.perf_counter()
+    try:
+        count = email_service.fetch_emails(query=args.query)
+    finally:
+        builtins.print = quiet_print
+    elapsed = time.perf_counter() - started
+
+    print(f"Fetched {count} messages in {elapsed:.2f}s ({count / elapsed:.1f} msg/s)")
+    print(f"Replayed {email_service.service.calls} API calls, {len(email_service.batch_fetcher.failed)} failed")
+
+
+if __name__ == '__main__':
+    main()
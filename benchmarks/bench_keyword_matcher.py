@@ -0,0 +1,78 @@
+# benchmarks/bench_keyword_matcher.py
+"""Compare the per-keyword substring scan in categorize_email with the compiled keyword matcher
+as the keyword file grows.
+
+    python benchmarks/bench_keyword_matcher.py --keywords 80 1000 5000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from email_service.email_service import load_keywords
+from email_service.keyword_matcher import KeywordMatcher
+from config import EMAIL_BODY_TRUNCATION_LENGTH
+
+
+def legacy_category_counts(keywords, subject, body, sender):
+    """The previous implementation: three lower-cased substring scans per keyword."""
+    subject, body, sender = subject.lower(), body.lower(), sender.lower()
+    counts = {}
+    for category, category_keywords in keywords.items():
+        for keyword in category_keywords:
+            if keyword.lower() in subject or keyword.lower() in body or keyword.lower() in sender:
+                counts[category] = counts.get(category, 0) + 1
+    return counts
+
+
+def grow_keywords(base, total, rng):
+    """The real keyword file padded with random words and two-word phrases up to total keywords."""
+    keywords = {category: list(words) for category, words in base.items()}
+    categories = list(keywords)
+    word = lambda: ''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9)))
+    count = sum(len(words) for words in keywords.values())
+    while count < total:
+        keyword = word() if rng.random() < 0.8 else f"{word()} {word()}"
+        keywords[rng.choice(categories)].append(keyword)
+        count += 1
+    return keywords
+
+
+def sample_email(keywords, rng):
+    vocabulary = [keyword for words in keywords.values() for keyword in words][:200]
+    filler = 'Thanks for your order from our store, details and tracking are below '.split()
+    words = [rng.choice(vocabulary) if rng.random() < 0.05 else rng.choice(filler) for _ in range(400)]
+    body = ' '.join(words)[:EMAIL_BODY_TRUNCATION_LENGTH]
+    return 'Your weekly digest: 20% off today only', body, 'deals@shop.example.com'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--keywords', type=int, nargs='+', default=[80, 1000, 5000],
+                        help='Total keywords after padding the real keyword file')
+    parser.add_argument('--emails', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    base = load_keywords()
+    print(f"{'keywords':>9} {'compile ms':>11} {'legacy us':>11} {'matcher us':>11} {'speedup':>8}")
+    for total in args.keywords:
+        keywords = grow_keywords(base, total, rng)
+        emails = [sample_email(keywords, rng) for _ in range(args.emails)]
+        compile_s = min(timeit.repeat(lambda: KeywordMatcher(keywords), number=1, repeat=3))
+        matcher = KeywordMatcher(keywords)
+        legacy = min(timeit.repeat(lambda: [legacy_category_counts(keywords, *email) for email in emails],
+                                   number=1, repeat=3)) / len(emails)
+        compiled = min(timeit.repeat(lambda: [matcher.category_counts(*email) for email in emails],
+                                     number=1, repeat=3)) / len(emails)
+        print(f"{total:>9} {compile_s * 1000:>11.1f} {legacy * 1e6:>11.1f} {compiled * 1e6:>11.1f} "
+              f"{legacy / compiled:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
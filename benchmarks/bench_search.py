@@ -0,0 +1,71 @@
+# benchmarks/bench_search.py
+"""Time full-text search against counting the same word with a LIKE scan, on a synthetic mailbox.
+
+    python benchmarks/bench_search.py --emails 1000000 --queries "invoice" "summer sale" "acme*"
+"""
+import argparse
+import os
+import random
+import sqlite3
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.database import Database
+from email_service.search import search_emails
+
+FIXED_WORDS = ['invoice', 'summer', 'sale', 'acme', 'acmecorp', 'meeting', 'lunch', 'receipt']
+
+
+def synthetic_rows(count, rng):
+    vocabulary = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(20000)]
+    words = lambda n: ' '.join(rng.choice(vocabulary) if rng.random() > 0.01 else rng.choice(FIXED_WORDS)
+                               for _ in range(n))
+    for i in range(count):
+        yield (f'{i:08d}', words(8), f'news@sender{rng.randrange(5000)}.example.com', words(20), words(150))
+
+
+def timed(fn, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--emails', type=int, default=200000)
+    parser.add_argument('--queries', nargs='+', default=['invoice', 'summer sale', '"summer sale"', 'acme*'])
+    parser.add_argument('--max-ranked', type=int, nargs='+', default=[5000, 1000000000])
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, 'bench.db'))
+        conn = sqlite3.connect(db.db_path)
+        started = time.perf_counter()
+        conn.executemany("INSERT INTO emails (id, subject, sender_email, snippet, email_body) VALUES (?, ?, ?, ?, ?)",
+                         synthetic_rows(args.emails, random.Random(args.seed)))
+        conn.commit()
+        print(f"Stored and indexed {args.emails:,} emails in {time.perf_counter() - started:.1f}s")
+
+        print(f"{'query':<20} {'matches':>9} {'ranked':>10} {'page 1 ms':>10} {'page 10 ms':>11} {'LIKE ms':>9}")
+        for query in args.queries:
+            word = query.strip('"*').split()[0]
+            like = timed(lambda: conn.execute("SELECT COUNT(*) FROM emails WHERE subject LIKE ? OR email_body LIKE ?",
+                                              (f'%{word}%', f'%{word}%')).fetchone(), repeat=1)
+            for max_ranked in args.max_ranked:
+                result = search_emails(conn, query, max_ranked=max_ranked)
+                first = timed(lambda: search_emails(conn, query, max_ranked=max_ranked))
+                tenth = timed(lambda: search_emails(conn, query, page=10, max_ranked=max_ranked))
+                print(f"{query:<20} {result['total']:>9,} {result['ranked']:>10,} {first:>10.1f} {tenth:>11.1f} {like:>9.1f}")
+        conn.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# benchmarks/bench_store.py
+"""Time storing emails with a commit per email against the batched writer, on a file database.
+
+    python benchmarks/bench_store.py --emails 2000 --batch-sizes 1 50 200
+"""
+import argparse
+import os
+import random
+import sqlite3
+import string
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from db.database import Database
+from email_service.email_service import EmailService
+from email_service.email_writer import EmailWriter
+
+
+def synthetic_rows(count, rng):
+    vocabulary = [''.join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9))) for _ in range(5000)]
+    words = lambda n: ' '.join(rng.choice(vocabulary) for _ in range(n))
+    return [{'id': f'{i:08d}', 'subject': words(8), 'snippet': words(20), 'date': '', 'label_ids': 'INBOX,UNREAD',
+             'sender_email': f'news@sender{rng.randrange(200)}.example.com', 'email_body': words(200),
+             'attachment_info': 'No', 'received_time': str(i), 'category': None, 'user_tags': None,
+             'is_manual': 0, 'manually_updated_category': None, 'reviewed': 0, 'ml_category': None,
+             'confidence_score': 0.0, 'is_read': False, 'is_important': False, 'user_feedback': None,
+             'secondary_categories': '', 'all_categories': '{}', 'thread_id': None, 'message_id': None,
+             'list_id': None, 'list_unsubscribe': None} for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--emails', type=int, default=2000)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 50, 200])
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    rows = synthetic_rows(args.emails, random.Random(args.seed))
+    print(f"{'batch':>6} {'emails/s':>10} {'ms/email':>10}")
+    for batch_size in args.batch_sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            db = Database(os.path.join(tmp, 'bench.db'))
+            service = EmailService.parser({}, db=db)
+            conn = sqlite3.connect(db.db_path)
+            writer = EmailWriter(service, conn, batch_size=batch_size, flush_ms=60000)
+            started = time.perf_counter()
+            for row in rows:
+                writer.add(dict(row))
+            writer.flush()
+            elapsed = time.perf_counter() - started
+            conn.close()
+        print(f"{batch_size:>6} {len(rows) / elapsed:>10.0f} {elapsed * 1000 / len(rows):>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
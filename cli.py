@@ -2,12 +2,22 @@
 import argparse
 import os
 import csv
+import time
 from auth.gmail_auth import GmailAuth
+from auth.credential_manager import get_credential_manager
 from google.auth.transport.requests import Request
 from google.auth.exceptions import RefreshError
-from email_service.email_service import EmailService
+from email_service.email_service import EmailService, load_keywords
+from email_service.backfill import run_backfill
+from email_service.recategorize import recategorize_all, recategorize_changed, predict_all
+from email_service.classifier import NaiveBayesClassifier, retrain
+from email_service.keyword_index import index_missing, emails_matching
+from email_service.near_duplicates import cluster_missing, largest_clusters, categorize_cluster
+from email_service.rules import add_rule, delete_rule, list_rules
+from email_service.search import search_emails, rebuild_search_index
 from db.database import Database
-from config import EMAIL_BODY_TRUNCATION_LENGTH, TRUNCATION_INDICATOR, KEYWORDS_PATH, DB_PATH
+from config import (EMAIL_BODY_TRUNCATION_LENGTH, TRUNCATION_INDICATOR, KEYWORDS_PATH, DB_PATH, BACKFILL_WORKERS,
+                    GMAIL_REPLAY_PATH, PARSE_WORKERS, PARSE_CHUNK_SIZE, RECATEGORIZE_CHUNK_SIZE, SEARCH_PAGE_SIZE)
 
 
 def main():
@@ -22,6 +32,18 @@ def main():
     # Email fetching commands
     fetch_parser = subparsers.add_parser("fetch", help="Fetch --date=YYYY-MM-DD 'fetches emails for the given date'")
     fetch_parser.add_argument("--date", type=str, help="Date to fetch emails (YYYY-MM-DD)")
+    fetch_parser.add_argument("--max-results", type=int, help="Stop after this many emails (default: all)")
+    fetch_parser.add_argument("--incremental", action="store_true", help="Only apply changes since the last sync (Gmail history)")
+    
+    # Backfill command
+    backfill_parser = subparsers.add_parser("backfill", help="backfill --from=YYYY-MM-DD --to=YYYY-MM-DD 'fetches a date range in parallel, resumably'")
+    backfill_parser.add_argument("--from", dest="start_date", type=str, required=True, help="First date to fetch (YYYY-MM-DD)")
+    backfill_parser.add_argument("--to", dest="end_date", type=str, required=True, help="Last date to fetch, inclusive (YYYY-MM-DD)")
+    backfill_parser.add_argument("--partition", choices=["day", "week"], default="day", help="Size of each work partition")
+    backfill_parser.add_argument("--workers", type=int, default=BACKFILL_WORKERS, help="Partitions fetched concurrently")
+    backfill_parser.add_argument("--restart", action="store_true", help="Ignore completed partitions and start over")
+    backfill_parser.add_argument("--parse-workers", type=int, default=PARSE_WORKERS if PARSE_WORKERS is not None else os.cpu_count(), help="Processes parsing and categorizing fetched emails (0 parses inline)")
+    backfill_parser.add_argument("--parse-chunk-size", type=int, default=PARSE_CHUNK_SIZE, help="Emails sent to a parse worker at a time")
     
     # Email categorization commands
     categorize_parser = subparsers.add_parser("categorize", help="categorize --date=YYYY-MM-DD 'categorizes emails for the given date'")
@@ -48,13 +70,56 @@ def main():
     
     # Add new subparser for categorizing all emails
     categorize_all_parser = subparsers.add_parser("categorize-all", help="Categorize all emails in the database")
+    categorize_all_parser.add_argument("--chunk-size", type=int, default=RECATEGORIZE_CHUNK_SIZE, help="Emails scored and written per transaction")
+    categorize_all_parser.add_argument("--restart", action="store_true", help="Ignore an interrupted run and start over")
+    categorize_all_parser.add_argument("--uncategorized-only", action="store_true", help="Only score emails without a category")
+    
+    # Keyword index commands
+    keywords_parser = subparsers.add_parser("keywords", help="keywords apply|index|match 're-score emails affected by keyword edits, or look up matches'")
+    keywords_parser.add_argument("action", choices=["apply", "index", "match"], help="Action to perform")
+    keywords_parser.add_argument("--keyword", type=str, help="Keyword to look up (match)")
+    keywords_parser.add_argument("--chunk-size", type=int, default=RECATEGORIZE_CHUNK_SIZE, help="Emails scored and written per transaction")
+    
+    # Classifier commands
+    classifier_parser = subparsers.add_parser("classifier", help="classifier train|predict 'rebuild the ml_category model from manual categories, or re-predict stored emails'")
+    classifier_parser.add_argument("action", choices=["train", "predict"], help="Action to perform")
+    
+    # User-defined rule commands
+    rules_parser = subparsers.add_parser("rules", help="rules add|list|delete 'categorize by sender, domain, label or subject prefix ahead of keywords'")
+    rules_parser.add_argument("action", choices=["add", "list", "delete"], help="Action to perform")
+    rules_parser.add_argument("--category", type=str, help="Category given by the rule")
+    rules_parser.add_argument("--sender", type=str, help="Sender address to match")
+    rules_parser.add_argument("--domain", type=str, help="Sender domain to match (subdomains included)")
+    rules_parser.add_argument("--label", type=str, help="Gmail label id to match")
+    rules_parser.add_argument("--subject-prefix", type=str, help="Subject start to match (case-insensitive)")
+    rules_parser.add_argument("--priority", type=int, default=0, help="Higher priority rules win when several match")
+    rules_parser.add_argument("--rule-id", type=int, help="Rule to delete")
+    
+    # Near-duplicate cluster commands
+    clusters_parser = subparsers.add_parser("clusters", help="clusters build|list|categorize 'group near-duplicate emails and categorize a whole cluster at once'")
+    clusters_parser.add_argument("action", choices=["build", "list", "categorize"], help="Action to perform")
+    clusters_parser.add_argument("--cluster-id", type=str, help="Cluster to categorize")
+    clusters_parser.add_argument("--category", type=str, help="Category to give every email of the cluster")
+    
+    # Full-text search
+    search_parser = subparsers.add_parser("search", help="search 'words \"a phrase\" prefix*' 'full-text search over subject, sender, snippet and body'")
+    search_parser.add_argument("query", nargs="?", default="", help="Words that must all appear; quote phrases, end a word with * for a prefix")
+    search_parser.add_argument("--page", type=int, default=1, help="Page of results to show")
+    search_parser.add_argument("--per-page", type=int, default=SEARCH_PAGE_SIZE, help="Results per page")
+    search_parser.add_argument("--rebuild", action="store_true", help="Re-index every stored email (e.g. after a VACUUM)")
     
     args = parser.parse_args()
     
     if args.command == "auth":
         handle_auth(args.action)
     elif args.command == "fetch":
-        handle_fetch(args.date)
+        if args.incremental:
+            handle_sync()
+        else:
+            handle_fetch(args.date, args.max_results)
+    elif args.command == "backfill":
+        handle_backfill(args.start_date, args.end_date, args.partition, args.workers, args.restart,
+                        args.parse_workers, args.parse_chunk_size)
     elif args.command == "categorize":
         handle_categorize(args.date)
     elif args.command == "feedback":
@@ -70,7 +135,17 @@ def main():
     elif args.command == "export":
         export_emails_to_csv()
     elif args.command == "categorize-all":
-        handle_categorize_all()
+        handle_categorize_all(args.chunk_size, args.restart, args.uncategorized_only)
+    elif args.command == "keywords":
+        handle_keywords(args.action, args.keyword, args.chunk_size)
+    elif args.command == "classifier":
+        handle_classifier(args.action)
+    elif args.command == "rules":
+        handle_rules(args)
+    elif args.command == "clusters":
+        handle_clusters(args.action, args.cluster_id, args.category)
+    elif args.command == "search":
+        handle_search(args.query, args.page, args.per_page, args.rebuild)
     else:
         parser.print_help()
 
@@ -104,10 +179,16 @@ def handle_auth(action):
         else:
             print("No token file found.")
 
-def handle_fetch(date):
+def load_credentials():
+    """Authenticate with Gmail, unless a recorded session is being replayed offline."""
+    if GMAIL_REPLAY_PATH:
+        print(f"Replaying Gmail responses from {GMAIL_REPLAY_PATH}")
+        return None
+    return get_credential_manager().get_credentials()
+
+def handle_fetch(date, max_results=None):
     print(f"Fetching emails for date: {date}")
-    gmail_auth = GmailAuth()
-    creds = gmail_auth.authenticate()
+    creds = load_credentials()
     
     email_service = EmailService(creds)
     
@@ -116,29 +197,57 @@ def handle_fetch(date):
         date = datetime.today().strftime('%Y-%m-%d')
     
     print(f"Fetching emails for date: {date}")
-    emails = email_service.fetch_emails(date=date)
-    
-    for email in emails:
+    count = 0
+    for email in email_service.iter_emails(date=date, max_results=max_results):
         print(f"Email: {email['subject']}")
         print(f"Primary Category: {email['category']} (Confidence: {email['confidence_score']:.2f})")
         print(f"Secondary Categories: {email['secondary_categories']}")
         print("---")
+        count += 1
     
-    print(f"Fetched and categorized {len(emails)} emails")
+    print(f"Fetched and categorized {count} emails")
+    memo = email_service.memo.stats()
+    print(f"Categorization memo: {memo['hits'] + memo['db_hits']} hits, {memo['misses']} misses ({memo['hit_rate']:.0%})")
+
+def handle_sync():
+    print("Syncing changes since the last checkpoint")
+    creds = load_credentials()
+    email_service = EmailService(creds)
+    summary = email_service.sync_incremental()
+    if summary:
+        print(f"Added {summary['added']}, deleted {summary['deleted']}, relabeled {summary['relabeled']} emails")
+
+def handle_backfill(start_date, end_date, partition, workers, restart, parse_workers=0, parse_chunk_size=PARSE_CHUNK_SIZE):
+    print(f"Backfilling emails from {start_date} to {end_date} by {partition}")
+    creds = load_credentials()
+    email_service = EmailService(creds)
+    email_service.enable_parse_pool(workers=parse_workers, chunk_size=parse_chunk_size)
+    
+    started = time.monotonic()
+    try:
+        results = run_backfill(email_service, start_date, end_date, unit=partition, workers=workers, restart=restart)
+    finally:
+        email_service.close()
+    elapsed = time.monotonic() - started
+    
+    total = sum(result['message_count'] for result in results)
+    rate = total / elapsed if elapsed > 0 else 0.0
+    print(f"Backfilled {total} emails across {len(results)} partitions in {elapsed:.1f}s ({rate:.1f} msg/s)")
 
 def handle_categorize(date):
     print(f"Categorizing emails for date: {date}")
-    creds = GmailAuth().authenticate()
-    email_service = EmailService(creds, keywords_path=KEYWORDS_PATH)
-    emails = email_service.fetch_emails(date=date)
-    for email in emails:
-        category = email_service.categorize_email(email)
-        print(f"Email: {email['subject']}, labels: {email['label_ids']}, Category: {category}")
+    creds = load_credentials()
+    email_service = EmailService(creds)
+    for email in email_service.iter_emails(date=date):
+        print(f"Email: {email['subject']}, labels: {email['label_ids']}, Category: {email['category']}")
         
 def handle_feedback(email_id, category):
-    creds = GmailAuth().get_token()
-    email_service = EmailService(creds, keywords_path=KEYWORDS_PATH)
-    email_service.provide_feedback(email_id, category)
+    # Feedback only touches the database and the classifier, not Gmail
+    email_service = EmailService.parser(load_keywords(), db=Database())
+    if email_service.provide_feedback(email_id, category):
+        print(f"Email {email_id} categorized as {category}")
+    else:
+        print(f"No email with ID {email_id}")
     
 def handle_delete():
     print("Deleting unimportant emails")
@@ -146,8 +255,8 @@ def handle_delete():
 def handle_db(action):
     print(f"Handling database action: {action}")
     if action=="migrate_schema":
-        db = Database('taskeroo.db')
-        db.migrate_schema()
+        applied = Database(DB_PATH).migrate_schema()
+        print(f"Applied migrations: {applied}" if applied else "Schema is up to date")
 
 def handle_log():
     print("Logging user interactions")
@@ -177,38 +286,122 @@ def export_emails_to_csv():
     finally:
         conn.close()
 
-def handle_categorize_all():
+def handle_categorize_all(chunk_size=RECATEGORIZE_CHUNK_SIZE, restart=False, uncategorized_only=False):
     print("Categorizing all emails in the database")
-    creds = GmailAuth().authenticate()
-    email_service = EmailService(creds, keywords_path=KEYWORDS_PATH)
-    db = Database('taskeroo.db')
+    # Scoring stored emails needs the keywords, rules and the database, not Gmail
+    email_service = EmailService.parser(load_keywords(), db=Database())
     
-    # Fetch all emails from the database
-    conn = db.connect()
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, subject, snippet, email_body FROM emails WHERE category IS NULL OR category = ''")
-    emails = cursor.fetchall()
-    
-    total_emails = len(emails)
-    print(f"Found {total_emails} emails to categorize")
-    
-    for index, (email_id, subject, snippet, body) in enumerate(emails, 1):
-        email_data = {
-            'id': email_id,
-            'subject': subject,
-            'snippet': snippet,
-            'body': body
-        }
-        category = email_service.categorize_email(email_data)
-        
-        # Update the category in the database
-        cursor.execute("UPDATE emails SET category = ? WHERE id = ?", (category, email_id))
-        conn.commit()
-        
-        print(f"Processed {index}/{total_emails}: Email ID {email_id} categorized as {category}")
-    
-    conn.close()
-    print("All emails have been categorized")
+    started = time.monotonic()
+    scored = recategorize_all(email_service, Database(), chunk_size=chunk_size, restart=restart,
+                              uncategorized_only=uncategorized_only)
+    print(f"All emails have been categorized ({scored} in {time.monotonic() - started:.1f}s)")
+
+def handle_keywords(action, keyword=None, chunk_size=RECATEGORIZE_CHUNK_SIZE):
+    db = Database()
+    if action == "apply":
+        email_service = EmailService.parser(load_keywords(), db=db)
+        scored = recategorize_changed(email_service, db, chunk_size=chunk_size)
+        print(f"Re-scored {scored} emails")
+    elif action == "index":
+        conn = db.connect()
+        try:
+            print(f"Indexed {index_missing(conn)} emails")
+        finally:
+            conn.close()
+    elif action == "match":
+        if not keyword:
+            print("match needs --keyword")
+            return
+        conn = db.connect()
+        try:
+            email_ids = sorted(emails_matching(conn, keyword))
+        finally:
+            conn.close()
+        print(f"{len(email_ids)} emails match '{keyword}'")
+        for email_id in email_ids:
+            print(email_id)
+
+def handle_classifier(action):
+    db = Database()
+    if action == "train":
+        conn = db.connect()
+        try:
+            print(f"Trained the classifier on {retrain(conn)} manually categorized emails")
+        finally:
+            conn.close()
+    elif action == "predict":
+        conn = db.connect()
+        try:
+            classifier = NaiveBayesClassifier.load(conn)
+        finally:
+            conn.close()
+        if not classifier.is_trained():
+            print("The classifier has no manual categories to learn from yet")
+            return
+        print(f"Predicted ml_category for {predict_all(classifier, db)} emails")
+
+def handle_rules(args):
+    conn = Database().connect()
+    try:
+        if args.action == "add":
+            if not args.category:
+                print("add needs --category")
+                return
+            try:
+                rule_id = add_rule(conn, args.category, sender=args.sender, subject_prefix=args.subject_prefix,
+                                   domain=args.domain, label=args.label, priority=args.priority)
+            except ValueError as e:
+                print(e)
+                return
+            print(f"Added rule {rule_id}; run categorize-all to apply it to stored emails")
+        elif args.action == "list":
+            print(f"{'id':>4} {'category':<15} {'hits':>8} {'checks':>8}  conditions")
+            for rule in list_rules(conn):
+                conditions = ', '.join(f"{name}={rule[name]}" for name in ['sender', 'subject_prefix', 'domain', 'label']
+                                       if rule[name])
+                priority = f" (priority {rule['priority']})" if rule['priority'] else ''
+                print(f"{rule['id']:>4} {rule['category']:<15} {rule['hits']:>8} {rule['checks']:>8}  {conditions}{priority}")
+        elif args.action == "delete":
+            if args.rule_id is None:
+                print("delete needs --rule-id")
+                return
+            print("Deleted" if delete_rule(conn, args.rule_id) else f"No rule {args.rule_id}")
+    finally:
+        conn.close()
+
+def handle_clusters(action, cluster_id=None, category=None):
+    conn = Database().connect()
+    try:
+        if action == "build":
+            print(f"Clustered {cluster_missing(conn)} emails")
+        elif action == "list":
+            for cluster, size, subject in largest_clusters(conn):
+                print(f"{cluster}  {size:>6}  {subject}")
+        elif action == "categorize":
+            if not cluster_id or not category:
+                print("categorize needs --cluster-id and --category")
+                return
+            print(f"Categorized {categorize_cluster(conn, cluster_id, category)} emails as '{category}'")
+    finally:
+        conn.close()
+
+def handle_search(query, page=1, per_page=SEARCH_PAGE_SIZE, rebuild=False):
+    conn = Database().connect()
+    try:
+        if rebuild:
+            rebuild_search_index(conn)
+            conn.commit()
+            print("Rebuilt the search index")
+            if not query:
+                return
+        result = search_emails(conn, query, page, per_page)
+        for email in result['results']:
+            print(f"{email['id']}  {email['date'] or '':<32} {email['sender_email'] or '':<40} {email['subject']}")
+        pages = -(-result['ranked'] // result['per_page'])
+        newest = f" (the newest {result['ranked']} ranked)" if result['ranked'] < result['total'] else ''
+        print(f"{result['total']} matches{newest}, page {result['page']} of {max(pages, 1)}")
+    finally:
+        conn.close()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
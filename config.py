@@ -6,9 +6,77 @@ TRUNCATION_INDICATOR = config('TRUNCATION_INDICATOR', default='... [truncated]')
 
 # Database configuration
 DB_PATH = config('DB_PATH', default='taskeroo.db')
+# Pooled SQLite connections: idle connections kept, busy wait for the write lock, page cache and memory map sizes
+DB_POOL_SIZE = config('DB_POOL_SIZE', default=8, cast=int)
+DB_BUSY_TIMEOUT_MS = config('DB_BUSY_TIMEOUT_MS', default=5000, cast=int)
+DB_CACHE_SIZE_KB = config('DB_CACHE_SIZE_KB', default=65536, cast=int)
+DB_MMAP_SIZE = config('DB_MMAP_SIZE', default=268435456, cast=int)
 
 # Other configurations
 KEYWORDS_PATH = config('KEYWORDS_PATH', default='email_keywords.json')
 
 # You can add more configuration variables here as needed
-MAX_FETCH_EMAILS = config('MAX_FETCH_EMAILS', default=25, cast=int)
\ No newline at end of file
+MAX_FETCH_EMAILS = config('MAX_FETCH_EMAILS', default=25, cast=int)
+# Gmail batch downloads (the API accepts at most 100 sub-requests per batch)
+GMAIL_BATCH_SIZE = config('GMAIL_BATCH_SIZE', default=50, cast=int)
+GMAIL_BATCH_MAX_RETRIES = config('GMAIL_BATCH_MAX_RETRIES', default=3, cast=int)
+# messages().list page size when walking a full listing (the API maximum is 500)
+GMAIL_LIST_PAGE_SIZE = config('GMAIL_LIST_PAGE_SIZE', default=500, cast=int)
+# Days re-fetched when incremental sync has no usable historyId checkpoint
+HISTORY_RESYNC_DAYS = config('HISTORY_RESYNC_DAYS', default=7, cast=int)
+
+# Fetch engine: worker threads, Gmail per-user quota (units/second) and retry backoff
+FETCH_CONCURRENCY = config('FETCH_CONCURRENCY', default=4, cast=int)
+GMAIL_QUOTA_UNITS_PER_SECOND = config('GMAIL_QUOTA_UNITS_PER_SECOND', default=250, cast=int)
+FETCH_MAX_RETRIES = config('FETCH_MAX_RETRIES', default=5, cast=int)
+FETCH_BACKOFF_BASE = config('FETCH_BACKOFF_BASE', default=1.0, cast=float)
+FETCH_BACKOFF_MAX = config('FETCH_BACKOFF_MAX', default=32.0, cast=float)
+# Date partitions fetched concurrently by 'cli.py backfill'
+BACKFILL_WORKERS = config('BACKFILL_WORKERS', default=4, cast=int)
+
+# Record/replay of Gmail API traffic for offline benchmarking (JSON Lines files)
+GMAIL_RECORD_PATH = config('GMAIL_RECORD_PATH', default='')
+GMAIL_REPLAY_PATH = config('GMAIL_REPLAY_PATH', default='')
+GMAIL_REPLAY_LATENCY = config('GMAIL_REPLAY_LATENCY', default=0.0, cast=float)
+GMAIL_REPLAY_ERROR_RATE = config('GMAIL_REPLAY_ERROR_RATE', default=0.0, cast=float)
+# Socket timeout (seconds) of the pooled, keep-alive Gmail HTTP connections
+GMAIL_HTTP_TIMEOUT = config('GMAIL_HTTP_TIMEOUT', default=60, cast=int)
+
+# Refresh OAuth tokens this many seconds before they expire
+TOKEN_REFRESH_MARGIN = config('TOKEN_REFRESH_MARGIN', default=300, cast=int)
+
+# Process pool for parsing/categorizing during backfills (0 parses inline on the fetch thread;
+# unset, backfill uses one worker per CPU and everything else parses inline)
+PARSE_WORKERS = config('PARSE_WORKERS', default=None, cast=lambda value: None if value in (None, '') else int(value))
+PARSE_CHUNK_SIZE = config('PARSE_CHUNK_SIZE', default=200, cast=int)
+
+# categorize-all: emails scored and written per transaction
+RECATEGORIZE_CHUNK_SIZE = config('RECATEGORIZE_CHUNK_SIZE', default=1000, cast=int)
+
+# Online naive Bayes classifier behind ml_category: hashed feature buckets (a power of two) and smoothing
+CLASSIFIER_FEATURES = config('CLASSIFIER_FEATURES', default=2 ** 18, cast=int)
+CLASSIFIER_ALPHA = config('CLASSIFIER_ALPHA', default=1.0, cast=float)
+
+# Sender/domain category priors: LRU size, when a sender skips keyword scoring, and its weight as a scorer feature
+SENDER_PRIOR_CACHE_SIZE = config('SENDER_PRIOR_CACHE_SIZE', default=10000, cast=int)
+SENDER_PRIOR_MIN_EMAILS = config('SENDER_PRIOR_MIN_EMAILS', default=20, cast=int)
+SENDER_PRIOR_MIN_MANUAL = config('SENDER_PRIOR_MIN_MANUAL', default=2, cast=int)
+SENDER_PRIOR_CONFIDENCE = config('SENDER_PRIOR_CONFIDENCE', default=0.9, cast=float)
+SENDER_PRIOR_WEIGHT = config('SENDER_PRIOR_WEIGHT', default=1.0, cast=float)
+
+# In-memory entries of the content-hash categorization memo (persisted entries are pruned by keyword version)
+CATEGORIZATION_MEMO_SIZE = config('CATEGORIZATION_MEMO_SIZE', default=50000, cast=int)
+
+# Near-duplicate clustering: estimated Jaccard similarity of words needed to join a cluster,
+# and stored emails compared per MinHash band when a new email is clustered
+NEAR_DUPLICATE_SIMILARITY = config('NEAR_DUPLICATE_SIMILARITY', default=0.7, cast=float)
+NEAR_DUPLICATE_MAX_CANDIDATES = config('NEAR_DUPLICATE_MAX_CANDIDATES', default=100, cast=int)
+
+# Batched email writer: rows per executemany/commit, and the longest a parsed row waits in the buffer
+STORE_BATCH_SIZE = config('STORE_BATCH_SIZE', default=200, cast=int)
+STORE_FLUSH_MS = config('STORE_FLUSH_MS', default=1000, cast=int)
+
+# Full-text search: results per page in the CLI, API and Streamlit search, and the newest
+# matches ranked by bm25 (ranking every match of a common word is what makes a search slow)
+SEARCH_PAGE_SIZE = config('SEARCH_PAGE_SIZE', default=20, cast=int)
+SEARCH_MAX_RANKED = config('SEARCH_MAX_RANKED', default=5000, cast=int)
@@ -1,53 +1,248 @@
 # db/database.py
+import json
 import sqlite3
-from config import DB_PATH
+import threading
+from datetime import datetime
+from db.migrations import migrate
+from config import DB_PATH, DB_POOL_SIZE, DB_BUSY_TIMEOUT_MS, DB_CACHE_SIZE_KB, DB_MMAP_SIZE
+
+
+class PooledConnection(sqlite3.Connection):
+    """A connection owned by a ConnectionPool: close() hands it back instead of closing it."""
+
+    pool = None
+
+    def close(self):
+        if self.pool is None or not self.pool.release(self):
+            super().close()
+
+
+class ConnectionPool:
+    """Reusable connections to one SQLite file, in WAL mode with tuned pragmas.
+
+    WAL lets the dashboard keep reading while a fetch writes: readers never block the
+    single writer or each other, and writers queue on the busy timeout instead of
+    failing with "database is locked". synchronous=NORMAL only syncs at checkpoints,
+    which is safe in WAL mode. Connections may move between threads (Streamlit reruns
+    on a fresh one) but are used by one caller at a time; a returned connection's open
+    transaction is rolled back. At most size idle connections are kept.
+    """
+
+    def __init__(self, db_path, size=DB_POOL_SIZE, busy_timeout_ms=DB_BUSY_TIMEOUT_MS,
+                 cache_size_kb=DB_CACHE_SIZE_KB, mmap_size=DB_MMAP_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.cache_size_kb = cache_size_kb
+        self.mmap_size = mmap_size
+        self.idle = []
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        return self.open()
+
+    def open(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000, check_same_thread=False,
+                               factory=PooledConnection)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA cache_size=-{int(self.cache_size_kb)}")
+        conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        conn.pool = self
+        return conn
+
+    def release(self, conn):
+        """Take a connection back; False if the pool is full and the caller should close it."""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            return False
+        with self.lock:
+            if len(self.idle) >= self.size:
+                return False
+            self.idle.append(conn)
+            return True
+
+    def close_all(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for conn in idle:
+            sqlite3.Connection.close(conn)
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path=DB_PATH):
+    """Return the process-wide ConnectionPool of a database file."""
+    with _pools_lock:
+        if db_path not in _pools:
+            _pools[db_path] = ConnectionPool(db_path)
+        return _pools[db_path]
+
+
+def connect(db_path=DB_PATH):
+    """A pooled connection to the database; close() returns it to the pool."""
+    return get_pool(db_path).acquire()
+
 
 class Database:
-    def __init__(self):
-        self.db_path = DB_PATH
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
         self.create_tables()
         
     def connect(self):
-        """Connect to the SQLite database."""
-        print(f"Connecting to Database at {self.db_path}")
-        return sqlite3.connect(self.db_path)
+        """Get a pooled connection to the SQLite database; close() returns it to the pool."""
+        return connect(self.db_path)
 
     def create_tables(self):
-        """Create tables for emails and interactions."""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
+        """Create or upgrade every table by applying the pending schema migrations."""
+        self.migrate_schema()
 
-        # Create table for emails with new fields
-        c.execute('''CREATE TABLE IF NOT EXISTS emails
-                    (id TEXT PRIMARY KEY,
-                    subject TEXT,
-                    snippet TEXT,
-                    date TEXT,
-                    label_ids TEXT,
-                    sender_email TEXT,
-                    email_body TEXT,
-                    attachment_info TEXT,
-                    received_time TEXT,
-                    category TEXT,
-                    secondary_categories TEXT,
-                    confidence_score REAL,
-                    all_categories TEXT,
-                    ml_category TEXT,
-                    is_read INTEGER,
-                    is_important INTEGER,
-                    user_feedback TEXT)
-                ''')
-
-        # Create table for interactions
-        c.execute('''CREATE TABLE IF NOT EXISTS interactions
-                     (email_id TEXT,
-                      interaction TEXT,
-                      timestamp TEXT,
-                      FOREIGN KEY(email_id) REFERENCES emails(id))''')
-
-        conn.commit()
-        conn.close()
+    def get_history_id(self, account):
+        """Return the last synced Gmail historyId for the account, or None."""
+        conn = self.connect()
+        try:
+            c = conn.cursor()
+            c.execute("SELECT history_id FROM sync_state WHERE account = ?", (account,))
+            row = c.fetchone()
+            return row[0] if row else None
+        finally:
+            conn.close()
+
+    def save_history_id(self, account, history_id):
+        """Record the Gmail historyId the account has been synced up to."""
+        conn = self.connect()
+        try:
+            conn.execute('''INSERT INTO sync_state (account, history_id, updated_at) VALUES (?, ?, ?)
+                            ON CONFLICT(account) DO UPDATE SET history_id = excluded.history_id,
+                                                               updated_at = excluded.updated_at''',
+                         (account, str(history_id), datetime.now().isoformat()))
+            conn.commit()
+        finally:
+            conn.close()
         
+    def completed_partitions(self):
+        """Return the (start, end) date pairs of backfill partitions that finished."""
+        conn = self.connect()
+        try:
+            c = conn.cursor()
+            c.execute("SELECT partition_start, partition_end FROM backfill_partitions WHERE status = 'done'")
+            return set(c.fetchall())
+        finally:
+            conn.close()
+
+    def record_partition(self, partition_start, partition_end, status, message_count=0, elapsed_seconds=0.0):
+        """Record the outcome of a backfill partition so an interrupted run can resume."""
+        conn = self.connect()
+        try:
+            conn.execute('''INSERT OR REPLACE INTO backfill_partitions
+                            (partition_start, partition_end, status, message_count, elapsed_seconds, completed_at)
+                            VALUES (?, ?, ?, ?, ?, ?)''',
+                         (partition_start, partition_end, status, message_count, elapsed_seconds,
+                          datetime.now().isoformat()))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def reset_partitions(self):
+        """Forget all backfill progress."""
+        conn = self.connect()
+        try:
+            conn.execute("DELETE FROM backfill_partitions")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def get_job_state(self, job):
+        """Return the checkpoint row of a batch job as a dict, or None if it never ran."""
+        conn = self.connect()
+        try:
+            c = conn.cursor()
+            c.execute("SELECT last_id, version, processed, status FROM job_state WHERE job = ?", (job,))
+            row = c.fetchone()
+            return dict(zip(['last_id', 'version', 'processed', 'status'], row)) if row else None
+        finally:
+            conn.close()
+
+    def save_job_state(self, job, last_id, version, processed, status, conn=None):
+        """Checkpoint a batch job. Pass the job's own connection to commit it with the job's writes."""
+        own_conn = conn is None
+        conn = self.connect() if own_conn else conn
+        try:
+            conn.execute('''INSERT OR REPLACE INTO job_state (job, last_id, version, processed, status, updated_at)
+                            VALUES (?, ?, ?, ?, ?, ?)''',
+                         (job, last_id, version, processed, status, datetime.now().isoformat()))
+            if own_conn:
+                conn.commit()
+        finally:
+            if own_conn:
+                conn.close()
+
+    def get_applied_keywords(self):
+        """Return the keyword mapping stored emails were last scored with, or None."""
+        conn = self.connect()
+        try:
+            c = conn.cursor()
+            c.execute("SELECT keywords FROM applied_keywords ORDER BY applied_at DESC LIMIT 1")
+            row = c.fetchone()
+            return json.loads(row[0]) if row else None
+        finally:
+            conn.close()
+
+    def save_applied_keywords(self, version, keywords, conn=None):
+        """Record that stored emails are now scored with keywords. Pass a connection to commit with its writes."""
+        own_conn = conn is None
+        conn = self.connect() if own_conn else conn
+        try:
+            conn.execute("INSERT OR REPLACE INTO applied_keywords (version, keywords, applied_at) VALUES (?, ?, ?)",
+                         (version, json.dumps(keywords), datetime.now().isoformat()))
+            if own_conn:
+                conn.commit()
+        finally:
+            if own_conn:
+                conn.close()
+
+    def get_model_versions(self):
+        """Return the current version of each stored model ('rules', 'classifier'); see db.migrations."""
+        conn = self.connect()
+        try:
+            return dict(conn.execute("SELECT name, version FROM model_versions"))
+        finally:
+            conn.close()
+
+    def load_memo_scores(self, version, limit):
+        """Return {hash: scores} for the newest memoized entries of a version, oldest first, at most limit."""
+        conn = self.connect()
+        try:
+            rows = conn.execute('''SELECT hash, scores FROM (SELECT rowid, hash, scores FROM categorization_memo
+                                                         WHERE version = ? ORDER BY rowid DESC LIMIT ?)
+                                   ORDER BY rowid''', (version, limit)).fetchall()
+            return {key: json.loads(scores) for key, scores in rows}
+        finally:
+            conn.close()
+
+    def save_memo_scores(self, entries, conn):
+        """Persist (hash, version, scores) entries on the caller's connection. The caller commits."""
+        conn.executemany("INSERT OR IGNORE INTO categorization_memo (hash, version, scores) VALUES (?, ?, ?)",
+                         [(key, version, json.dumps(scores)) for key, version, scores in entries])
+
+    def prune_memo(self, version):
+        """Delete memoized scores computed with any other keyword or scoring version."""
+        conn = self.connect()
+        try:
+            deleted = conn.execute("DELETE FROM categorization_memo WHERE version != ?", (version,)).rowcount
+            conn.commit()
+            return deleted
+        finally:
+            conn.close()
+
     def verify_tables(self):
         """Verify that the tables were created."""
         conn = self.connect()
@@ -65,19 +260,9 @@ class Database:
         return emails_table_exists, interactions_table_exists
 
     def migrate_schema(self):
-        """Migrate the database schema to add new columns."""
-        conn = sqlite3.connect(self.db_path)
-        c = conn.cursor()
-
-        # Add new columns if they don't exist
-        c.execute("PRAGMA table_info(emails)")
-        columns = [column[1] for column in c.fetchall()]
-        
-        if 'secondary_categories' not in columns:
-            c.execute("ALTER TABLE emails ADD COLUMN secondary_categories TEXT")
-        
-        if 'all_categories' not in columns:
-            c.execute("ALTER TABLE emails ADD COLUMN all_categories TEXT")
-
-        conn.commit()
-        conn.close()
\ No newline at end of file
+        """Apply the pending versioned migrations (see db.migrations). Returns the versions applied."""
+        conn = self.connect()
+        try:
+            return migrate(conn)
+        finally:
+            conn.close()
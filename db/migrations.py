@@ -0,0 +1,324 @@
+# db/migrations.py
+import sqlite3
+from datetime import datetime
+
+# The system labels migration 4 computes label_mask bits for, by bit position. Frozen:
+# email_service.labels appends to this list, and labels added later need a migration of their own
+MIGRATION_4_SYSTEM_LABELS = ['INBOX', 'SPAM', 'TRASH', 'UNREAD', 'STARRED', 'IMPORTANT', 'SENT', 'DRAFT', 'CHAT',
+                             'CATEGORY_PERSONAL', 'CATEGORY_SOCIAL', 'CATEGORY_PROMOTIONS', 'CATEGORY_UPDATES',
+                             'CATEGORY_FORUMS']
+
+# The emails table as of the baseline migration, in column order. Columns missing from
+# databases created by older code are appended by ALTER TABLE
+EMAIL_COLUMNS = [
+    ('id', 'TEXT PRIMARY KEY'),
+    ('subject', 'TEXT'),
+    ('snippet', 'TEXT'),
+    ('date', 'TEXT'),
+    ('label_ids', 'TEXT'),
+    ('sender_email', 'TEXT'),
+    ('email_body', 'TEXT'),
+    ('attachment_info', 'TEXT'),
+    ('received_time', 'TEXT'),
+    ('category', 'TEXT'),
+    ('secondary_categories', 'TEXT'),
+    ('confidence_score', 'REAL'),
+    ('all_categories', 'TEXT'),
+    ('ml_category', 'TEXT'),
+    ('is_read', 'INTEGER'),
+    ('is_important', 'INTEGER'),
+    ('user_feedback', 'TEXT'),
+    ('user_tags', 'TEXT'),
+    ('is_manual', 'INTEGER DEFAULT 0'),
+    ('manually_updated_category', 'TEXT'),
+    ('reviewed', 'INTEGER DEFAULT 0'),
+    ('thread_id', 'TEXT'),
+    ('message_id', 'TEXT'),
+    ('list_id', 'TEXT'),
+    ('list_unsubscribe', 'TEXT'),
+    ('ml_confidence', 'REAL'),
+    ('minhash', 'BLOB'),
+    ('cluster_id', 'TEXT'),
+]
+
+
+def add_missing_columns(c, table, columns):
+    """ALTER TABLE in the columns a table created by older code does not have yet."""
+    existing = {row[1] for row in c.execute(f"PRAGMA table_info({table})")}
+    for name, kind in columns:
+        if name not in existing:
+            c.execute(f"ALTER TABLE {table} ADD COLUMN {name} {kind.replace(' PRIMARY KEY', '')}")
+
+
+def baseline_schema(c):
+    """Every table and column the code relied on before versioned migrations.
+
+    Written to be safe on databases created by any earlier version, so it is also the
+    first migration recorded for them.
+    """
+    # Create table for emails, then add the columns older databases are missing
+    c.execute(f"CREATE TABLE IF NOT EXISTS emails ({', '.join(f'{name} {kind}' for name, kind in EMAIL_COLUMNS)})")
+    add_missing_columns(c, 'emails', EMAIL_COLUMNS)
+    c.execute("CREATE INDEX IF NOT EXISTS idx_emails_thread_id ON emails(thread_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_emails_message_id ON emails(message_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_emails_list_id ON emails(list_id)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_emails_cluster_id ON emails(cluster_id)")
+
+    # Create table for interactions
+    c.execute('''CREATE TABLE IF NOT EXISTS interactions
+                 (email_id TEXT,
+                  interaction TEXT,
+                  timestamp TEXT,
+                  FOREIGN KEY(email_id) REFERENCES emails(id))''')
+
+    # Create table for incremental sync checkpoints (last Gmail historyId per account)
+    c.execute('''CREATE TABLE IF NOT EXISTS sync_state
+                 (account TEXT PRIMARY KEY,
+                  history_id TEXT,
+                  updated_at TEXT)''')
+
+    # Create table for backfill progress, one row per date partition
+    c.execute('''CREATE TABLE IF NOT EXISTS backfill_partitions
+                 (partition_start TEXT,
+                  partition_end TEXT,
+                  status TEXT,
+                  message_count INTEGER,
+                  elapsed_seconds REAL,
+                  completed_at TEXT,
+                  PRIMARY KEY (partition_start, partition_end))''')
+
+    # Create table for resumable batch jobs (last processed email id per job)
+    c.execute('''CREATE TABLE IF NOT EXISTS job_state
+                 (job TEXT PRIMARY KEY,
+                  last_id TEXT,
+                  version TEXT,
+                  processed INTEGER,
+                  status TEXT,
+                  updated_at TEXT)''')
+
+    # Create the inverted index from word tokens to the emails containing them
+    c.execute('''CREATE TABLE IF NOT EXISTS keyword_index
+                 (token TEXT,
+                  email_id TEXT,
+                  PRIMARY KEY (token, email_id)) WITHOUT ROWID''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_keyword_index_email_id ON keyword_index(email_id)")
+
+    # Create tables for the naive Bayes classifier: hashed feature counts and per-category totals
+    c.execute('''CREATE TABLE IF NOT EXISTS classifier_features
+                 (feature INTEGER,
+                  category TEXT,
+                  count REAL,
+                  PRIMARY KEY (feature, category)) WITHOUT ROWID''')
+    c.execute('''CREATE TABLE IF NOT EXISTS classifier_classes
+                 (category TEXT PRIMARY KEY,
+                  documents REAL,
+                  tokens REAL)''')
+
+    # Create tables for sender and domain ('@domain') category statistics
+    c.execute('''CREATE TABLE IF NOT EXISTS sender_stats
+                 (sender TEXT,
+                  category TEXT,
+                  count INTEGER DEFAULT 0,
+                  manual INTEGER DEFAULT 0,
+                  PRIMARY KEY (sender, category)) WITHOUT ROWID''')
+    c.execute('''CREATE TABLE IF NOT EXISTS senders
+                 (sender TEXT PRIMARY KEY,
+                  emails INTEGER,
+                  last_seen TEXT)''')
+
+    # Create table for memoized keyword scores, keyed by normalized content hash
+    c.execute('''CREATE TABLE IF NOT EXISTS categorization_memo
+                 (hash TEXT PRIMARY KEY,
+                  version TEXT,
+                  scores TEXT)''')
+
+    # Create table for the MinHash bands of stored emails, to find near-duplicate candidates
+    c.execute('''CREATE TABLE IF NOT EXISTS minhash_bands
+                 (band INTEGER,
+                  value INTEGER,
+                  email_id TEXT,
+                  PRIMARY KEY (band, value, email_id)) WITHOUT ROWID''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_minhash_bands_email_id ON minhash_bands(email_id)")
+
+    # Create table for user-defined categorization rules and their hit counters
+    c.execute('''CREATE TABLE IF NOT EXISTS rules
+                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                  category TEXT NOT NULL,
+                  sender TEXT,
+                  subject_prefix TEXT,
+                  domain TEXT,
+                  label TEXT,
+                  priority INTEGER DEFAULT 0,
+                  hits INTEGER DEFAULT 0,
+                  checks INTEGER DEFAULT 0,
+                  last_hit TEXT,
+                  created_at TEXT)''')
+
+    # Create table for the keyword mappings stored emails were last scored with
+    c.execute('''CREATE TABLE IF NOT EXISTS applied_keywords
+                 (version TEXT PRIMARY KEY,
+                  keywords TEXT,
+                  applied_at TEXT)''')
+
+
+def review_and_dashboard_indexes(c):
+    """Indexes behind the Streamlit review and stats queries in db.queries.
+
+    Review queues get partial indexes, so they only hold the rows they list. The stats
+    aggregates get covering indexes, so grouping by sender, date or final category
+    reads an index instead of every email body. body_length is stored because SQLite
+    cannot answer AVG(LENGTH(email_body)) from an index.
+    """
+    add_missing_columns(c, 'emails', [('body_length', 'INTEGER')])
+    c.execute("UPDATE emails SET body_length = LENGTH(email_body) WHERE body_length IS NULL")
+
+    c.execute("CREATE INDEX IF NOT EXISTS idx_emails_unreviewed ON emails(id) WHERE reviewed = 0")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_emails_reviewed ON emails(id) WHERE reviewed = 1")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_emails_manual ON emails(id) WHERE is_manual = 1")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_emails_attachments ON emails(id)
+                 WHERE attachment_info IS NOT NULL AND attachment_info != ''""")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_emails_category ON emails(category)")
+    c.execute("""CREATE INDEX IF NOT EXISTS idx_emails_manual_category ON emails(manually_updated_category)
+                 WHERE manually_updated_category IS NOT NULL AND manually_updated_category != ''""")
+    # The expression leads so GROUP BY final category can walk it; the plain columns make it covering
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_emails_final_category
+                 ON emails(COALESCE(manually_updated_category, category), manually_updated_category, category)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_emails_sender_email ON emails(sender_email)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_emails_date ON emails(date)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_emails_subject ON emails(subject)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_emails_body_length ON emails(body_length)")
+
+
+def full_text_search(c):
+    """FTS5 index over the searchable email text, kept current by triggers on emails.
+
+    The index is external-content: it stores only the tokens and reads the text back
+    from emails by rowid, so bodies are not stored twice. VACUUM may renumber the
+    rowids of emails, so run search.rebuild_search_index after one.
+    """
+    c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS emails_fts USING fts5
+                 (subject, sender_email, snippet, email_body,
+                  content='emails', content_rowid='rowid', tokenize='unicode61 remove_diacritics 2')''')
+    # Subject and sender matches rank above matches only in the body
+    c.execute("INSERT INTO emails_fts (emails_fts, rank) VALUES ('rank', 'bm25(10.0, 5.0, 2.0, 1.0)')")
+
+    c.execute('''CREATE TRIGGER IF NOT EXISTS emails_fts_insert AFTER INSERT ON emails BEGIN
+                     INSERT INTO emails_fts (rowid, subject, sender_email, snippet, email_body)
+                     VALUES (new.rowid, new.subject, new.sender_email, new.snippet, new.email_body);
+                 END''')
+    c.execute('''CREATE TRIGGER IF NOT EXISTS emails_fts_delete AFTER DELETE ON emails BEGIN
+                     INSERT INTO emails_fts (emails_fts, rowid, subject, sender_email, snippet, email_body)
+                     VALUES ('delete', old.rowid, old.subject, old.sender_email, old.snippet, old.email_body);
+                 END''')
+    # Review and category updates leave the text alone and skip the index; so do unchanged re-fetches
+    c.execute('''CREATE TRIGGER IF NOT EXISTS emails_fts_update
+                 AFTER UPDATE OF subject, sender_email, snippet, email_body ON emails
+                 WHEN old.subject IS NOT new.subject OR old.sender_email IS NOT new.sender_email
+                   OR old.snippet IS NOT new.snippet OR old.email_body IS NOT new.email_body
+                 BEGIN
+                     INSERT INTO emails_fts (emails_fts, rowid, subject, sender_email, snippet, email_body)
+                     VALUES ('delete', old.rowid, old.subject, old.sender_email, old.snippet, old.email_body);
+                     INSERT INTO emails_fts (rowid, subject, sender_email, snippet, email_body)
+                     VALUES (new.rowid, new.subject, new.sender_email, new.snippet, new.email_body);
+                 END''')
+
+    # Index the emails stored before the migration
+    c.execute("INSERT INTO emails_fts (emails_fts) VALUES ('rebuild')")
+
+
+def normalized_labels(c):
+    """labels and email_labels tables plus a label_mask bitmask of the system labels on emails.
+
+    label_ids stays as the comma-joined Gmail value. System-label filters and counts test
+    label_mask bits over its index; any label, user labels included, can be looked up
+    through email_labels.
+    """
+    c.execute('''CREATE TABLE IF NOT EXISTS labels
+                 (id INTEGER PRIMARY KEY,
+                  name TEXT UNIQUE NOT NULL)''')
+    c.execute('''CREATE TABLE IF NOT EXISTS email_labels
+                 (email_id TEXT,
+                  label_id INTEGER,
+                  PRIMARY KEY (email_id, label_id)) WITHOUT ROWID''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_email_labels_label_id ON email_labels(label_id, email_id)")
+    add_missing_columns(c, 'emails', [('label_mask', 'INTEGER NOT NULL DEFAULT 0')])
+
+    # Backfill from label_ids; Gmail label ids contain no quotes or commas, so each splits into a JSON array
+    split = '''json_each('["' || REPLACE(e.label_ids, ',', '","') || '"]') j'''
+    c.execute(f'''INSERT OR IGNORE INTO labels (name)
+                  SELECT DISTINCT j.value FROM emails e, {split}
+                  WHERE e.label_ids != '' AND j.value != '' ''')
+    c.execute(f'''INSERT OR IGNORE INTO email_labels (email_id, label_id)
+                  SELECT e.id, l.id FROM emails e, {split} JOIN labels l ON l.name = j.value
+                  WHERE e.label_ids != '' ''')
+    bits = ' | '.join(f"(instr(',' || label_ids || ',', ',{label},') > 0) * {1 << bit}"
+                      for bit, label in enumerate(MIGRATION_4_SYSTEM_LABELS))
+    c.execute(f"UPDATE emails SET label_mask = {bits} WHERE label_ids != ''")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_emails_label_mask ON emails(label_mask)")
+
+
+def model_versions(c):
+    """Version counters of the rules and the classifier model, bumped by triggers on every change.
+
+    Long-running processes such as the API compare them with the versions they loaded,
+    so rules added from the CLI or a retrain reach them without a restart. Rule hit
+    counters are left out: they change on every sync and do not affect matching.
+    """
+    c.execute('''CREATE TABLE IF NOT EXISTS model_versions
+                 (name TEXT PRIMARY KEY,
+                  version INTEGER NOT NULL DEFAULT 0)''')
+    c.execute("INSERT OR IGNORE INTO model_versions (name, version) VALUES ('rules', 0), ('classifier', 0)")
+    watched = {'rules': ('rules', 'UPDATE OF category, sender, subject_prefix, domain, label, priority'),
+               'classifier': ('classifier_classes', 'UPDATE')}
+    for name, (table, update) in watched.items():
+        for event in ['INSERT', 'DELETE', update]:
+            c.execute(f'''CREATE TRIGGER IF NOT EXISTS {name}_version_{event.split()[0].lower()}
+                          AFTER {event} ON {table} BEGIN
+                              UPDATE model_versions SET version = version + 1 WHERE name = '{name}';
+                          END''')
+
+
+# (version, description, function of a cursor); append new migrations, never edit applied ones
+MIGRATIONS = [
+    (1, 'Baseline schema', baseline_schema),
+    (2, 'Review and dashboard indexes', review_and_dashboard_indexes),
+    (3, 'Full-text search', full_text_search),
+    (4, 'Normalized labels and label bitmask', normalized_labels),
+    (5, 'Rule and classifier versions', model_versions),
+]
+
+
+def schema_version(conn):
+    """The highest migration applied to the database, 0 for a new file."""
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_version
+                    (version INTEGER PRIMARY KEY,
+                     description TEXT,
+                     applied_at TEXT)''')
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def migrate(conn, migrations=MIGRATIONS):
+    """Apply the pending migrations, each in its own transaction. Returns the versions applied.
+
+    Cheap when the schema is current, so every process can call it at startup. The
+    version is re-read under the write lock, so two processes starting together apply
+    each migration once.
+    """
+    applied = []
+    if schema_version(conn) >= migrations[-1][0]:
+        return applied
+    for version, description, migration in migrations:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if conn.execute("SELECT 1 FROM schema_version WHERE version = ?", (version,)).fetchone():
+                conn.rollback()
+                continue
+            migration(conn.cursor())
+            conn.execute("INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                         (version, description, datetime.now().isoformat()))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        applied.append(version)
+    return applied
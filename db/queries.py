@@ -0,0 +1,162 @@
+# db/queries.py
+# SQL behind the Streamlit review, stats and search pages. Kept in one place so db/test_queries.py
+# can check that each one is answered from an index rather than a scan of the emails table.
+
+FINAL_CATEGORY = 'COALESCE(manually_updated_category, category)'
+
+# One unreviewed email per near-duplicate cluster, biggest clusters first
+UNREVIEWED_CLUSTERS = """
+    SELECT id, subject, sender_email, snippet,
+    label_ids, category, manually_updated_category, is_manual, cluster_id, cluster_size
+    FROM (
+        SELECT *,
+        ROW_NUMBER() OVER (PARTITION BY COALESCE(cluster_id, id) ORDER BY id) AS cluster_rank,
+        COUNT(*) OVER (PARTITION BY COALESCE(cluster_id, id)) AS cluster_size
+        FROM emails
+        WHERE reviewed = 0 {keyword_filter}
+    )
+    WHERE cluster_rank = 1
+    ORDER BY cluster_size DESC, id
+    LIMIT ?
+"""
+KEYWORD_FILTER = "AND id IN (SELECT value FROM json_each(?))"
+
+UNREVIEWED_EMAILS = """
+    SELECT id, subject, sender_email, snippet, label_ids, category,
+           manually_updated_category, is_manual,
+           COALESCE(manually_updated_category, category) as current_category
+    FROM emails
+    WHERE reviewed = 0
+    ORDER BY id
+    LIMIT ?
+"""
+
+REVIEWED_EMAILS = """
+    SELECT *
+    FROM emails
+    WHERE reviewed = 1
+    ORDER BY id DESC
+    LIMIT ?
+    OFFSET ?
+"""
+
+RECENT_MANUAL = """
+    SELECT subject, sender_email, manually_updated_category
+    FROM emails
+    WHERE is_manual = 1
+    ORDER BY id DESC
+    LIMIT ?
+"""
+
+KEYWORD_MATCHES = f"""
+    SELECT subject, sender_email, {FINAL_CATEGORY} as final_category
+    FROM emails
+    WHERE id IN (SELECT value FROM json_each(?))
+    LIMIT ?
+"""
+
+DISTINCT_CATEGORIES = "SELECT DISTINCT category FROM emails"
+DISTINCT_MANUAL_CATEGORIES = """
+    SELECT DISTINCT manually_updated_category FROM emails
+    WHERE manually_updated_category IS NOT NULL AND manually_updated_category != ''
+"""
+DISTINCT_STORED_CATEGORIES = "SELECT DISTINCT category FROM emails WHERE category IS NOT NULL AND category != ''"
+
+COUNT_EMAILS = "SELECT COUNT(*) FROM emails"
+COUNT_UNREVIEWED = "SELECT COUNT(*) FROM emails WHERE reviewed = 0"
+COUNT_REVIEWED = "SELECT COUNT(*) FROM emails WHERE reviewed = 1"
+COUNT_MANUAL = "SELECT COUNT(*) as count FROM emails WHERE is_manual = 1"
+
+CATEGORY_COUNTS = f"""
+    SELECT {FINAL_CATEGORY} as final_category, COUNT(*) as count
+    FROM emails
+    GROUP BY final_category
+    ORDER BY count DESC
+"""
+
+TOP_SENDERS = """
+    SELECT sender_email, COUNT(*) as count
+    FROM emails
+    GROUP BY sender_email
+    ORDER BY count DESC
+    LIMIT ?
+"""
+
+EMAILS_PER_DATE = """
+    SELECT date, COUNT(*) as email_count
+    FROM emails
+    GROUP BY date
+    ORDER BY date
+"""
+
+UNIQUE_SENDERS = "SELECT COUNT(DISTINCT sender_email) as unique_senders FROM emails"
+UNIQUE_CATEGORIES = f"SELECT COUNT(DISTINCT {FINAL_CATEGORY}) as unique_categories FROM emails"
+
+COUNT_WITH_ATTACHMENTS = """
+    SELECT COUNT(*) as count
+    FROM emails
+    WHERE attachment_info IS NOT NULL AND attachment_info != ''
+"""
+
+AVERAGE_BODY_LENGTH = "SELECT AVG(body_length) as avg_length FROM emails"
+
+SUBJECTS = "SELECT subject FROM emails"
+
+# Full-text search: the newest matches (at most the second parameter) ranked by bm25, one page
+# of them, then their emails by rowid
+SEARCH_EMAILS = f"""
+    SELECT id, subject, sender_email, snippet, date, {FINAL_CATEGORY} as category, hits.rank
+    FROM (
+        SELECT rowid, rank FROM (
+            SELECT rowid, rank FROM emails_fts
+            WHERE emails_fts MATCH ?
+            ORDER BY rowid DESC
+            LIMIT ?
+        )
+        ORDER BY rank
+        LIMIT ? OFFSET ?
+    ) hits
+    JOIN emails ON emails.rowid = hits.rowid
+    ORDER BY hits.rank
+"""
+COUNT_SEARCH = "SELECT COUNT(*) FROM emails_fts WHERE emails_fts MATCH ?"
+
+# Labels: system labels are bits of label_mask (email_service.labels.LABEL_BITS), others are in email_labels
+LABEL_MASK_COUNTS = "SELECT label_mask, COUNT(*) FROM emails GROUP BY label_mask"
+COUNT_WITH_LABEL_BITS = "SELECT COUNT(*) FROM emails WHERE label_mask & ? != 0"
+LABEL_COUNTS = """
+    SELECT labels.name, COUNT(*)
+    FROM email_labels
+    JOIN labels ON labels.id = email_labels.label_id
+    GROUP BY email_labels.label_id
+"""
+
+# Every query above with example parameters, for the query plan test
+APP_QUERIES = {
+    'unreviewed_clusters': (UNREVIEWED_CLUSTERS.format(keyword_filter=''), [10]),
+    'unreviewed_clusters_keyword': (UNREVIEWED_CLUSTERS.format(keyword_filter=KEYWORD_FILTER), ['["m1"]', 10]),
+    'unreviewed_emails': (UNREVIEWED_EMAILS, [10]),
+    'reviewed_emails': (REVIEWED_EMAILS, [25, 0]),
+    'recent_manual': (RECENT_MANUAL, [5]),
+    'keyword_matches': (KEYWORD_MATCHES, ['["m1"]', 50]),
+    'distinct_categories': (DISTINCT_CATEGORIES, []),
+    'distinct_manual_categories': (DISTINCT_MANUAL_CATEGORIES, []),
+    'distinct_stored_categories': (DISTINCT_STORED_CATEGORIES, []),
+    'count_emails': (COUNT_EMAILS, []),
+    'count_unreviewed': (COUNT_UNREVIEWED, []),
+    'count_reviewed': (COUNT_REVIEWED, []),
+    'count_manual': (COUNT_MANUAL, []),
+    'category_counts': (CATEGORY_COUNTS, []),
+    'top_senders': (TOP_SENDERS, [10]),
+    'emails_per_date': (EMAILS_PER_DATE, []),
+    'unique_senders': (UNIQUE_SENDERS, []),
+    'unique_categories': (UNIQUE_CATEGORIES, []),
+    'count_with_attachments': (COUNT_WITH_ATTACHMENTS, []),
+    'average_body_length': (AVERAGE_BODY_LENGTH, []),
+    'subjects': (SUBJECTS, []),
+    'search_emails': (SEARCH_EMAILS, ['"sale"', 5000, 20, 0]),
+    'count_search': (COUNT_SEARCH, ['"sale"']),
+    'label_mask_counts': (LABEL_MASK_COUNTS, []),
+    'count_with_label_bits': (COUNT_WITH_LABEL_BITS, [8]),
+    'label_counts': (LABEL_COUNTS, []),
+}
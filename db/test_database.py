@@ -23,3 +23,82 @@ def test_create_tables(db):
     assert c.fetchone() is not None
 
     conn.close()
+
+
+def test_history_id_checkpoint(tmpdir):
+    db = Database(str(tmpdir.join("test_taskeroo.db")))
+    assert db.get_history_id('me@example.com') is None
+
+    db.save_history_id('me@example.com', 100)
+    db.save_history_id('me@example.com', 200)
+
+    assert db.get_history_id('me@example.com') == '200'
+
+
+def test_old_databases_gain_header_columns_and_indexes(tmpdir):
+    db_path = str(tmpdir.join("old_taskeroo.db"))
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE emails (id TEXT PRIMARY KEY, subject TEXT, label_ids TEXT)")
+    conn.commit()
+    conn.close()
+
+    Database(db_path)
+
+    conn = sqlite3.connect(db_path)
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(emails)")}
+    indexes = {row[1] for row in conn.execute("PRAGMA index_list(emails)")}
+    conn.close()
+    assert {'thread_id', 'message_id', 'list_id', 'list_unsubscribe', 'reviewed', 'is_manual'} <= columns
+    assert {'idx_emails_thread_id', 'idx_emails_message_id', 'idx_emails_list_id'} <= indexes
+
+
+def test_migrations_are_recorded_and_applied_once(tmpdir):
+    db_path = str(tmpdir.join("old_taskeroo.db"))
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE emails (id TEXT PRIMARY KEY, subject TEXT, email_body TEXT, label_ids TEXT)")
+    conn.execute("INSERT INTO emails (id, subject, email_body, label_ids) VALUES ('m1', 'Hi', 'Hello there', 'INBOX,Label_3')")
+    conn.commit()
+    conn.close()
+
+    db = Database(db_path)
+    assert db.migrate_schema() == []
+
+    conn = sqlite3.connect(db_path)
+    assert [row[0] for row in conn.execute("SELECT version FROM schema_version ORDER BY version")] == [1, 2, 3, 4, 5]
+    # Emails stored before the column existed are backfilled
+    assert conn.execute("SELECT body_length, label_mask FROM emails WHERE id = 'm1'").fetchone() == (11, 1)
+    assert conn.execute('''SELECT labels.name FROM email_labels JOIN labels ON labels.id = email_labels.label_id
+                           WHERE email_id = 'm1' ORDER BY labels.name''').fetchall() == [('INBOX',), ('Label_3',)]
+    conn.close()
+
+
+def test_pooled_connections_use_wal_and_are_reused(tmpdir):
+    db = Database(str(tmpdir.join("test_taskeroo.db")))
+
+    conn = db.connect()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == 'wal'
+    assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+    assert conn.execute("PRAGMA busy_timeout").fetchone()[0] > 0
+    conn.execute("INSERT INTO sync_state (account, history_id) VALUES ('me', '1')")
+    conn.close()
+
+    # close() hands the connection back with its uncommitted transaction rolled back
+    again = db.connect()
+    assert again is conn
+    assert again.execute("SELECT COUNT(*) FROM sync_state").fetchone()[0] == 0
+    again.close()
+
+
+def test_readers_are_not_blocked_by_a_writer(tmpdir):
+    db = Database(str(tmpdir.join("test_taskeroo.db")))
+    db.save_history_id('me', 1)
+
+    writer = db.connect()
+    writer.execute("BEGIN IMMEDIATE")
+    writer.execute("UPDATE sync_state SET history_id = '2'")
+
+    reader = db.connect()
+    assert reader.execute("SELECT history_id FROM sync_state").fetchone()[0] == '1'
+    reader.close()
+    writer.commit()
+    writer.close()
@@ -0,0 +1,29 @@
+# db/test_queries.py
+import re
+import sqlite3
+import pytest
+from db.database import Database
+from db.queries import APP_QUERIES
+
+
+@pytest.fixture
+def conn(tmpdir):
+    db = Database(str(tmpdir.join("test_taskeroo.db")))
+    conn = sqlite3.connect(db.db_path)
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize('name', sorted(APP_QUERIES))
+def test_app_queries_do_not_scan_the_emails_table(conn, name):
+    sql, params = APP_QUERIES[name]
+    partial = {row[1] for row in conn.execute("PRAGMA index_list(emails)") if row[4]}
+
+    for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params):
+        detail = row[3]
+        if not re.match(r'(SCAN|SEARCH) emails( |$)', detail):
+            continue
+        # Lookups, covering index scans and scans of a partial index never read every row
+        index = detail.split(' INDEX ')[-1].split()[0] if ' INDEX ' in detail else None
+        assert detail.startswith('SEARCH') or 'COVERING INDEX' in detail or index in partial, detail
+        assert 'sqlite_autoindex' not in detail or detail.startswith('SEARCH'), detail
@@ -0,0 +1,83 @@
+# email_service/backfill.py
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from config import BACKFILL_WORKERS
+
+PARTITION_DAYS = {'day': 1, 'week': 7}
+
+
+def partition_range(start_date, end_date, unit='day'):
+    """Split the inclusive date range into [start, end) partitions of a day or a week."""
+    if unit not in PARTITION_DAYS:
+        raise ValueError(f"Unknown partition unit: {unit}")
+    start = datetime.strptime(start_date, '%Y-%m-%d').date()
+    stop = datetime.strptime(end_date, '%Y-%m-%d').date() + timedelta(days=1)
+    if start >= stop:
+        raise ValueError(f"Backfill start {start_date} is after end {end_date}")
+
+    step = timedelta(days=PARTITION_DAYS[unit])
+    partitions = []
+    while start < stop:
+        end = min(start + step, stop)
+        partitions.append((start.isoformat(), end.isoformat()))
+        start = end
+    return partitions
+
+
+def fetch_partition(email_service, partition):
+    """Fetch one partition and report its message count, download failures and throughput."""
+    partition_start, partition_end = partition
+    started = time.monotonic()
+    failed = {}
+    count = email_service.fetch_emails(query=email_service.build_range_query(partition_start, partition_end),
+                                       failed=failed)
+    elapsed = time.monotonic() - started
+    return {
+        'partition_start': partition_start,
+        'partition_end': partition_end,
+        'message_count': count,
+        'failed_count': len(failed),
+        'elapsed_seconds': elapsed,
+        'messages_per_second': count / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+def run_backfill(email_service, start_date, end_date, unit='day', workers=BACKFILL_WORKERS, restart=False):
+    """Fetch every partition of the range on a worker pool, skipping partitions already done.
+
+    All workers share one EmailService, so authentication and the Gmail client are
+    set up once and every worker draws from the same quota limiter. A partition with
+    messages that could not be downloaded is recorded as 'partial' and fetched again
+    on the next run.
+    """
+    db = email_service.db
+    if restart:
+        db.reset_partitions()
+
+    done = db.completed_partitions()
+    partitions = [p for p in partition_range(start_date, end_date, unit) if p not in done]
+    print(f"Backfilling {len(partitions)} partitions ({len(done)} already complete)")
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {executor.submit(fetch_partition, email_service, p): p for p in partitions}
+        for future in as_completed(futures):
+            partition_start, partition_end = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logging.error(f"Backfill partition {partition_start}..{partition_end} failed: {e}")
+                db.record_partition(partition_start, partition_end, 'failed')
+                continue
+            status = 'partial' if result['failed_count'] else 'done'
+            db.record_partition(partition_start, partition_end, status,
+                                result['message_count'], result['elapsed_seconds'])
+            print(f"Partition {partition_start}..{partition_end}: {result['message_count']} messages "
+                  f"in {result['elapsed_seconds']:.1f}s ({result['messages_per_second']:.1f} msg/s)")
+            if result['failed_count']:
+                logging.warning(f"Partition {partition_start}..{partition_end} is partial: "
+                                f"{result['failed_count']} messages failed to download and will be retried")
+            results.append(result)
+    return results
@@ -0,0 +1,143 @@
+# email_service/batch_fetcher.py
+import logging
+import time
+from itertools import islice
+from config import GMAIL_BATCH_SIZE, GMAIL_BATCH_MAX_RETRIES
+
+# Gmail rejects batch requests with more than 100 sub-requests
+GMAIL_BATCH_LIMIT = 100
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def chunked(iterable, size):
+    """Yield lists of at most size items from any iterable."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def error_status(exception):
+    """Return the HTTP status code carried by an API error, or None."""
+    resp = getattr(exception, 'resp', None)
+    status = getattr(resp, 'status', None)
+    return int(status) if status is not None else None
+
+
+def is_retryable(exception):
+    """Rate limits, server errors and dropped connections are worth retrying."""
+    status = error_status(exception)
+    if status is None:
+        return isinstance(exception, OSError)
+    return status in RETRYABLE_STATUSES
+
+
+class GmailBatchTransport:
+    """Send messages().get calls through the Gmail batch HTTP endpoint.
+
+    http_factory, when given, supplies the HTTP object for each batch so that
+    concurrent workers do not share one (non thread-safe) httplib2 connection.
+    """
+
+    def __init__(self, service, http_factory=None):
+        self.service = service
+        self.http_factory = http_factory
+
+    def __call__(self, message_ids, **get_kwargs):
+        """Execute one batch and return {message_id: (response, exception)}."""
+        results = {}
+
+        def callback(request_id, response, exception):
+            results[request_id] = (response, exception)
+
+        batch = self.service.new_batch_http_request(callback=callback)
+        for message_id in message_ids:
+            request = self.service.users().messages().get(userId='me', id=message_id, **get_kwargs)
+            batch.add(request, request_id=message_id)
+        batch.execute(http=self.http_factory() if self.http_factory else None)
+        return results
+
+
+class BatchFetcher:
+    """Download Gmail messages in batches, retrying only the sub-requests that failed.
+
+    The transport is any callable taking a list of message IDs (plus messages().get
+    keyword arguments) and returning {message_id: (response, exception)}, so tests
+    can swap the Gmail batch endpoint for a local fake. With a FetchEngine, batches
+    run concurrently on its worker pool, metered by its quota limiter and retried
+    with its jittered backoff. Messages that could not be downloaded are recorded in the
+    failed dict passed to fetch(), or in self.failed; callers sharing one fetcher across
+    threads pass their own dict.
+    """
+
+    def __init__(self, service, batch_size=GMAIL_BATCH_SIZE, max_retries=GMAIL_BATCH_MAX_RETRIES,
+                 transport=None, retry_delay=1.0, sleep=time.sleep, engine=None):
+        self.batch_size = max(1, min(batch_size, GMAIL_BATCH_LIMIT))
+        self.max_retries = max_retries
+        self.transport = transport or GmailBatchTransport(service)
+        self.retry_delay = retry_delay
+        self.sleep = sleep
+        self.engine = engine
+        self.failed = {}
+
+    def fetch(self, message_ids, failed=None, **get_kwargs):
+        """Yield message resources for message_ids, one batch round trip per chunk.
+
+        Ids that could not be downloaded are added to failed ({message_id: exception}).
+        """
+        chunks = chunked(message_ids, self.batch_size)
+        if self.engine:
+            for messages in self.engine.map(lambda chunk: self.fetch_chunk(chunk, failed, **get_kwargs), chunks):
+                yield from messages
+            return
+        for chunk in chunks:
+            yield from self.fetch_chunk(chunk, failed, **get_kwargs)
+
+    def fetch_chunk(self, message_ids, failed=None, **get_kwargs):
+        """Fetch a single batch worth of messages and return the ones that succeeded."""
+        if failed is None:
+            failed = self.failed
+        pending = list(dict.fromkeys(message_ids))
+        messages = []
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.sleep(self._retry_delay(attempt - 1))
+            if self.engine:
+                self.engine.reserve('messages.get', len(pending))
+            results = self._execute(pending, get_kwargs)
+            retry = []
+            for message_id in pending:
+                response, exception = results.get(message_id, (None, None))
+                if exception is None and response is not None:
+                    messages.append(response)
+                elif exception is not None and not is_retryable(exception):
+                    logging.error(f"Failed to fetch message {message_id}: {exception}")
+                    failed[message_id] = exception
+                else:
+                    retry.append(message_id)
+            pending = retry
+            if not pending:
+                break
+            logging.warning(f"Retrying {len(pending)} failed sub-requests (attempt {attempt + 1})")
+
+        for message_id in pending:
+            logging.error(f"Giving up on message {message_id} after {self.max_retries} retries")
+            failed[message_id] = results.get(message_id, (None, None))[1]
+        return messages
+
+    def _retry_delay(self, attempt):
+        if self.engine:
+            return self.engine.backoff_delay(attempt)
+        return self.retry_delay * 2 ** attempt
+
+    def _execute(self, message_ids, get_kwargs):
+        """Run the transport, treating a failure of the whole batch as a failure of every item."""
+        try:
+            return self.transport(message_ids, **get_kwargs)
+        except Exception as e:
+            if not is_retryable(e):
+                raise
+            logging.warning(f"Batch request failed: {e}")
+            return {message_id: (None, e) for message_id in message_ids}
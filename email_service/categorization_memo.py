@@ -0,0 +1,115 @@
+# email_service/categorization_memo.py
+import hashlib
+import re
+import threading
+from cachetools import LRUCache
+from config import CATEGORIZATION_MEMO_SIZE
+
+# Bump when the scoring code or the key format changes in a way the keyword version does not capture
+SCORING_VERSION = '2'
+
+DIGIT_MASK = bytes.maketrans(b'123456789', b'000000000')
+MEMO_FIELDS = ['subject', 'email_body', 'sender_email']
+
+
+def normalize(text, mask_digits):
+    """Text in the form memo keys hash it: lower-cased (keyword matching ignores case), as UTF-8.
+
+    With mask_digits, every ASCII digit becomes '0', so daily digests that differ only
+    in dates, counts or order numbers of the same length share a key. That is only safe
+    while no keyword contains a digit: a token with digits can then never match, whatever
+    the digits are. Masking works on the encoded bytes, where it is one C-level pass, and
+    punctuation and spacing are kept: normalizing them with regexes cost about as much as
+    the keyword scan the memo saves.
+    """
+    encoded = (text or '').lower().encode('utf-8')
+    return encoded.translate(DIGIT_MASK) if mask_digits else encoded
+
+
+class CategorizationMemo:
+    """Keyword scores memoized by normalized content, in a bounded LRU backed by SQLite.
+
+    Keys hash the normalized subject, body and sender, the label set and the read and
+    important flags together with the keyword version, so editing the keyword file (or
+    SCORING_VERSION) makes every older entry unreachable; prune() deletes them. Without
+    a database the memo is in-memory only. Lookups only consult the LRU: on first use it
+    is warmed with the most recently stored entries of the current version in a single
+    query, rather than a SELECT per miss. Scores computed on a miss are written by
+    flush() on the caller's connection, so persisting rides on the store transaction.
+    The LRU, the pending list and the counters are shared by threads, so they are
+    only touched under a lock; scoring and database reads happen outside it.
+    """
+
+    def __init__(self, matcher, db=None, cache_size=CATEGORIZATION_MEMO_SIZE):
+        self.version = f'{matcher.version}:{SCORING_VERSION}'
+        self.mask_digits = not any(any(ch.isdigit() for ch in ' '.join(phrase)) for phrase in matcher.phrases)
+        self.db = db
+        self.cache = LRUCache(maxsize=cache_size)
+        self.pending = []
+        self.stored = None      # keys loaded from the database and not looked up since
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def key(self, email):
+        digest = hashlib.sha1(self.version.encode('utf-8'))
+        for field in MEMO_FIELDS:
+            digest.update(b'\x1e' + normalize(email.get(field), self.mask_digits))
+        labels = ','.join(sorted(set((email.get('label_ids') or '').split(','))))
+        flags = f"{bool(email.get('is_read', False))}:{bool(email.get('is_important', False))}"
+        digest.update(f'\x1e{labels}\x1e{flags}'.encode('utf-8'))
+        return digest.hexdigest()
+
+    def scores(self, email, compute):
+        """The memoized category scores of email, calling compute(email) on a miss."""
+        key = self.key(email)
+        if self.stored is None:
+            self._warm()
+        with self.lock:
+            scores = self.cache.get(key)
+            if scores is not None:
+                if key in self.stored:
+                    self.stored.discard(key)
+                    self.db_hits += 1
+                else:
+                    self.hits += 1
+                return dict(scores)
+
+        scores = dict(compute(email))
+        with self.lock:
+            self.misses += 1
+            if self.db is not None:
+                self.pending.append((key, self.version, scores))
+            self.cache[key] = scores
+        return dict(scores)
+
+    def _warm(self):
+        stored = self.db.load_memo_scores(self.version, self.cache.maxsize) if self.db is not None else {}
+        with self.lock:
+            if self.stored is not None:
+                return
+            for key, scores in stored.items():
+                self.cache.setdefault(key, scores)
+            self.stored = set(stored)
+
+    def flush(self, conn):
+        """Write the scores computed since the last flush. The caller commits."""
+        with self.lock:
+            pending, self.pending = self.pending, []
+        if pending and self.db is not None:
+            self.db.save_memo_scores(pending, conn)
+
+    def prune(self):
+        """Delete persisted entries of other keyword or scoring versions."""
+        return self.db.prune_memo(self.version) if self.db is not None else 0
+
+    def stats(self):
+        lookups = self.hits + self.db_hits + self.misses
+        return {
+            'hits': self.hits,
+            'db_hits': self.db_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.db_hits) / lookups if lookups else 0.0,
+            'cached': len(self.cache),
+        }
@@ -0,0 +1,177 @@
+# email_service/classifier.py
+import math
+import zlib
+from collections import Counter, defaultdict
+from email_service.keyword_matcher import tokenize
+from email_service.sender_prior import sender_domain, observe_correction
+from config import CLASSIFIER_FEATURES, CLASSIFIER_ALPHA
+
+
+class NaiveBayesClassifier:
+    """Multinomial naive Bayes over hashed sparse features, updatable one email at a time.
+
+    Features are subject and body words, the sender domain and the Gmail labels, each
+    prefixed by its field and hashed into n_features buckets with crc32 (stable across
+    processes, unlike hash()). Counts are kept per feature as {category: count}, so
+    learning an email touches only its own features; prediction sums cached per-feature
+    log-weight vectors, skipping features never seen. Persisted counts live in SQLite and
+    updates are written as deltas, so any process can teach the model without loading it.
+    """
+
+    def __init__(self, n_features=CLASSIFIER_FEATURES, alpha=CLASSIFIER_ALPHA):
+        self.n_features = n_features
+        self.alpha = alpha
+        self.counts = defaultdict(dict)      # feature -> {category: count}
+        self.documents = Counter()           # category -> emails learned
+        self.tokens = Counter()              # category -> feature occurrences learned
+        self._categories = []                # column order of the cached weight vectors
+        self._weights = {}                   # feature -> log-weight per category, rebuilt lazily
+
+    def features(self, email):
+        """Hashed feature counts of an email row."""
+        raw = ['s:' + token for token in tokenize(email.get('subject'))]
+        raw += ['b:' + token for token in tokenize(email.get('email_body'))]
+        domain = sender_domain(email.get('sender_email'))
+        if domain:
+            raw.append('d:' + domain)
+        raw += ['l:' + label for label in (email.get('label_ids') or '').split(',') if label]
+        mask = self.n_features - 1
+        return Counter(zlib.crc32(feature.encode('utf-8')) & mask for feature in raw)
+
+    def update(self, email, category, weight=1, conn=None):
+        """Learn (weight=1) or unlearn (weight=-1) one labelled email; with conn, persist the delta too.
+
+        The caller commits.
+        """
+        features = self.features(email)
+        for feature, count in features.items():
+            categories = self.counts[feature]
+            categories[category] = categories.get(category, 0) + weight * count
+            self._weights.pop(feature, None)
+        total = weight * sum(features.values())
+        self.documents[category] += weight
+        self.tokens[category] += total
+
+        if conn is not None:
+            conn.executemany('''INSERT INTO classifier_features (feature, category, count) VALUES (?, ?, ?)
+                                ON CONFLICT(feature, category) DO UPDATE SET count = count + excluded.count''',
+                             [(feature, category, weight * count) for feature, count in features.items()])
+            conn.execute('''INSERT INTO classifier_classes (category, documents, tokens) VALUES (?, ?, ?)
+                            ON CONFLICT(category) DO UPDATE SET documents = documents + excluded.documents,
+                                                                tokens = tokens + excluded.tokens''',
+                         (category, weight, total))
+
+    def predict(self, email):
+        """Return (category, confidence) for an email row, or (None, 0.0) before any training."""
+        categories = [category for category, documents in self.documents.items() if documents > 0]
+        if not categories:
+            return None, 0.0
+
+        if categories != self._categories:
+            self._categories = categories
+            self._weights.clear()
+
+        features = self.features(email)
+        length = sum(features.values())
+        vocabulary = self.alpha * max(len(self.counts), 1)
+        total_documents = sum(self.documents[category] for category in categories)
+        rows = [[math.log(self.documents[category] / total_documents)
+                 - length * math.log(self.tokens[category] + vocabulary) for category in categories]]
+        cached = self._weights
+        for feature, count in features.items():
+            weights = cached.get(feature) or self._feature_weights(feature)
+            if weights is not None:
+                rows.extend([weights] * count)
+        # Column sums add up every feature's contribution per category in C
+        scores = [sum(column) for column in zip(*rows)]
+
+        top = max(scores)
+        best = categories[scores.index(top)]
+        confidence = 1.0 / sum(math.exp(score - top) for score in scores)
+        return best, confidence
+
+    def _feature_weights(self, feature):
+        """Per-category log(count + alpha) - log(alpha) of a feature, or None if it was never seen.
+
+        Features never seen with a category contribute log(alpha) to every class alike, so
+        that constant is dropped and unseen features can be skipped entirely.
+        """
+        weights = self._weights.get(feature)
+        if weights is None:
+            seen = self.counts.get(feature)
+            if not seen:
+                return None
+            log_alpha = math.log(self.alpha)
+            weights = [math.log(max(seen.get(category, 0), 0) + self.alpha) - log_alpha
+                       for category in self._categories]
+            self._weights[feature] = weights
+        return weights
+
+    def predict_many(self, emails):
+        """Predict a batch of email rows, returning a list of (category, confidence)."""
+        return [self.predict(email) for email in emails]
+
+    def is_trained(self):
+        return any(documents > 0 for documents in self.documents.values())
+
+    @classmethod
+    def load(cls, conn, n_features=CLASSIFIER_FEATURES, alpha=CLASSIFIER_ALPHA):
+        """Load the persisted counts into a classifier."""
+        classifier = cls(n_features=n_features, alpha=alpha)
+        for category, documents, tokens in conn.execute("SELECT category, documents, tokens FROM classifier_classes"):
+            classifier.documents[category] = documents
+            classifier.tokens[category] = tokens
+        for feature, category, count in conn.execute("SELECT feature, category, count FROM classifier_features WHERE count > 0"):
+            classifier.counts[feature][category] = count
+        return classifier
+
+
+CORRECTION_COLUMNS = ['subject', 'email_body', 'sender_email', 'label_ids', 'manually_updated_category']
+
+
+def record_correction(conn, email_id, category, classifier=None):
+    """Store a manual category for an email and teach the classifier and the sender priors from it.
+
+    An earlier manual category of the same email is unlearned first, so changing one's
+    mind does not leave both labels in the model. Returns False if the email is unknown.
+    """
+    row = conn.execute(f"SELECT {', '.join(CORRECTION_COLUMNS)} FROM emails WHERE id = ?", (email_id,)).fetchone()
+    if row is None:
+        return False
+    email = dict(zip(CORRECTION_COLUMNS, row))
+    classifier = classifier if classifier is not None else NaiveBayesClassifier()
+
+    previous = email['manually_updated_category']
+    if previous != category:
+        if previous:
+            classifier.update(email, previous, weight=-1, conn=conn)
+        classifier.update(email, category, conn=conn)
+        observe_correction(conn, email['sender_email'], category, previous)
+    conn.execute("UPDATE emails SET manually_updated_category = ?, is_manual = 1 WHERE id = ?", (category, email_id))
+    conn.commit()
+    return True
+
+
+def retrain(conn, n_features=CLASSIFIER_FEATURES, alpha=CLASSIFIER_ALPHA):
+    """Rebuild the persisted model from the manually categorized emails.
+
+    Near-duplicates count once: of each cluster only the lowest id per category is
+    learned from, the representative categorize_cluster teaches, so a burst of
+    identical mail categorized in one action does not outweigh everything else.
+    """
+    conn.execute("DELETE FROM classifier_features")
+    conn.execute("DELETE FROM classifier_classes")
+    classifier = NaiveBayesClassifier(n_features=n_features, alpha=alpha)
+    rows = conn.execute(f'''SELECT {', '.join(CORRECTION_COLUMNS)} FROM (
+                                SELECT *, ROW_NUMBER() OVER (PARTITION BY COALESCE(cluster_id, id), manually_updated_category
+                                                             ORDER BY id) AS copy
+                                FROM emails
+                                WHERE is_manual = 1 AND manually_updated_category IS NOT NULL
+                                  AND manually_updated_category != '')
+                            WHERE copy = 1
+                         ''').fetchall()
+    for row in rows:
+        email = dict(zip(CORRECTION_COLUMNS, row))
+        classifier.update(email, email['manually_updated_category'], conn=conn)
+    conn.commit()
+    return len(rows)
@@ -1,118 +1,487 @@
 # email/email_service.py
 from db.database import Database
-from email_service.gmail_client import create_gmail_client
+from email_service.gmail_client import create_gmail_client, thread_authorized_http
+from email_service.batch_fetcher import BatchFetcher, GmailBatchTransport, chunked, error_status
+from email_service.fetch_engine import FetchEngine, QUOTA_UNITS
+from email_service.pagination import iter_message_ids
+from email_service.history_sync import collect_history_changes
+from email_service.parse_pool import ParsePool
+from email_service.keyword_matcher import KeywordMatcher
+from email_service.keyword_index import unindex_emails
+from email_service.classifier import NaiveBayesClassifier, record_correction
+from email_service.sender_prior import SenderPriors
+from email_service.categorization_memo import CategorizationMemo
+from email_service.near_duplicates import remove_signatures
+from email_service.email_writer import EmailWriter
+from email_service.rules import RuleSet
+from email_service.labels import LABEL_BITS, label_mask, email_label_mask, store_labels, remove_labels
+from googleapiclient.errors import HttpError
 from datetime import datetime, timedelta
 from collections import defaultdict
+from itertools import chain, islice
 import re
 import json
 import base64
+import codecs
 import quopri
 from email import message_from_bytes
 import logging
-from config import EMAIL_BODY_TRUNCATION_LENGTH, TRUNCATION_INDICATOR, KEYWORDS_PATH, MAX_FETCH_EMAILS
+import os
+import threading
+from config import (EMAIL_BODY_TRUNCATION_LENGTH, TRUNCATION_INDICATOR, KEYWORDS_PATH, HISTORY_RESYNC_DAYS,
+                    GMAIL_LIST_PAGE_SIZE, PARSE_WORKERS, PARSE_CHUNK_SIZE, SENDER_PRIOR_WEIGHT)
+
+# messages().get parameters: full payload (minus unused fields) for new mail, labels only for known mail
+FULL_MESSAGE_PARAMS = {
+    'format': 'full',
+    'fields': 'id,threadId,labelIds,snippet,internalDate,payload(mimeType,filename,headers,body,parts)',
+}
+LABEL_REFRESH_PARAMS = {'format': 'minimal', 'fields': 'id,labelIds'}
+
+def keywords_mtime(path=KEYWORDS_PATH):
+    """Modification time of the keywords file, or None if it is missing."""
+    try:
+        return os.path.getmtime(path)
+    except FileNotFoundError:
+        return None
+
+def load_keywords(path=KEYWORDS_PATH):
+    """Load the category -> keywords mapping, or an empty mapping if the file is missing."""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        print(f"Warning: Keywords file not found at {path}. Using empty keywords.")
+        return {}
 
 class EmailService:
     def __init__(self, creds):
         self.service = create_gmail_client(creds)
         self.db = Database()
+        # Read before loading, so a change made while loading is picked up by the next refresh()
+        self.versions = self.model_versions()
+        self.refresh_lock = threading.Lock()
+        self.engine = FetchEngine(http_factory=lambda: thread_authorized_http(creds))
+        transport = GmailBatchTransport(self.service, http_factory=lambda: thread_authorized_http(creds))
+        self.batch_fetcher = BatchFetcher(self.service, transport=transport, engine=self.engine)
+        self.parse_pool = None
+        self.keywords = load_keywords()
+        self.matcher = KeywordMatcher(self.keywords)
+        self.classifier = self.load_classifier()
+        self.rules = self.load_rules()
+        self.sender_priors = SenderPriors(self.db)
+        self.memo = CategorizationMemo(self.matcher, self.db)
+        self.writers = threading.local()
+
+    @classmethod
+    def parser(cls, keywords, db=None):
+        """An EmailService that only parses and categorizes, with no Gmail client and an optional database."""
+        service = cls.__new__(cls)
+        service.service = None
+        service.db = db
+        service.versions = service.model_versions() if db else None
+        service.refresh_lock = threading.Lock()
+        service.parse_pool = None
+        service.keywords = keywords
+        service.matcher = KeywordMatcher(keywords)
+        service.classifier = service.load_classifier() if db else None
+        service.rules = service.load_rules() if db else None
+        service.sender_priors = SenderPriors(db) if db else None
+        service.memo = CategorizationMemo(service.matcher, db)
+        service.writers = threading.local()
+        return service
+
+    def model_versions(self):
+        """Versions of the keywords file, the rules and the classifier, as refresh() compares them."""
+        versions = dict(self.db.get_model_versions())
+        versions['keywords'] = keywords_mtime()
+        return versions
+
+    def refresh(self):
+        """Reload the keywords, rules or classifier another process changed since they were loaded.
+
+        A long-lived service (the API's) calls this per request; when nothing changed it
+        costs a stat() and a small SELECT. Returns True if anything was reloaded.
+        """
+        if self.db is None:
+            return False
+        versions = self.model_versions()
+        if versions == self.versions:
+            return False
+        with self.refresh_lock:
+            loaded = self.versions
+            if versions == loaded:
+                return False
+            conn = self.db.connect()
+            try:
+                # Write what the outgoing memo and rules still hold before replacing them
+                if versions['keywords'] != loaded['keywords']:
+                    self.memo.flush(conn)
+                    self.keywords = load_keywords()
+                    self.matcher = KeywordMatcher(self.keywords)
+                    self.memo = CategorizationMemo(self.matcher, self.db)
+                if versions['rules'] != loaded['rules']:
+                    if self.rules:
+                        self.rules.flush(conn)
+                    self.rules = RuleSet.load(conn)
+                if versions['classifier'] != loaded['classifier']:
+                    self.classifier = NaiveBayesClassifier.load(conn)
+                conn.commit()
+            finally:
+                conn.close()
+            self.versions = versions
+        return True
+
+    def load_classifier(self):
+        """Load the naive Bayes model trained from manual categorizations."""
+        conn = self.db.connect()
         try:
-            with open(KEYWORDS_PATH, 'r') as f:
-                self.keywords = json.load(f)
-        except FileNotFoundError:
-            print(f"Warning: Keywords file not found at {KEYWORDS_PATH}. Using empty keywords.")
-            self.keywords = {}
-
-    def fetch_emails(self, date=None, max_results=MAX_FETCH_EMAILS):
-        """Fetch emails for the specified date and store them in the database."""
-        
+            return NaiveBayesClassifier.load(conn)
+        finally:
+            conn.close()
+
+    def load_rules(self):
+        """Compile the user-defined categorization rules."""
+        conn = self.db.connect()
+        try:
+            return RuleSet.load(conn)
+        finally:
+            conn.close()
+
+    def enable_parse_pool(self, workers=PARSE_WORKERS, chunk_size=PARSE_CHUNK_SIZE):
+        """Parse and categorize fetched messages on a process pool instead of the fetch thread.
+
+        workers of 0 or None (PARSE_WORKERS unset) keeps parsing inline.
+        """
+        if workers and self.parse_pool is None:
+            self.parse_pool = ParsePool(self.keywords, workers=workers, chunk_size=chunk_size)
+        return self.parse_pool
+
+    def close(self):
+        """Shut down the parse pool, if one was started."""
+        if self.parse_pool:
+            self.parse_pool.close()
+            self.parse_pool = None
+
+    def fetch_emails(self, date=None, max_results=None, query=None, failed=None):
+        """Fetch emails for the specified date and store them in the database.
+
+        Returns the number of emails stored; ids that could not be downloaded are added to
+        failed. Use iter_emails to consume them as a stream.
+        """
+        count = 0
+        for _ in self.iter_emails(date=date, max_results=max_results, query=query, failed=failed):
+            count += 1
+        return count
+
+    def iter_emails(self, date=None, max_results=None, query=None, failed=None):
+        """Stream every Inbox and Trash email for the date, yielding each one once it is queued for storing.
+
+        A raw Gmail search query may be passed instead of a date. Emails are written in
+        batches; the last batch is written when the stream ends or is closed. Ids that
+        could not be downloaded are added to failed ({message_id: exception}).
+        """
+
         if not self.service:
             print('No Valid Credentials Provided')
-            return []
-            
-        if date:
-            start_date = datetime.strptime(date, '%Y-%m-%d')
-            end_date = start_date + timedelta(days=1)
-            query = f"after:{start_date.strftime('%Y/%m/%d')} before:{end_date.strftime('%Y/%m/%d')}"
-        else:
-            query = ''
-                     
-        # Fetch emails from Inbox
-        results_inbox = self.service.users().messages().list(userId='me', q=query, maxResults=max_results).execute()
-        messages_inbox = results_inbox.get('messages', [])
-        print(f"Inbox: Fetched {len(messages_inbox)} messages.")
-
-        # Fetch emails from Trash
-        results_trash = self.service.users().messages().list(userId='me', q=query, labelIds=['TRASH'], maxResults=max_results).execute()
-        messages_trash = results_trash.get('messages', [])
-        print(f"Trash: Fetched {len(messages_trash)} messages.")
-
-        messages = messages_inbox + messages_trash    
-        
-        if not messages:
+            return
+
+        if query is None:
+            query = self.build_query(date)
+
+        # Walk every page of both listings lazily instead of materialising the ID lists
+        message_ids = self._unique(chain(
+            iter_message_ids(self.service, query=query, engine=self.engine),
+            iter_message_ids(self.service, query=query, label_ids=['TRASH'], engine=self.engine)
+        ))
+        if max_results:
+            message_ids = islice(message_ids, max_results)
+
+        # Failures of this call only: backfill partitions share the fetcher
+        if failed is None:
+            failed = {}
+        count = 0
+        refreshed = 0
+
+        # Open a single connection for all inserts
+        conn = self.db.connect()
+        try:
+            for chunk in chunked(message_ids, GMAIL_LIST_PAGE_SIZE):
+                # Listing and label refreshes add nothing, so the writer's deadline is checked here too
+                self.flush_due_emails(conn)
+                # Messages already stored only need their labels refreshed
+                known = self.known_ids(chunk, conn)
+                if known:
+                    labels = {msg['id']: msg.get('labelIds', [])
+                              for msg in self.batch_fetcher.fetch(known, failed, **LABEL_REFRESH_PARAMS)}
+                    self.update_labels(labels, conn)
+                    refreshed += len(labels)
+
+                # Download new messages in batches instead of one round trip per message
+                new_ids = [message_id for message_id in chunk if message_id not in known]
+                for email_data in self.build_email_records(self.batch_fetcher.fetch(new_ids, failed, **FULL_MESSAGE_PARAMS)):
+                    print(f"Storing email: {email_data['subject']} (ID: {email_data['id']})")
+                    self.store_email(email_data, conn)
+                    count += 1
+                    yield email_data
+                    self.flush_due_emails(conn)
+        finally:
+            try:
+                self.flush_emails(conn)
+            finally:
+                conn.close()
+
+        if refreshed:
+            print(f'Refreshed labels of {refreshed} known messages.')
+        if not count:
             print('No messages found.')
-            return []
         else:
-            print(f'Fetched {len(messages)} messages.')
-        
-        emails = []
-        
-        # Open a single connection for all inserts
+            print(f'Fetched {count} messages.')
+
+        if failed:
+            logging.warning(f"Failed to download {len(failed)} messages")
+        logging.info(f"Categorization memo: {self.memo.stats()}")
+
+    def sync_incremental(self, resync_days=HISTORY_RESYNC_DAYS):
+        """Apply only the Gmail changes since the last historyId checkpoint.
+
+        Falls back to re-fetching the last resync_days days when there is no checkpoint
+        or Gmail has expired the history window. Returns a summary of the changes applied.
+        The checkpoint only advances once every added message was downloaded; otherwise
+        the next sync replays the same history (re-applying it is harmless).
+        """
+        if not self.service:
+            print('No Valid Credentials Provided')
+            return None
+
+        profile = self.engine.execute(self.service.users().getProfile(userId='me'), cost=QUOTA_UNITS['getProfile'])
+        account = profile['emailAddress']
+        start_history_id = self.db.get_history_id(account)
+
+        changes = None
+        if start_history_id:
+            try:
+                changes = collect_history_changes(self.service, start_history_id, engine=self.engine)
+            except HttpError as e:
+                if error_status(e) != 404:
+                    raise
+                logging.warning(f"History {start_history_id} for {account} has expired; running a full resync")
+
+        if changes is None:
+            return self.resync_recent(account, profile['historyId'], resync_days)
+
+        failed = {}
         conn = self.db.connect()
         try:
-            for message in messages:
-                msg = self.service.users().messages().get(userId='me', id=message['id']).execute()
-                email_data = self.parse_email(msg)
-                categorization = self.categorize_email(email_data)
-                email_data.update({
-                    'category': categorization['primary_category'],
-                    'secondary_categories': ','.join(categorization['secondary_categories']),
-                    'confidence_score': categorization['confidence'],
-                    'all_categories': json.dumps(categorization['all_categories']),
-                    'is_read': 'UNREAD' not in msg['labelIds'],
-                    'is_important': 'IMPORTANT' in msg['labelIds'],
-                    'user_feedback': None,  # To be filled by user feedback later
-                    'user_tags': None,  # Add this line to include user_tags
-                    'is_manual': 0,  # Default value
-                    'manually_updated_category': None,  # Default value
-                    'reviewed': 0,  # Default value
-                    'ml_category': None  # Default value
-                })
-                print(f"Storing email: {email_data['subject']} (ID: {email_data['id']})")
+            self.delete_emails(changes.deleted, conn)
+            self.update_labels(changes.label_only, conn)
+            added = 0
+            messages = self.batch_fetcher.fetch(sorted(changes.added), failed, **FULL_MESSAGE_PARAMS)
+            for email_data in self.build_email_records(messages):
                 self.store_email(email_data, conn)
-                emails.append(email_data)
+                added += 1
+            self.flush_emails(conn)
         finally:
             conn.close()
 
-        return emails
+        if failed:
+            logging.warning(f"Failed to download {len(failed)} added messages; keeping checkpoint {start_history_id}")
+        else:
+            self.db.save_history_id(account, changes.history_id or start_history_id)
+        summary = {'added': added, 'deleted': len(changes.deleted), 'relabeled': len(changes.label_only),
+                   'failed': len(failed), 'full_resync': False}
+        print(f"Incremental sync for {account}: {summary}")
+        return summary
 
+    def resync_recent(self, account, history_id, days=HISTORY_RESYNC_DAYS):
+        """Re-fetch the last days of mail and checkpoint at history_id, read before the fetch began.
 
-    def store_email(self, email, conn):
-        """Store email in the database."""
-        c = conn.cursor()
-
-        # Insert email into the emails table
-        c.execute('''INSERT OR REPLACE INTO emails 
-                 (id, subject, snippet, date, label_ids, sender_email, email_body, 
-                  attachment_info, received_time, category, user_tags, is_manual, 
-                  manually_updated_category, reviewed, ml_category, confidence_score, 
-                  is_read, is_important, user_feedback, secondary_categories, all_categories) 
-                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-              (email['id'], email['subject'], email['snippet'], email['date'], 
-               email['label_ids'], email['sender_email'], email['email_body'], 
-               email['attachment_info'], email['received_time'], email['category'],
-               email['user_tags'], email['is_manual'], email['manually_updated_category'],
-               email['reviewed'], email['ml_category'], email['confidence_score'],
-               email['is_read'], email['is_important'], email['user_feedback'], 
-               email['secondary_categories'], email['all_categories']))
+        Without a checkpoint (some messages failed to download) the next sync resyncs again.
+        """
+        failed = {}
+        added = self.fetch_emails(query=f'newer_than:{days}d', failed=failed)
+        if failed:
+            logging.warning(f"Failed to download {len(failed)} messages; not checkpointing the resync")
+        else:
+            self.db.save_history_id(account, history_id)
+        summary = {'added': added, 'deleted': 0, 'relabeled': 0, 'failed': len(failed), 'full_resync': True}
+        print(f"Full resync of the last {days} days for {account}: {summary}")
+        return summary
+
+    def known_ids(self, message_ids, conn):
+        """Return the subset of message_ids already stored, in one set-based query."""
+        rows = conn.execute("SELECT id FROM emails WHERE id IN (SELECT value FROM json_each(?))",
+                            (json.dumps(list(message_ids)),)).fetchall()
+        return {row[0] for row in rows}
+
+    @staticmethod
+    def _unique(message_ids):
+        """Drop IDs listed more than once (e.g. moved to Trash between the two listings)."""
+        seen = set()
+        for message_id in message_ids:
+            if message_id not in seen:
+                seen.add(message_id)
+                yield message_id
+
+    def update_labels(self, labels_by_id, conn):
+        """Refresh label_ids and the flags, bitmask and email_labels rows derived from them for already stored emails."""
+        conn.executemany(
+            "UPDATE emails SET label_ids = ?, label_mask = ?, is_read = ?, is_important = ? WHERE id = ?",
+            [(','.join(labels), label_mask(labels), 'UNREAD' not in labels, 'IMPORTANT' in labels, message_id)
+             for message_id, labels in labels_by_id.items()])
+        store_labels(conn, labels_by_id)
+        conn.commit()
 
+    def delete_emails(self, message_ids, conn):
+        """Remove emails that were permanently deleted in Gmail."""
+        conn.executemany("DELETE FROM emails WHERE id = ?", [(message_id,) for message_id in message_ids])
+        unindex_emails(conn, message_ids)
+        remove_signatures(conn, message_ids)
+        remove_labels(conn, message_ids)
         conn.commit()
 
+    def build_query(self, date=None):
+        """Build the Gmail search query covering a single day, or everything when date is None."""
+        if not date:
+            return ''
+        end_date = datetime.strptime(date, '%Y-%m-%d') + timedelta(days=1)
+        return self.build_range_query(date, end_date.strftime('%Y-%m-%d'))
+
+    def build_range_query(self, start_date, end_date):
+        """Build the Gmail search query for [start_date, end_date), both YYYY-MM-DD."""
+        start = datetime.strptime(start_date, '%Y-%m-%d')
+        end = datetime.strptime(end_date, '%Y-%m-%d')
+        return f"after:{start.strftime('%Y/%m/%d')} before:{end.strftime('%Y/%m/%d')}"
+
+    def build_email_records(self, messages):
+        """Turn a stream of Gmail messages into rows, on the parse pool when one is enabled."""
+        if self.parse_pool:
+            # Pool workers have no database, so rules and sender priors are applied here
+            records = self.finish_categorization(self.parse_pool.map(messages))
+        else:
+            records = (self.build_email_record(msg) for msg in messages)
+        return self.predict_ml_categories(records)
+
+    def finish_categorization(self, records):
+        """Re-classify rows from the parse pool, reusing the keyword scores the workers computed."""
+        for record in records:
+            scores = json.loads(record['all_categories'])
+            record.update(self.categorization_columns(self.classify(record, scores)))
+            yield record
+
+    def predict_ml_categories(self, records):
+        """Fill ml_category and ml_confidence from the classifier, once it has been taught."""
+        for record in records:
+            if self.classifier is not None and self.classifier.is_trained():
+                record['ml_category'], record['ml_confidence'] = self.classifier.predict(record)
+            yield record
+
+    def build_email_record(self, msg):
+        """Parse and categorize a Gmail message into a row for the emails table."""
+        email_data = self.parse_email(msg)
+        email_data.update(self.categorization_columns(self.classify(email_data)))
+        email_data.update({
+            'is_read': 'UNREAD' not in msg['labelIds'],
+            'is_important': 'IMPORTANT' in msg['labelIds'],
+            'user_feedback': None,  # To be filled by user feedback later
+            'user_tags': None,  # Add this line to include user_tags
+            'is_manual': 0,  # Default value
+            'manually_updated_category': None,  # Default value
+            'reviewed': 0,  # Default value
+            'ml_category': None,  # Filled by predict_ml_categories once the classifier is trained
+            'ml_confidence': None
+        })
+        return email_data
+
+
+    def classify(self, email, scores=None):
+        """Categorize a parsed email: user rules first, then the sender shortcut for settled senders, then keywords.
+
+        scores, when given, are the email's already computed keyword scores.
+        """
+        matched = self.apply_rules(email)
+        if matched:
+            return matched
+        prior = self.sender_priors.lookup(email.get('sender_email')) if self.sender_priors else None
+        if prior is not None:
+            shortcut = prior.shortcut()
+            if shortcut:
+                return shortcut
+        return self.categorize_email(email, prior, scores)
+
+    def apply_rules(self, email):
+        """The categorization given by the matching user rule, or None."""
+        return self.rules.categorize(email) if self.rules else None
+
+    def provide_feedback(self, email_id, category):
+        """Record a manual category for an email and teach the classifier from it."""
+        conn = self.db.connect()
+        try:
+            found = record_correction(conn, email_id, category, self.classifier)
+            if found:
+                if self.sender_priors:
+                    sender = conn.execute("SELECT sender_email FROM emails WHERE id = ?", (email_id,)).fetchone()[0]
+                    self.sender_priors.forget(sender)
+                conn.execute("INSERT INTO interactions (email_id, interaction, timestamp) VALUES (?, ?, ?)",
+                             (email_id, f"feedback:{category}", datetime.now().isoformat()))
+                conn.commit()
+            return found
+        finally:
+            conn.close()
+
+    @staticmethod
+    def categorization_columns(categorization):
+        """The emails-table columns for a categorize_email result.
+
+        category_source ('rule', 'sender_prior' or 'keywords') is not stored; the writer
+        uses it to keep shortcut results out of the sender priors.
+        """
+        return {
+            'category': categorization['primary_category'],
+            'secondary_categories': ','.join(categorization['secondary_categories']),
+            'confidence_score': categorization['confidence'],
+            'all_categories': json.dumps(categorization['all_categories']),
+            'category_source': categorization.get('source'),
+        }
+
+    def thread_writers(self):
+        """The calling thread's batched writers, one per connection it stores emails on."""
+        writers = getattr(self.writers, 'by_conn', None)
+        if writers is None:
+            writers = self.writers.by_conn = {}
+        return writers
+
+    def store_email(self, email, conn):
+        """Queue an email for the batched writer on conn. Call flush_emails(conn) before closing conn.
+
+        Writers belong to the calling thread, so backfill workers sharing this service
+        never flush or write through each other's connections.
+        """
+        writers = self.thread_writers()
+        writer = writers.get(conn)
+        if writer is None:
+            writer = writers[conn] = EmailWriter(self, conn)
+        writer.add(email)
+
+    def flush_emails(self, conn=None):
+        """Write the emails still queued by store_email on conn, or on every connection of the calling thread."""
+        writers = self.thread_writers()
+        for writer_conn in ([conn] if conn is not None else list(writers)):
+            writer = writers.pop(writer_conn, None)
+            if writer is not None:
+                writer.flush()
+
+    def flush_due_emails(self, conn):
+        """Write the emails queued on conn by the calling thread if the oldest has waited STORE_FLUSH_MS."""
+        writer = self.thread_writers().get(conn)
+        return writer.flush_if_due() if writer is not None else 0
+
     def parse_email(self, msg):
         """Parse the email message and extract relevant information."""
-        headers = msg['payload']['headers']
-        subject = next((header['value'] for header in headers if header['name'].lower() == 'subject'), '')
-        sender = next((header['value'] for header in headers if header['name'].lower() == 'from'), '')
-        date = next((header['value'] for header in headers if header['name'].lower() == 'date'), '')
+        headers = self.index_headers(msg['payload'].get('headers', []))
+        subject = headers.get('subject', '')
+        sender = headers.get('from', '')
+        date = headers.get('date', '')
 
         # Extract the email body
         body = self.get_email_body(msg['payload'])
@@ -131,48 +500,115 @@ class EmailService:
             'snippet': msg['snippet'],
             'date': date,
             'label_ids': ','.join(msg['labelIds']),
+            'label_mask': label_mask(msg['labelIds']),
             'sender_email': sender,
             'email_body': body,
             'attachment_info': json.dumps(self.get_attachment_info(msg)),
-            'received_time': msg['internalDate']
+            'received_time': msg['internalDate'],
+            'thread_id': msg.get('threadId'),
+            'message_id': headers.get('message-id'),
+            'list_id': self.parse_list_id(headers.get('list-id')),
+            'list_unsubscribe': headers.get('list-unsubscribe')
         }
 
-    def get_email_body(self, payload):
-        """Recursively extract the email body from the payload."""
-        if 'body' in payload and 'data' in payload['body']:
-            return self.decode_body(payload['body']['data'])
-        
-        if 'parts' in payload:
-            for part in payload['parts']:
-                if part['mimeType'] in ['text/plain', 'text/html']:
-                    return self.decode_body(part['body'].get('data', ''))
-                elif 'parts' in part:
-                    body = self.get_email_body(part)
-                    if body:
-                        return body
-        
-        logging.warning(f"Could not find body in payload: {payload}")
-        return ''
+    def index_headers(self, headers):
+        """Index headers by lowercased name in one pass; the first occurrence of a name wins."""
+        index = {}
+        for header in headers:
+            index.setdefault(header['name'].lower(), header['value'])
+        return index
+
+    def parse_list_id(self, value):
+        """Reduce a List-Id header such as 'Weekly <weekly.example.com>' to its identifier."""
+        if not value:
+            return None
+        match = re.search(r'<([^>]+)>', value)
+        return match.group(1).strip().lower() if match else value.strip().lower()
+
+    def get_email_body(self, payload, limit=EMAIL_BODY_TRUNCATION_LENGTH):
+        """Extract at most limit characters of the email body from the payload.
+
+        text/plain is preferred over text/html, and only the chosen part is decoded.
+        """
+        part = self.find_body_part(payload)
+        if part is None:
+            logging.warning(f"Could not find body in payload: {payload}")
+            return ''
+        return self.decode_body(part['body'].get('data', ''), limit=limit,
+                                mime_type=part.get('mimeType'), charset=self.part_charset(part))
+
+    def find_body_part(self, payload):
+        """Walk the MIME tree without decoding anything and return the part holding the body.
+
+        Attachments (a filename, or content only reachable by attachmentId) are skipped,
+        so a .txt attachment never shadows an inline HTML body.
+        """
+        if not payload.get('parts') and 'data' in payload.get('body', {}):
+            return payload
+
+        html_part = None
+        stack = list(reversed(payload.get('parts', [])))
+        while stack:
+            part = stack.pop()
+            stack.extend(reversed(part.get('parts', [])))
+            if part.get('filename') or 'data' not in part.get('body', {}):
+                continue
+            mime_type = part.get('mimeType')
+            if mime_type == 'text/plain':
+                return part
+            if mime_type == 'text/html' and html_part is None:
+                html_part = part
+        return html_part
 
-    def decode_body(self, data):
-        """Decode the email body from base64."""
+    def part_charset(self, part):
+        """Charset declared in the part's Content-Type header, if any."""
+        content_type = self.index_headers(part.get('headers', [])).get('content-type', '')
+        match = re.search(r'charset="?([\w.:-]+)"?', content_type, re.IGNORECASE)
+        return match.group(1) if match else None
+
+    def decode_body(self, data, limit=None, mime_type=None, charset=None):
+        """Decode the email body from base64, stopping once limit characters are available.
+
+        Gmail has already undone the transfer encoding of leaf text parts, so those are
+        decoded directly; anything else is parsed as a MIME message as before.
+        """
         if not data:
             logging.warning("Empty body data")
             return ''
         try:
-            decoded_bytes = base64.urlsafe_b64decode(data)
+            if mime_type and mime_type.startswith('text/'):
+                if limit is not None:
+                    # A character is at most 4 bytes, and each 4 base64 characters encode 3 bytes
+                    groups = -(-limit * 4 // 3)
+                    data = data[:groups * 4]
+                text = self._b64decode(data).decode(self._codec(charset), errors='replace')
+                return text[:limit] if limit is not None else text
+
+            decoded_bytes = self._b64decode(data)
             email_msg = message_from_bytes(decoded_bytes)
             
             if email_msg.is_multipart():
                 for part in email_msg.walk():
                     if part.get_content_type() in ['text/plain', 'text/html']:
-                        return part.get_payload(decode=True).decode('utf-8', errors='replace')
+                        return part.get_payload(decode=True).decode('utf-8', errors='replace')[:limit]
             else:
-                return email_msg.get_payload(decode=True).decode('utf-8', errors='replace')
+                return email_msg.get_payload(decode=True).decode('utf-8', errors='replace')[:limit]
         except Exception as e:
             logging.error(f"Error decoding email body: {e}")
             return ''
 
+    @staticmethod
+    def _b64decode(data):
+        # Gmail may strip the base64url padding
+        return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+    @staticmethod
+    def _codec(charset):
+        try:
+            return codecs.lookup(charset or 'utf-8').name
+        except LookupError:
+            return 'utf-8'
+
     def get_attachment_info(self, msg):
         """Extract attachment information from the email message."""
         attachments = []
@@ -186,34 +622,64 @@ class EmailService:
                     })
         return attachments
 
-    def categorize_email(self, email):
-        """Categorize an email based on its content, labels, and other attributes."""
+    def categorize_email(self, email, prior=None, scores=None):
+        """Categorize an email based on its content, labels, and other attributes.
+
+        A SenderPrior, when given, adds its per-category shares (scaled by SENDER_PRIOR_WEIGHT).
+        scores skips the keyword scoring when the content scores are already known.
+        """
+        
+        # Content scores are memoized, so templated mail seen before is not re-scanned
+        if scores is None:
+            scores = self.memo.scores(email, self.score_email)
+        categories = defaultdict(float, scores)
+
+        # What this sender's mail was usually categorized as
+        if prior is not None:
+            for category, share in prior.shares().items():
+                categories[category] += SENDER_PRIOR_WEIGHT * share
+        
+        # Determine primary and secondary categories
+        sorted_categories = sorted(categories.items(), key=lambda x: x[1], reverse=True)
+        primary_category = sorted_categories[0][0] if sorted_categories else None
+        secondary_categories = [cat for cat, score in sorted_categories[1:3] if score > 0]
+        
+        # Calculate confidence score
+        total_score = sum(categories.values())
+        confidence = categories[primary_category] / total_score if total_score > 0 else 0
         
+        return {
+            'primary_category': primary_category,
+            'secondary_categories': secondary_categories,
+            'confidence': confidence,
+            'all_categories': dict(categories),
+            'source': 'keywords',
+        }
+
+    def score_email(self, email):
+        """Per-category scores from the email's keywords, labels and read/important flags."""
         categories = defaultdict(float)
         
-        subject = email.get('subject', '').lower()
-        sender = email.get('sender_email', '').lower()
-        body = email.get('email_body', '').lower()
-        labels = set(email.get('label_ids', '').split(','))
+        labels = email_label_mask(email)
         is_read = email.get('is_read', False)
         is_important = email.get('is_important', False)
         
-        # Check each category
-        for category, keywords in self.keywords.items():
-            for keyword in keywords:
-                if keyword.lower() in subject or keyword.lower() in body or keyword.lower() in sender:
-                    categories[category] += 1
+        # One pass over each field counts every keyword of every category (on word boundaries)
+        keyword_hits = self.matcher.category_counts(email.get('subject', ''), email.get('email_body', ''),
+                                                    email.get('sender_email', ''))
+        for category, hits in keyword_hits.items():
+            categories[category] += hits
         
         # Additional logic for specific labels
-        if 'CATEGORY_PERSONAL' in labels:
+        if labels & LABEL_BITS['CATEGORY_PERSONAL']:
             categories['Personal'] += 1
-        if 'CATEGORY_SOCIAL' in labels:
+        if labels & LABEL_BITS['CATEGORY_SOCIAL']:
             categories['Social'] += 1
-        if 'CATEGORY_PROMOTIONS' in labels:
+        if labels & LABEL_BITS['CATEGORY_PROMOTIONS']:
             categories['Promotions'] += 1
-        if 'CATEGORY_UPDATES' in labels:
+        if labels & LABEL_BITS['CATEGORY_UPDATES']:
             categories['Updates'] += 1
-        if 'CATEGORY_FORUMS' in labels:
+        if labels & LABEL_BITS['CATEGORY_FORUMS']:
             categories['Forums'] += 1
         
         # Logic for unread and important emails
@@ -221,19 +687,4 @@ class EmailService:
             categories['Important (Non-urgent)'] += 0.5
         if is_important:
             categories['Important (Non-urgent)'] += 1
-        
-        # Determine primary and secondary categories
-        sorted_categories = sorted(categories.items(), key=lambda x: x[1], reverse=True)
-        primary_category = sorted_categories[0][0]
-        secondary_categories = [cat for cat, score in sorted_categories[1:3] if score > 0]
-        
-        # Calculate confidence score
-        total_score = sum(categories.values())
-        confidence = categories[primary_category] / total_score if total_score > 0 else 0
-        
-        return {
-            'primary_category': primary_category,
-            'secondary_categories': secondary_categories,
-            'confidence': confidence,
-            'all_categories': dict(categories)
-        }
\ No newline at end of file
+        return dict(categories)
\ No newline at end of file
@@ -0,0 +1,92 @@
+# email_service/email_writer.py
+import time
+from email_service.keyword_index import index_email
+from email_service.near_duplicates import assign_cluster
+from email_service.labels import email_label_mask, split_labels, store_labels
+from config import STORE_BATCH_SIZE, STORE_FLUSH_MS
+
+STORED_COLUMNS = ['id', 'subject', 'snippet', 'date', 'label_ids', 'sender_email', 'email_body',
+                  'attachment_info', 'received_time', 'category', 'user_tags', 'is_manual',
+                  'manually_updated_category', 'reviewed', 'ml_category', 'confidence_score',
+                  'is_read', 'is_important', 'user_feedback', 'secondary_categories', 'all_categories',
+                  'thread_id', 'message_id', 'list_id', 'list_unsubscribe', 'ml_confidence', 'minhash', 'cluster_id',
+                  'body_length', 'label_mask']
+# Columns set on the Streamlit pages and by feedback, which a re-fetch must not reset
+USER_COLUMNS = ['user_tags', 'is_manual', 'manually_updated_category', 'reviewed', 'user_feedback']
+# A re-fetched email stays in the cluster it was reviewed in
+KEPT_COLUMNS = USER_COLUMNS + ['cluster_id']
+
+UPSERT_EMAIL_SQL = f'''INSERT INTO emails ({', '.join(STORED_COLUMNS)})
+                       VALUES ({', '.join('?' * len(STORED_COLUMNS))})
+                       ON CONFLICT(id) DO UPDATE SET
+                       {', '.join(f'{column} = excluded.{column}' for column in STORED_COLUMNS[1:] if column not in KEPT_COLUMNS)},
+                       cluster_id = COALESCE(emails.cluster_id, excluded.cluster_id)'''
+
+
+class EmailWriter:
+    """Buffer parsed emails and write them in one transaction per batch.
+
+    A batch is flushed once it holds batch_size rows or its oldest row has waited
+    flush_ms, so a slow trickle of mail is not held back. add() checks the deadline
+    itself; a producer that can go a while without adding (say, a run of already stored
+    messages) also calls flush_if_due() from its loop. Each flush is one UPSERT
+    executemany plus the keyword index, label, sender and cluster bookkeeping, then a single
+    commit, instead of a commit (and fsync) per email. Re-stored emails keep their
+    user-owned columns.
+    """
+
+    def __init__(self, service, conn, batch_size=STORE_BATCH_SIZE, flush_ms=STORE_FLUSH_MS):
+        self.service = service
+        self.conn = conn
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_ms / 1000
+        self.buffer = []
+        self.buffered_at = None
+        self.written = 0
+
+    def add(self, email):
+        """Queue an email, flushing when the batch is full or has waited long enough."""
+        if not self.buffer:
+            self.buffered_at = time.monotonic()
+        self.buffer.append(email)
+        if len(self.buffer) >= self.batch_size:
+            self.flush()
+        else:
+            self.flush_if_due()
+
+    def flush_if_due(self):
+        """Flush if the oldest queued email has waited flush_ms. Returns the number written."""
+        if self.buffer and time.monotonic() - self.buffered_at >= self.flush_seconds:
+            return self.flush()
+        return 0
+
+    def flush(self):
+        """Write and commit every queued email. Returns the number written."""
+        if not self.buffer:
+            return 0
+        batch, self.buffer = self.buffer, []
+        conn = self.conn
+
+        # Join the cluster of a stored near-duplicate, including the emails earlier in this batch
+        pending = {}
+        for email in batch:
+            email['body_length'] = len(email['email_body']) if email.get('email_body') is not None else None
+            email['label_mask'] = email_label_mask(email)
+            if 'cluster_id' not in email:
+                email['minhash'], email['cluster_id'] = assign_cluster(conn, email, pending=pending)
+                pending[email['id']] = (email['minhash'], email['cluster_id'])
+
+        conn.executemany(UPSERT_EMAIL_SQL, [tuple(email.get(column) for column in STORED_COLUMNS) for email in batch])
+        store_labels(conn, {email['id']: split_labels(email.get('label_ids')) for email in batch})
+
+        # Keep the token -> email index current so keyword edits can re-score only affected emails
+        for email in batch:
+            index_email(conn, email)
+            if self.service.sender_priors:
+                self.service.sender_priors.observe(conn, email)
+        self.service.memo.flush(conn)
+        if self.service.rules:
+            self.service.rules.flush(conn)
+        conn.commit()
+        self.written += len(batch)
+        return len(batch)
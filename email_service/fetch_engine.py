@@ -0,0 +1,118 @@
+# email_service/fetch_engine.py
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from email_service.batch_fetcher import is_retryable
+from config import (FETCH_CONCURRENCY, GMAIL_QUOTA_UNITS_PER_SECOND, FETCH_MAX_RETRIES,
+                    FETCH_BACKOFF_BASE, FETCH_BACKOFF_MAX)
+
+# Gmail API quota cost of each call we make, in per-user quota units
+QUOTA_UNITS = {
+    'messages.get': 5,
+    'messages.list': 5,
+    'history.list': 2,
+    'getProfile': 1,
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket metering Gmail quota units.
+
+    Callers reserve units up front and sleep off any debt, so concurrent workers
+    queue fairly and a request larger than the bucket still goes through.
+    """
+
+    def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.updated = clock()
+        self.lock = threading.Lock()
+
+    def acquire(self, units=1):
+        """Block until units are available and return the time spent waiting."""
+        if self.rate <= 0:
+            return 0
+        with self.lock:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= units
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait:
+            self.sleep(wait)
+        return wait
+
+
+def backoff_delay(attempt, base=FETCH_BACKOFF_BASE, cap=FETCH_BACKOFF_MAX, rng=random):
+    """Exponential backoff with full jitter for the given zero-based retry attempt."""
+    return rng.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class FetchEngine:
+    """Bounded-concurrency executor for Gmail calls with quota metering and retry backoff.
+
+    http_factory, when given, supplies a per-thread HTTP object for execute() so that
+    requests issued from several threads never share an httplib2 connection.
+    """
+
+    def __init__(self, max_workers=FETCH_CONCURRENCY, quota_per_second=GMAIL_QUOTA_UNITS_PER_SECOND,
+                 max_retries=FETCH_MAX_RETRIES, backoff_base=FETCH_BACKOFF_BASE, backoff_max=FETCH_BACKOFF_MAX,
+                 sleep=time.sleep, rng=random, http_factory=None):
+        self.max_workers = max(1, max_workers)
+        self.limiter = TokenBucket(quota_per_second, sleep=sleep)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.sleep = sleep
+        self.rng = rng
+        self.http_factory = http_factory
+
+    def backoff_delay(self, attempt):
+        """Jittered delay before retry number attempt (zero-based)."""
+        return backoff_delay(attempt, self.backoff_base, self.backoff_max, self.rng)
+
+    def reserve(self, call_name, count=1):
+        """Take the quota units for count calls of the named Gmail method from the bucket."""
+        return self.limiter.acquire(QUOTA_UNITS[call_name] * count)
+
+    def call(self, fn, *args, cost=0, **kwargs):
+        """Call fn once quota allows, retrying 429/5xx responses with jittered exponential backoff."""
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(cost)
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                delay = self.backoff_delay(attempt)
+                logging.warning(f"Retryable Gmail error ({e}); backing off {delay:.2f}s")
+                self.sleep(delay)
+
+    def execute(self, request, cost=QUOTA_UNITS['messages.list']):
+        """Execute a googleapiclient request under the engine's quota and retry policy."""
+        http = self.http_factory() if self.http_factory else None
+        return self.call(request.execute, http=http, cost=cost)
+
+    def map(self, fn, items):
+        """Apply fn to items on the worker pool, yielding results in input order.
+
+        At most max_workers calls run at once and only a small window of items is
+        pulled ahead, so items may be a lazily generated stream.
+        """
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        pending = deque()
+        try:
+            for item in items:
+                pending.append(executor.submit(fn, item))
+                if len(pending) >= self.max_workers * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
@@ -1,5 +1,66 @@
 # email_service/gmail_client.py
-from googleapiclient.discovery import build
+import json
+import threading
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from email_service.replay import RecordingService, ReplayService
+from config import (GMAIL_RECORD_PATH, GMAIL_REPLAY_PATH, GMAIL_REPLAY_LATENCY, GMAIL_REPLAY_ERROR_RATE,
+                    GMAIL_HTTP_TIMEOUT)
+
+_thread_local = threading.local()
+_discovery_lock = threading.Lock()
+_discovery_document = None
+
+def discovery_document():
+    """Return the Gmail v1 discovery document, read from the bundled static copy once per process."""
+    global _discovery_document
+    with _discovery_lock:
+        if _discovery_document is None:
+            _discovery_document = json.loads(get_static_doc('gmail', 'v1'))
+        return _discovery_document
 
 def create_gmail_client(creds):
-    return build('gmail', 'v1', credentials=creds)
+    """Return the calling thread's Gmail client for creds, building it on first use.
+
+    Clients are built from the cached discovery document and bound to the thread's
+    keep-alive HTTP connection, so repeated calls (CLI handlers, API requests served
+    by the same worker thread) reuse both instead of paying build and TLS costs again.
+    """
+    # GMAIL_REPLAY_PATH serves a recorded session offline; GMAIL_RECORD_PATH captures one
+    if GMAIL_REPLAY_PATH:
+        return ReplayService(GMAIL_REPLAY_PATH, latency=GMAIL_REPLAY_LATENCY, error_rate=GMAIL_REPLAY_ERROR_RATE)
+
+    clients = _thread_cache('clients')
+    cached = clients.get(id(creds))
+    if cached and cached[0] is creds:
+        return cached[1]
+
+    service = build_from_document(discovery_document(), http=thread_authorized_http(creds))
+    if GMAIL_RECORD_PATH:
+        service = RecordingService(service, GMAIL_RECORD_PATH)
+    clients[id(creds)] = (creds, service)
+    return service
+
+def thread_authorized_http(creds):
+    """Return an authorized HTTP object owned by the calling thread.
+
+    httplib2 connections are not thread-safe, so each thread keeps its own; httplib2
+    holds them open between requests, giving every worker a keep-alive connection pool.
+    """
+    pool = _thread_cache('http')
+    cached = pool.get(id(creds))
+    if cached and cached[0] is creds:
+        return cached[1]
+
+    http = AuthorizedHttp(creds, http=httplib2.Http(timeout=GMAIL_HTTP_TIMEOUT))
+    pool[id(creds)] = (creds, http)
+    return http
+
+def _thread_cache(name):
+    cache = getattr(_thread_local, name, None)
+    if cache is None:
+        cache = {}
+        setattr(_thread_local, name, cache)
+    return cache
@@ -0,0 +1,59 @@
+# email_service/history_sync.py
+from email_service.pagination import iter_pages
+from email_service.fetch_engine import QUOTA_UNITS
+from config import GMAIL_LIST_PAGE_SIZE
+
+HISTORY_TYPES = ['messageAdded', 'messageDeleted', 'labelAdded', 'labelRemoved']
+
+
+class HistoryChanges:
+    """Net effect of a run of Gmail history records on the emails table."""
+
+    def __init__(self):
+        self.added = set()
+        self.deleted = set()
+        self.labels = {}
+        self.history_id = None
+
+    def add_record(self, record):
+        """Fold one history record into the pending changes, later records winning."""
+        for item in record.get('messagesAdded', []):
+            message = item['message']
+            if 'SPAM' in message.get('labelIds', []):
+                continue
+            self.added.add(message['id'])
+            self.deleted.discard(message['id'])
+        for item in record.get('messagesDeleted', []):
+            message_id = item['message']['id']
+            self.deleted.add(message_id)
+            self.added.discard(message_id)
+            self.labels.pop(message_id, None)
+        for key in ('labelsAdded', 'labelsRemoved'):
+            for item in record.get(key, []):
+                message = item['message']
+                if message['id'] not in self.deleted:
+                    self.labels[message['id']] = message.get('labelIds', [])
+
+    @property
+    def label_only(self):
+        """Label changes for messages that are not being re-downloaded anyway."""
+        return {message_id: labels for message_id, labels in self.labels.items() if message_id not in self.added}
+
+    def __bool__(self):
+        return bool(self.added or self.deleted or self.labels)
+
+
+def collect_history_changes(service, start_history_id, page_size=GMAIL_LIST_PAGE_SIZE, engine=None):
+    """Read every history page after start_history_id and reduce it to net changes.
+
+    Raises HttpError 404 when start_history_id is older than Gmail's history window.
+    """
+    changes = HistoryChanges()
+    pages = iter_pages(service.users().history().list, engine=engine, cost=QUOTA_UNITS['history.list'],
+                       userId='me', startHistoryId=start_history_id, historyTypes=HISTORY_TYPES,
+                       maxResults=page_size)
+    for page in pages:
+        for record in page.get('history', []):
+            changes.add_record(record)
+        changes.history_id = page.get('historyId', changes.history_id)
+    return changes
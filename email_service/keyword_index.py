@@ -0,0 +1,94 @@
+# email_service/keyword_index.py
+from email_service.keyword_matcher import KeywordMatcher, tokenize
+
+# Fields whose words are indexed: the same fields categorize_email matches keywords against
+INDEXED_FIELDS = ['subject', 'email_body', 'sender_email']
+# SQLite's default limit on bound parameters is 999
+MAX_SQL_PARAMS = 900
+
+
+def index_tokens(email):
+    """The distinct word tokens of an email's subject, body and sender."""
+    tokens = set()
+    for field in INDEXED_FIELDS:
+        tokens.update(tokenize(email.get(field) or ''))
+    return tokens
+
+
+def index_email(conn, email):
+    """Replace the email's postings in the keyword index. The caller commits."""
+    conn.execute("DELETE FROM keyword_index WHERE email_id = ?", (email['id'],))
+    conn.executemany("INSERT OR IGNORE INTO keyword_index (token, email_id) VALUES (?, ?)",
+                     [(token, email['id']) for token in index_tokens(email)])
+
+
+def unindex_emails(conn, email_ids):
+    """Drop the postings of deleted emails. The caller commits."""
+    conn.executemany("DELETE FROM keyword_index WHERE email_id = ?", [(email_id,) for email_id in email_ids])
+
+
+def index_missing(conn, chunk_size=1000):
+    """Index stored emails that have no postings yet (e.g. fetched before the index existed)."""
+    indexed = 0
+    while True:
+        rows = conn.execute(f'''SELECT id, {', '.join(INDEXED_FIELDS)} FROM emails e
+                                WHERE NOT EXISTS (SELECT 1 FROM keyword_index k WHERE k.email_id = e.id)
+                                  AND COALESCE(subject, '') || COALESCE(email_body, '') || COALESCE(sender_email, '') != ''
+                                LIMIT ?''', (chunk_size,)).fetchall()
+        if not rows:
+            return indexed
+        for row in rows:
+            index_email(conn, dict(zip(['id'] + INDEXED_FIELDS, row)))
+        conn.commit()
+        indexed += len(rows)
+
+
+def candidate_ids(conn, keyword):
+    """Ids of emails containing every word of keyword (a superset of the emails matching the phrase)."""
+    tokens = sorted(set(tokenize(keyword)))
+    if not tokens:
+        return set()
+    placeholders = ', '.join('?' * len(tokens))
+    rows = conn.execute(f'''SELECT email_id FROM keyword_index WHERE token IN ({placeholders})
+                            GROUP BY email_id HAVING COUNT(*) = ?''', tokens + [len(tokens)])
+    return {row[0] for row in rows}
+
+
+def emails_matching(conn, keyword):
+    """Ids of emails matching keyword the way categorize_email does (whole words, phrases in order)."""
+    ids = candidate_ids(conn, keyword)
+    if len(tokenize(keyword)) < 2:
+        return ids
+
+    # Phrase candidates only contain all the words; confirm they appear together
+    matcher = KeywordMatcher({'keyword': [keyword]})
+    matched = set()
+    candidates = sorted(ids)
+    for start in range(0, len(candidates), MAX_SQL_PARAMS):
+        chunk = candidates[start:start + MAX_SQL_PARAMS]
+        rows = conn.execute(f"SELECT id, {', '.join(INDEXED_FIELDS)} FROM emails WHERE id IN ({', '.join('?' * len(chunk))})",
+                            chunk)
+        matched.update(row[0] for row in rows if matcher.category_counts(*row[1:]))
+    return matched
+
+
+def keyword_match_counts(conn, keywords):
+    """Number of emails matching each keyword of a category -> keywords mapping, as {keyword: count}."""
+    return {keyword: len(emails_matching(conn, keyword))
+            for category_keywords in keywords.values() for keyword in category_keywords}
+
+
+def changed_keywords(old_keywords, new_keywords):
+    """Keywords added to or removed from any category between two keyword mappings."""
+    changed = set()
+    for category in set(old_keywords) | set(new_keywords):
+        changed |= set(old_keywords.get(category, [])) ^ set(new_keywords.get(category, []))
+    return changed
+
+
+def affected_ids(conn, old_keywords, new_keywords):
+    """Ids of the emails whose score can change when old_keywords is replaced by new_keywords."""
+    ids = set()
+    for keyword in changed_keywords(old_keywords, new_keywords):
+        ids |= candidate_ids(conn, keyword)
+    return ids
@@ -0,0 +1,111 @@
+# email_service/keyword_matcher.py
+import hashlib
+import json
+import re
+from collections import Counter
+
+# A word is a run of letters and digits; everything else (spaces, punctuation, '@', '.', '_') is a boundary
+WORD_PATTERN = re.compile(r'[^\W_]+')
+
+
+def tokenize(text):
+    """Lower-case word tokens of text, so keywords only match on word boundaries."""
+    return WORD_PATTERN.findall(text.lower()) if text else []
+
+
+def keywords_version(keywords):
+    """A short hash identifying a category -> keywords mapping, used to invalidate derived state."""
+    encoded = json.dumps(keywords, sort_keys=True).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()[:12]
+
+
+class KeywordMatcher:
+    """Aho-Corasick automaton over word tokens for the whole keyword file.
+
+    Every keyword (single words and phrases like "action required") is compiled once into a
+    trie whose edges are words, with failure links so each field is scanned in a single pass
+    over its tokens regardless of how many keywords there are. Matching on tokens rather than
+    characters gives word-boundary semantics: "off" matches "50% off" but not "office".
+    """
+
+    def __init__(self, keywords):
+        self.version = keywords_version(keywords)
+        self.category_order = list(keywords)
+        self.phrases = []          # phrase id -> tuple of tokens
+        self.categories = []       # phrase id -> categories listing it (once per listing)
+        self._goto = [{}]          # state -> {token: next state}
+        self._fail = [0]
+        self._output = [()]        # state -> phrase ids ending here, including via failure links
+
+        phrase_ids = {}
+        for category, category_keywords in keywords.items():
+            for keyword in category_keywords:
+                phrase = tuple(tokenize(keyword))
+                if not phrase:
+                    continue
+                if phrase not in phrase_ids:
+                    phrase_ids[phrase] = len(self.phrases)
+                    self.phrases.append(phrase)
+                    self.categories.append([])
+                    self._add_phrase(phrase, phrase_ids[phrase])
+                self.categories[phrase_ids[phrase]].append(category)
+        self._build_failure_links()
+
+    def _add_phrase(self, phrase, phrase_id):
+        state = 0
+        for token in phrase:
+            next_state = self._goto[state].get(token)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+                self._goto[state][token] = next_state
+            state = next_state
+        self._output[state] += (phrase_id,)
+
+    def _build_failure_links(self):
+        # Breadth-first, so a state's failure target is always finished before the state itself
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for token, next_state in self._goto[state].items():
+                fail = self._fail[state]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(token, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+                queue.append(next_state)
+
+    def find(self, text):
+        """Ids of the keyword phrases that occur in text."""
+        goto, fail, output = self._goto, self._fail, self._output
+        found = set()
+        state = 0
+        for token in tokenize(text):
+            while state and token not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(token, 0)
+            if output[state]:
+                found.update(output[state])
+        return found
+
+    def category_counts(self, *texts):
+        """Per-category count of distinct keywords found in any of texts (e.g. subject, body, sender).
+
+        Phrases never span two texts; a keyword found in several texts still counts once.
+        """
+        found = set()
+        for text in texts:
+            found |= self.find(text)
+        counts = Counter()
+        for phrase_id in found:
+            counts.update(self.categories[phrase_id])
+        # Keyword-file order, so ties between categories break the same way on every run
+        return {category: counts[category] for category in self.category_order if counts[category]}
+
+    def matched_keywords(self, *texts):
+        """The matched keywords themselves, as space-joined tokens, for display and debugging."""
+        found = set()
+        for text in texts:
+            found |= self.find(text)
+        return sorted(' '.join(self.phrases[phrase_id]) for phrase_id in found)
@@ -0,0 +1,77 @@
+# email_service/labels.py
+import json
+from db import queries
+from db.migrations import MIGRATION_4_SYSTEM_LABELS
+
+# Labels given a bit after migration 4, in the order their bits were assigned; each needs a
+# migration that backfills its bit
+ADDED_SYSTEM_LABELS = []
+# Gmail system labels with a bit in emails.label_mask, by bit position. Stored masks depend
+# on the order, so the bits migration 4 backfilled come first and can never move
+SYSTEM_LABELS = MIGRATION_4_SYSTEM_LABELS + ADDED_SYSTEM_LABELS
+LABEL_BITS = {label: 1 << bit for bit, label in enumerate(SYSTEM_LABELS)}
+
+
+def split_labels(label_ids):
+    """The labels of a comma-joined label_ids value, in stored order."""
+    return [label for label in (label_ids or '').split(',') if label]
+
+
+def label_mask(labels):
+    """The label_mask bits of the system labels among labels (other labels are ignored)."""
+    mask = 0
+    for label in labels:
+        mask |= LABEL_BITS.get(label, 0)
+    return mask
+
+
+def labels_in_mask(mask):
+    """The system labels whose bits are set in mask."""
+    return [label for label in SYSTEM_LABELS if mask & LABEL_BITS[label]]
+
+
+def email_label_mask(email):
+    """The email's label_mask, derived from label_ids when the record does not carry one."""
+    mask = email.get('label_mask')
+    return label_mask(split_labels(email.get('label_ids'))) if mask is None else mask
+
+
+def store_labels(conn, labels_by_id):
+    """Replace the email_labels rows of each email id, adding unseen labels to labels. The caller commits."""
+    conn.executemany("INSERT OR IGNORE INTO labels (name) VALUES (?)",
+                     [(label,) for label in {label for labels in labels_by_id.values() for label in labels}])
+    conn.executemany("DELETE FROM email_labels WHERE email_id = ?", [(email_id,) for email_id in labels_by_id])
+    conn.executemany('''INSERT OR IGNORE INTO email_labels (email_id, label_id)
+                        SELECT ?, id FROM labels WHERE name IN (SELECT value FROM json_each(?))''',
+                     [(email_id, json.dumps(labels)) for email_id, labels in labels_by_id.items()])
+
+
+def remove_labels(conn, email_ids):
+    """Drop the email_labels rows of deleted emails. The caller commits."""
+    conn.executemany("DELETE FROM email_labels WHERE email_id = ?", [(email_id,) for email_id in email_ids])
+
+
+def emails_with_label(conn, label):
+    """Ids of the stored emails carrying label."""
+    rows = conn.execute('''SELECT email_id FROM email_labels
+                           WHERE label_id = (SELECT id FROM labels WHERE name = ?)''', (label,))
+    return {row[0] for row in rows}
+
+
+def label_counts(conn):
+    """Emails per label, busiest first.
+
+    System labels are summed from one GROUP BY over the label_mask index (there are few
+    distinct masks); the other labels are counted from email_labels.
+    """
+    counts = {}
+    for mask, count in conn.execute(queries.LABEL_MASK_COUNTS):
+        for label in labels_in_mask(mask or 0):
+            counts[label] = counts.get(label, 0) + count
+    counts.update((name, count) for name, count in conn.execute(queries.LABEL_COUNTS) if name not in LABEL_BITS)
+    return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+
+
+def count_with_label(conn, *labels):
+    """Emails carrying any of the given system labels, from the label_mask index."""
+    return conn.execute(queries.COUNT_WITH_LABEL_BITS, (label_mask(labels),)).fetchone()[0]
@@ -0,0 +1,163 @@
+# email_service/near_duplicates.py
+import hashlib
+import re
+import struct
+from functools import lru_cache
+from email_service.keyword_matcher import tokenize
+from email_service.classifier import record_correction
+from config import NEAR_DUPLICATE_SIMILARITY, NEAR_DUPLICATE_MAX_CANDIDATES
+
+# 32 MinHash values in 8 bands of 4: emails with Jaccard similarity 0.8 share a band
+# with probability ~0.99, unrelated mail (similarity < 0.2) almost never does
+MINHASH_PERMUTATIONS = 32
+MINHASH_BANDS = 8
+BAND_ROWS = MINHASH_PERMUTATIONS // MINHASH_BANDS
+# Each 64-byte blake2b digest yields 16 of the 32-bit hash values
+DIGEST_VALUES = 16
+SIGNATURE_FORMAT = f'>{MINHASH_PERMUTATIONS}I'
+DIGITS = re.compile(r'\d+')
+
+
+@lru_cache(maxsize=65536)
+def token_hashes(feature):
+    """MINHASH_PERMUTATIONS independent 32-bit hashes of a feature (cached: template words recur)."""
+    data = feature.encode('utf-8')
+    values = ()
+    for salt in range(MINHASH_PERMUTATIONS // DIGEST_VALUES):
+        digest = hashlib.blake2b(data, digest_size=64, salt=bytes([salt]) * 16).digest()
+        values += struct.unpack(f'>{DIGEST_VALUES}I', digest)
+    return values
+
+
+def features(email):
+    """Distinct subject and body words, digits masked so order numbers and dates don't count."""
+    words = {'s:' + token for token in tokenize(email.get('subject'))}
+    words.update('b:' + token for token in tokenize(email.get('email_body')))
+    return {DIGITS.sub('0', word) for word in words}
+
+
+def minhash(email):
+    """MinHash signature of an email as a tuple of 32-bit ints, or None when it has no words."""
+    hashes = [token_hashes(feature) for feature in features(email)]
+    if not hashes:
+        return None
+    # Column-wise minimum over every feature's hashes, computed in C
+    return tuple(min(column) for column in zip(*hashes))
+
+
+def similarity(a, b):
+    """Estimated Jaccard similarity of two signatures: the share of equal positions."""
+    return sum(x == y for x, y in zip(a, b)) / MINHASH_PERMUTATIONS
+
+
+def pack(signature):
+    return struct.pack(SIGNATURE_FORMAT, *signature)
+
+
+def unpack(blob):
+    return struct.unpack(SIGNATURE_FORMAT, blob)
+
+
+def bands(signature):
+    """(band, value) pairs of a signature, each band's rows hashed into one signed 64-bit int."""
+    packed = pack(signature)
+    width = BAND_ROWS * 4
+    return [(band, int.from_bytes(hashlib.blake2b(packed[band * width:(band + 1) * width], digest_size=8).digest(),
+                                  'big', signed=True))
+            for band in range(MINHASH_BANDS)]
+
+
+def assign_cluster(conn, email, min_similarity=NEAR_DUPLICATE_SIMILARITY, max_candidates=NEAR_DUPLICATE_MAX_CANDIDATES,
+                   pending=None):
+    """Sign an email and join the cluster of its most similar stored near-duplicate.
+
+    Only emails sharing a band with the new signature are compared (at most
+    max_candidates per band), so the cost does not grow with the mailbox. An email
+    with no near-duplicate starts its own cluster, named after its id. Returns the
+    (packed signature, cluster_id) to store with the email; (None, None) for empty mail.
+    Emails whose bands are written but whose rows are not yet can be passed as
+    pending ({email_id: (packed signature, cluster_id)}). The caller commits.
+    """
+    signature = minhash(email)
+    if signature is None:
+        return None, None
+
+    best, best_similarity = None, min_similarity
+    signature_bands = bands(signature)
+    for band, value in signature_bands:
+        rows = conn.execute('''SELECT b.email_id, e.minhash, e.cluster_id FROM minhash_bands b LEFT JOIN emails e ON e.id = b.email_id
+                               WHERE b.band = ? AND b.value = ? AND b.email_id != ? LIMIT ?''',
+                            (band, value, email['id'], max_candidates)).fetchall()
+        for email_id, other, cluster_id in rows:
+            if other is None and pending and email_id in pending:
+                other, cluster_id = pending[email_id]
+            score = similarity(signature, unpack(other)) if other else 0.0
+            if score >= best_similarity and cluster_id:
+                best, best_similarity = cluster_id, score
+        if best_similarity == 1.0:
+            break
+
+    conn.execute("DELETE FROM minhash_bands WHERE email_id = ?", (email['id'],))
+    conn.executemany("INSERT INTO minhash_bands (band, value, email_id) VALUES (?, ?, ?)",
+                     [(band, value, email['id']) for band, value in signature_bands])
+    return pack(signature), best or email['id']
+
+
+def remove_signatures(conn, email_ids):
+    """Drop the band entries of deleted emails. The caller commits."""
+    conn.executemany("DELETE FROM minhash_bands WHERE email_id = ?", [(email_id,) for email_id in email_ids])
+
+
+def cluster_missing(conn, chunk_size=1000):
+    """Sign and cluster stored emails that predate clustering, oldest first."""
+    clustered = 0
+    while True:
+        rows = conn.execute('''SELECT id, subject, email_body FROM emails
+                               WHERE cluster_id IS NULL
+                                 AND COALESCE(subject, '') || COALESCE(email_body, '') != ''
+                               ORDER BY received_time, id LIMIT ?''', (chunk_size,)).fetchall()
+        if not rows:
+            return clustered
+        for email_id, subject, body in rows:
+            signature, cluster_id = assign_cluster(conn, {'id': email_id, 'subject': subject, 'email_body': body})
+            # Emails without words still get their own cluster so they are not picked up again
+            conn.execute("UPDATE emails SET minhash = ?, cluster_id = ? WHERE id = ?",
+                         (signature, cluster_id or email_id, email_id))
+        conn.commit()
+        clustered += len(rows)
+
+
+def cluster_ids(conn, cluster_id):
+    return [row[0] for row in conn.execute("SELECT id FROM emails WHERE cluster_id = ? ORDER BY id", (cluster_id,))]
+
+
+def categorize_cluster(conn, cluster_id, category, classifier=None):
+    """Manually categorize every email of a cluster in one action.
+
+    The classifier and sender priors learn from one representative email only (the
+    lowest id, which is also the one classifier.retrain keeps of the cluster), so a
+    burst of identical mail does not outweigh everything else. Returns the number of
+    emails categorized.
+    """
+    email_ids = cluster_ids(conn, cluster_id)
+    if not email_ids:
+        return 0
+    record_correction(conn, email_ids[0], category, classifier)
+    conn.execute("UPDATE emails SET manually_updated_category = ?, is_manual = 1 WHERE cluster_id = ?",
+                 (category, cluster_id))
+    conn.commit()
+    return len(email_ids)
+
+
+def mark_cluster_reviewed(conn, cluster_id):
+    """Mark every email of a cluster as reviewed. Returns the number of emails marked."""
+    marked = conn.execute("UPDATE emails SET reviewed = 1 WHERE cluster_id = ?", (cluster_id,)).rowcount
+    conn.commit()
+    return marked
+
+
+def largest_clusters(conn, limit=20):
+    """(cluster_id, size, sample subject) of the biggest clusters."""
+    return conn.execute('''SELECT cluster_id, COUNT(*) AS size, MIN(subject) FROM emails
+                           WHERE cluster_id IS NOT NULL GROUP BY cluster_id HAVING size > 1
+                           ORDER BY size DESC LIMIT ?''', (limit,)).fetchall()
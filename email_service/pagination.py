@@ -0,0 +1,30 @@
+# email_service/pagination.py
+from email_service.fetch_engine import QUOTA_UNITS
+from config import GMAIL_LIST_PAGE_SIZE
+
+
+def iter_pages(request_factory, engine=None, cost=QUOTA_UNITS['messages.list'], **params):
+    """Yield every page of a Gmail list call, following nextPageToken until it runs out.
+
+    Pages are executed through the FetchEngine, when given, for quota metering and backoff.
+    """
+    page_token = None
+    while True:
+        if page_token:
+            params['pageToken'] = page_token
+        request = request_factory(**params)
+        page = engine.execute(request, cost=cost) if engine else request.execute()
+        yield page
+        page_token = page.get('nextPageToken')
+        if not page_token:
+            return
+
+
+def iter_message_ids(service, query='', label_ids=None, page_size=GMAIL_LIST_PAGE_SIZE, engine=None):
+    """Lazily yield the ID of every message matching query, one page at a time."""
+    params = {'userId': 'me', 'q': query, 'maxResults': page_size}
+    if label_ids:
+        params['labelIds'] = label_ids
+    for page in iter_pages(service.users().messages().list, engine=engine, **params):
+        for message in page.get('messages', []):
+            yield message['id']
@@ -0,0 +1,55 @@
+# email_service/parse_pool.py
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from email_service.batch_fetcher import chunked
+from config import PARSE_WORKERS, PARSE_CHUNK_SIZE
+
+# Parser owned by each worker process, built once by the pool initializer
+_parser = None
+
+
+def _init_worker(keywords):
+    global _parser
+    from email_service.email_service import EmailService
+    _parser = EmailService.parser(keywords)
+
+
+def _build_records(messages):
+    return [_parser.build_email_record(msg) for msg in messages]
+
+
+class ParsePool:
+    """Parse and categorize raw Gmail messages on a process pool, returning rows in input order.
+
+    Messages are shipped to the workers in chunks of chunk_size and only a small window
+    of chunks is in flight, so a lazily fetched stream never piles up in memory. The
+    caller stays the single database writer.
+    """
+
+    def __init__(self, keywords, workers=PARSE_WORKERS, chunk_size=PARSE_CHUNK_SIZE):
+        self.workers = max(1, workers)
+        self.chunk_size = max(1, chunk_size)
+        # spawn rather than fork: the fetch engine's threads may hold locks at fork time
+        self.executor = ProcessPoolExecutor(max_workers=self.workers,
+                                            mp_context=multiprocessing.get_context('spawn'),
+                                            initializer=_init_worker, initargs=(keywords,))
+
+    def map(self, messages):
+        """Yield an emails-table row for every message."""
+        pending = deque()
+        for chunk in chunked(messages, self.chunk_size):
+            pending.append(self.executor.submit(_build_records, chunk))
+            if len(pending) >= self.workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,165 @@
+# email_service/recategorize.py
+import time
+from email_service.keyword_index import affected_ids, changed_keywords, index_missing, MAX_SQL_PARAMS
+from config import RECATEGORIZE_CHUNK_SIZE
+
+JOB_NAME = 'categorize_all'
+SCORED_COLUMNS = ['id', 'subject', 'email_body', 'sender_email', 'label_ids', 'label_mask', 'is_read', 'is_important']
+UNCATEGORIZED = "(category IS NULL OR category = '')"
+
+
+def iter_email_chunks(conn, after_id=None, chunk_size=RECATEGORIZE_CHUNK_SIZE, uncategorized_only=False):
+    """Yield lists of email rows (as dicts) in id order, chunk_size at a time, starting after after_id.
+
+    Keyset pagination on the primary key, so every chunk is an index range scan and a
+    run can resume from the last id it finished.
+    """
+    where = [UNCATEGORIZED] if uncategorized_only else []
+    while True:
+        conditions = where + (['id > ?'] if after_id is not None else [])
+        sql = f"SELECT {', '.join(SCORED_COLUMNS)} FROM emails"
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY id LIMIT ?"
+        params = ([after_id] if after_id is not None else []) + [chunk_size]
+        rows = conn.execute(sql, params).fetchall()
+        if not rows:
+            return
+        yield [dict(zip(SCORED_COLUMNS, row)) for row in rows]
+        after_id = rows[-1][0]
+
+
+def score_chunk(email_service, emails):
+    """Categorize a chunk of rows, returning executemany parameters for the UPDATE."""
+    updates = []
+    for email in emails:
+        email['subject'] = email['subject'] or ''
+        email['email_body'] = email['email_body'] or ''
+        email['sender_email'] = email['sender_email'] or ''
+        email['label_ids'] = email['label_ids'] or ''
+        categorization = email_service.apply_rules(email) or email_service.categorize_email(email)
+        columns = email_service.categorization_columns(categorization)
+        updates.append((columns['category'], columns['secondary_categories'], columns['confidence_score'],
+                        columns['all_categories'], email['id']))
+    return updates
+
+
+def score_ids(email_service, conn, email_ids, chunk_size=RECATEGORIZE_CHUNK_SIZE):
+    """Re-score the given emails, one executemany and commit per chunk. Returns the number scored."""
+    email_ids = sorted(email_ids)
+    scored = 0
+    for start in range(0, len(email_ids), min(chunk_size, MAX_SQL_PARAMS)):
+        chunk = email_ids[start:start + min(chunk_size, MAX_SQL_PARAMS)]
+        rows = conn.execute(f"SELECT {', '.join(SCORED_COLUMNS)} FROM emails WHERE id IN ({', '.join('?' * len(chunk))})",
+                            chunk).fetchall()
+        emails = [dict(zip(SCORED_COLUMNS, row)) for row in rows]
+        conn.executemany('''UPDATE emails SET category = ?, secondary_categories = ?, confidence_score = ?,
+                            all_categories = ? WHERE id = ?''', score_chunk(email_service, emails))
+        email_service.memo.flush(conn)
+        if email_service.rules:
+            email_service.rules.flush(conn)
+        conn.commit()
+        scored += len(emails)
+    return scored
+
+
+def count_emails(conn, uncategorized_only=False, after_id=None):
+    conditions = ([UNCATEGORIZED] if uncategorized_only else []) + (['id > ?'] if after_id is not None else [])
+    sql = "SELECT COUNT(*) FROM emails" + (" WHERE " + " AND ".join(conditions) if conditions else "")
+    return conn.execute(sql, [after_id] if after_id is not None else []).fetchone()[0]
+
+
+def report_memo(memo):
+    """Print the memo's hit counters and drop persisted scores of older keyword versions."""
+    stats = memo.stats()
+    pruned = memo.prune()
+    print(f"Categorization memo: {stats['hits']} hits, {stats['db_hits']} stored hits, {stats['misses']} misses "
+          f"({stats['hit_rate']:.0%} hit rate); pruned {pruned} outdated entries")
+
+
+def recategorize_all(email_service, db, chunk_size=RECATEGORIZE_CHUNK_SIZE, restart=False, uncategorized_only=False):
+    """Re-score stored emails against the current keywords, one transaction per chunk.
+
+    Each chunk's category columns are written with a single executemany and committed
+    together with the job checkpoint, so an interrupted run resumes after the last
+    committed chunk. A checkpoint taken with different keywords is discarded and the
+    run starts over. Returns the number of emails scored by this run.
+    """
+    version = email_service.matcher.version
+    state = db.get_job_state(JOB_NAME)
+    after_id, processed = None, 0
+    if state and state['status'] == 'running' and state['version'] == version and not restart:
+        after_id, processed = state['last_id'], state['processed']
+        print(f"Resuming after email {after_id} ({processed} already categorized)")
+
+    conn = db.connect()
+    try:
+        total = processed + count_emails(conn, uncategorized_only, after_id)
+        started = time.monotonic()
+        scored = 0
+        for emails in iter_email_chunks(conn, after_id, chunk_size, uncategorized_only):
+            conn.executemany('''UPDATE emails SET category = ?, secondary_categories = ?, confidence_score = ?,
+                                all_categories = ? WHERE id = ?''', score_chunk(email_service, emails))
+            scored += len(emails)
+            email_service.memo.flush(conn)
+            if email_service.rules:
+                email_service.rules.flush(conn)
+            db.save_job_state(JOB_NAME, emails[-1]['id'], version, processed + scored, 'running', conn)
+            conn.commit()
+            elapsed = time.monotonic() - started
+            rate = scored / elapsed if elapsed > 0 else 0.0
+            print(f"Categorized {processed + scored}/{total} emails ({rate:.0f} emails/s)")
+        db.save_job_state(JOB_NAME, None, version, processed + scored, 'done', conn)
+        if not uncategorized_only:
+            db.save_applied_keywords(version, email_service.keywords, conn)
+        conn.commit()
+    finally:
+        conn.close()
+    report_memo(email_service.memo)
+    return scored
+
+
+def recategorize_changed(email_service, db, chunk_size=RECATEGORIZE_CHUNK_SIZE):
+    """Re-score only the emails containing keywords added or removed since the last scoring run.
+
+    Candidates come from the keyword index, so the cost follows the number of affected
+    emails rather than the size of the mailbox. Without a record of the previous keywords
+    every email is re-scored. Returns the number of emails scored.
+    """
+    previous = db.get_applied_keywords()
+    if previous is None:
+        print("No record of the keywords emails were scored with; re-scoring everything")
+        return recategorize_all(email_service, db, chunk_size=chunk_size, restart=True)
+
+    conn = db.connect()
+    try:
+        indexed = index_missing(conn)
+        if indexed:
+            print(f"Indexed {indexed} emails missing from the keyword index")
+        changed = changed_keywords(previous, email_service.keywords)
+        email_ids = affected_ids(conn, previous, email_service.keywords)
+        print(f"{len(changed)} keywords changed, affecting {len(email_ids)} emails")
+        scored = score_ids(email_service, conn, email_ids, chunk_size)
+        db.save_applied_keywords(email_service.matcher.version, email_service.keywords, conn)
+        conn.commit()
+    finally:
+        conn.close()
+    report_memo(email_service.memo)
+    return scored
+
+
+def predict_all(classifier, db, chunk_size=RECATEGORIZE_CHUNK_SIZE):
+    """Fill ml_category and ml_confidence for every stored email, one executemany per chunk."""
+    conn = db.connect()
+    predicted = 0
+    try:
+        for emails in iter_email_chunks(conn, chunk_size=chunk_size):
+            predictions = classifier.predict_many(emails)
+            conn.executemany("UPDATE emails SET ml_category = ?, ml_confidence = ? WHERE id = ?",
+                             [(category, confidence, email['id'])
+                              for email, (category, confidence) in zip(emails, predictions)])
+            conn.commit()
+            predicted += len(emails)
+    finally:
+        conn.close()
+    return predicted
@@ -0,0 +1,202 @@
+# email_service/replay.py
+import json
+import random
+import threading
+import time
+import httplib2
+from googleapiclient.errors import HttpError
+
+# Resource names in the Gmail client chain, e.g. service.users().messages().get(...)
+RESOURCES = {'users', 'messages', 'history', 'labels', 'threads'}
+
+
+def request_key(method, params):
+    """Stable key for a Gmail call: dotted method name plus its sorted parameters."""
+    return f"{method}?{json.dumps(params, sort_keys=True)}"
+
+
+def loose_key(method, params):
+    """Fallback key for messages.get that ignores format/fields, so replay survives mask changes."""
+    if method == 'users.messages.get':
+        return request_key(method, {'id': params.get('id')})
+    return None
+
+
+def http_error(status, uri=''):
+    resp = httplib2.Response({'status': status})
+    content = json.dumps({'error': {'code': status, 'message': 'Injected by replay'}}).encode()
+    return HttpError(resp, content, uri=uri)
+
+
+class Recorder:
+    """Append Gmail responses to a JSON Lines file, one {key, response} object per line."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+
+    def record(self, key, response):
+        line = json.dumps({'key': key, 'response': response})
+        with self.lock, open(self.path, 'a') as f:
+            f.write(line + '\n')
+
+
+class _Resource:
+    """Stand-in for a googleapiclient resource: attributes become sub-resources or requests."""
+
+    def __init__(self, owner, path):
+        self._owner = owner
+        self._path = path
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        method = f"{self._path}.{name}" if self._path else name
+
+        def call(**params):
+            if name in RESOURCES:
+                return _Resource(self._owner, method)
+            return self._owner._request(method, params)
+
+        return call
+
+
+class _RecordingRequest:
+    def __init__(self, inner, key, recorder):
+        self.inner = inner
+        self.key = key
+        self.recorder = recorder
+
+    def execute(self, *args, **kwargs):
+        response = self.inner.execute(*args, **kwargs)
+        self.recorder.record(self.key, response)
+        return response
+
+
+class _RecordingBatch:
+    def __init__(self, service, callback):
+        self.keys = {}
+        self.callback = callback
+        self.inner = service.new_batch_http_request(callback=self._on_response)
+        self.recorder = None
+
+    def add(self, request, callback=None, request_id=None):
+        self.recorder = request.recorder
+        self.keys[request_id] = (request.key, callback)
+        self.inner.add(request.inner, request_id=request_id)
+
+    def execute(self, http=None):
+        self.inner.execute(http=http)
+
+    def _on_response(self, request_id, response, exception):
+        key, callback = self.keys[request_id]
+        if exception is None:
+            self.recorder.record(key, response)
+        callback = callback or self.callback
+        if callback:
+            callback(request_id, response, exception)
+
+
+class RecordingService(_Resource):
+    """Wrap a real Gmail service and capture every list/get/history/getProfile response to disk."""
+
+    def __init__(self, service, path):
+        super().__init__(self, '')
+        self._service = service
+        self._recorder = Recorder(path)
+
+    def _request(self, method, params):
+        inner = self._service
+        for part in method.split('.')[:-1]:
+            inner = getattr(inner, part)()
+        inner = getattr(inner, method.split('.')[-1])(**params)
+        return _RecordingRequest(inner, request_key(method, params), self._recorder)
+
+    def new_batch_http_request(self, callback=None):
+        return _RecordingBatch(self._service, callback)
+
+
+class _ReplayRequest:
+    def __init__(self, service, method, params):
+        self.service = service
+        self.method = method
+        self.params = params
+
+    def execute(self, http=None, num_retries=0):
+        self.service._wait()
+        return self.service._respond(self.method, self.params)
+
+
+class _ReplayBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.requests.append((request_id or str(len(self.requests)), request, callback or self.callback))
+
+    def execute(self, http=None):
+        # A batch is a single round trip, so latency is paid once per batch
+        self.service._wait()
+        for request_id, request, callback in self.requests:
+            try:
+                response, exception = self.service._respond(request.method, request.params), None
+            except HttpError as e:
+                response, exception = None, e
+            if callback:
+                callback(request_id, response, exception)
+
+
+class ReplayService(_Resource):
+    """Offline Gmail service answering from a recording, with optional latency and error injection.
+
+    latency is added to every HTTP round trip (one per batch), and error_rate is the
+    probability that any single call fails with error_status (429 by default).
+    Calls missing from the recording fail with 404, like unknown messages on Gmail.
+    """
+
+    def __init__(self, path, latency=0.0, error_rate=0.0, error_status=429, seed=None, sleep=time.sleep):
+        super().__init__(self, '')
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.sleep = sleep
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.responses = {}
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self.responses[entry['key']] = entry['response']
+        for key, response in list(self.responses.items()):
+            method, params = key.split('?', 1)
+            fallback = loose_key(method, json.loads(params))
+            if fallback:
+                self.responses.setdefault(fallback, response)
+
+    def _request(self, method, params):
+        return _ReplayRequest(self, method, params)
+
+    def new_batch_http_request(self, callback=None):
+        return _ReplayBatch(self, callback)
+
+    def _wait(self):
+        if self.latency:
+            self.sleep(self.latency)
+
+    def _respond(self, method, params):
+        with self.lock:
+            self.calls += 1
+            fail = self.error_rate and self.rng.random() < self.error_rate
+        if fail:
+            raise http_error(self.error_status, method)
+        key = request_key(method, params)
+        if key in self.responses:
+            return self.responses[key]
+        fallback = loose_key(method, params)
+        if fallback in self.responses:
+            return self.responses[fallback]
+        raise http_error(404, key)
@@ -0,0 +1,190 @@
+# email_service/rules.py
+import threading
+from collections import Counter, defaultdict
+from datetime import datetime
+from email_service.sender_prior import SENDER_ADDRESS_PATTERN, sender_domain
+
+# Conditions a rule can combine, most selective first: a rule is indexed under the first one it sets
+RULE_CONDITIONS = ['sender', 'subject_prefix', 'domain', 'label']
+RULE_COLUMNS = ['id', 'category'] + RULE_CONDITIONS + ['priority']
+
+
+def normalize_condition(condition, value):
+    """The form a condition value is indexed and compared in."""
+    value = (value or '').strip()
+    if condition == 'label':
+        return value.upper()
+    if condition == 'domain':
+        return value.lower().lstrip('@').rstrip('.')
+    return value.lower()
+
+
+def normalize_conditions(**values):
+    """The non-empty conditions among values, normalized. A blank value sets no condition."""
+    conditions = {condition: normalize_condition(condition, values.get(condition)) for condition in RULE_CONDITIONS}
+    return {condition: value for condition, value in conditions.items() if value}
+
+
+class Rule:
+    """A user-defined rule: every condition set must hold for the email to get the rule's category."""
+
+    def __init__(self, id, category, sender=None, subject_prefix=None, domain=None, label=None, priority=0):
+        self.id = id
+        self.category = category
+        self.conditions = normalize_conditions(sender=sender, subject_prefix=subject_prefix, domain=domain,
+                                               label=label)
+        self.priority = priority or 0
+
+    def matches(self, facts):
+        """Check the rule against the facts of an email (see RuleSet.facts)."""
+        conditions = self.conditions
+        if 'sender' in conditions and conditions['sender'] != facts['sender']:
+            return False
+        if 'subject_prefix' in conditions and not facts['subject'].startswith(conditions['subject_prefix']):
+            return False
+        if 'domain' in conditions and conditions['domain'] not in facts['domains']:
+            return False
+        if 'label' in conditions and conditions['label'] not in facts['labels']:
+            return False
+        return True
+
+
+class RuleSet:
+    """User rules compiled into hash indexes, so an email is only checked against rules that can match it.
+
+    Each rule is indexed under its most selective condition: sender address, subject
+    prefix (one dict per prefix length), domain (also matching subdomains) or label.
+    Matching an email costs a handful of dict lookups plus a check of the rules found.
+    Per-rule hits and checks are counted in memory and written by flush() on the
+    caller's connection; a rule that is checked often but rarely hits is indexed under
+    too broad a condition. The counters are shared by threads and guarded by a lock.
+    """
+
+    def __init__(self, rules=()):
+        self.indexes = {condition: defaultdict(list) for condition in RULE_CONDITIONS if condition != 'subject_prefix'}
+        self.prefixes = defaultdict(lambda: defaultdict(list))   # prefix length -> prefix -> rules
+        self.count = 0
+        self.hits = Counter()
+        self.checks = Counter()
+        self.last_hit = {}
+        self.lock = threading.Lock()
+        for rule in rules:
+            self.add(rule)
+
+    def __len__(self):
+        return self.count
+
+    def add(self, rule):
+        if not rule.conditions:
+            raise ValueError(f"Rule {rule.id} has no conditions")
+        condition = next(condition for condition in RULE_CONDITIONS if condition in rule.conditions)
+        value = rule.conditions[condition]
+        if condition == 'subject_prefix':
+            self.prefixes[len(value)][value].append(rule)
+        else:
+            self.indexes[condition][value].append(rule)
+        self.count += 1
+
+    @staticmethod
+    def facts(email):
+        """The normalized sender, sender domains, labels and subject of an email."""
+        match = SENDER_ADDRESS_PATTERN.search(email.get('sender_email') or '')
+        sender = match.group(0).lower().rstrip('.') if match else ''
+        domain = sender_domain(sender)
+        parts = domain.split('.') if domain else []
+        return {
+            'sender': sender,
+            # mail.shop.com also matches rules for shop.com
+            'domains': {'.'.join(parts[i:]) for i in range(len(parts))},
+            'labels': {label.strip().upper() for label in (email.get('label_ids') or '').split(',') if label.strip()},
+            'subject': (email.get('subject') or '').lstrip().lower(),
+        }
+
+    def candidates(self, facts):
+        indexes = self.indexes
+        candidates = list(indexes['sender'].get(facts['sender'], ()))
+        for length, rules in self.prefixes.items():
+            candidates.extend(rules.get(facts['subject'][:length], ()))
+        for domain in facts['domains']:
+            candidates.extend(indexes['domain'].get(domain, ()))
+        for label in facts['labels']:
+            candidates.extend(indexes['label'].get(label, ()))
+        return candidates
+
+    def match(self, email):
+        """The highest-priority rule matching the email (oldest first on ties), or None."""
+        if not self.count:
+            return None
+        facts = self.facts(email)
+        best = None
+        checked = []
+        for rule in self.candidates(facts):
+            checked.append(rule.id)
+            if rule.matches(facts) and (best is None or (-rule.priority, rule.id) < (-best.priority, best.id)):
+                best = rule
+        with self.lock:
+            self.checks.update(checked)
+            if best is not None:
+                self.hits[best.id] += 1
+                self.last_hit[best.id] = datetime.now().isoformat()
+        return best
+
+    def categorize(self, email):
+        """A categorize_email-shaped result from the matching rule, or None if no rule matches."""
+        rule = self.match(email)
+        if rule is None:
+            return None
+        return {
+            'primary_category': rule.category,
+            'secondary_categories': [],
+            'confidence': 1.0,
+            'all_categories': {rule.category: 1.0},
+            'source': 'rule',
+        }
+
+    def flush(self, conn):
+        """Add the hits and checks counted since the last flush to the rules table. The caller commits."""
+        with self.lock:
+            hits, checks, last_hit = self.hits, self.checks, self.last_hit
+            self.hits, self.checks, self.last_hit = Counter(), Counter(), {}
+        if not checks:
+            return
+        conn.executemany('''UPDATE rules SET hits = hits + ?, checks = checks + ?,
+                                             last_hit = COALESCE(?, last_hit) WHERE id = ?''',
+                         [(hits.get(rule_id, 0), count, last_hit.get(rule_id), rule_id)
+                          for rule_id, count in checks.items()])
+
+    @classmethod
+    def load(cls, conn):
+        """Compile the rules stored in the database."""
+        return cls(Rule(*row) for row in conn.execute(f"SELECT {', '.join(RULE_COLUMNS)} FROM rules"))
+
+
+def add_rule(conn, category, sender=None, subject_prefix=None, domain=None, label=None, priority=0):
+    """Store a rule with its conditions normalized and return its id.
+
+    Raises ValueError if no condition is given, counting blank values as not given.
+    """
+    conditions = normalize_conditions(sender=sender, subject_prefix=subject_prefix, domain=domain, label=label)
+    if not conditions:
+        raise ValueError("A rule needs at least one of sender, subject_prefix, domain or label")
+    rule_id = conn.execute('''INSERT INTO rules (category, sender, subject_prefix, domain, label, priority, created_at)
+                              VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                           (category, *[conditions.get(condition) for condition in RULE_CONDITIONS], priority,
+                            datetime.now().isoformat())).lastrowid
+    conn.commit()
+    return rule_id
+
+
+def delete_rule(conn, rule_id):
+    """Delete a rule. Returns False if there is no such rule."""
+    deleted = conn.execute("DELETE FROM rules WHERE id = ?", (rule_id,)).rowcount
+    conn.commit()
+    return bool(deleted)
+
+
+def list_rules(conn):
+    """Every rule as a dict with its hit counters, most hits first."""
+    columns = RULE_COLUMNS + ['hits', 'checks', 'last_hit']
+    return [dict(zip(columns, row))
+            for row in conn.execute(f"SELECT {', '.join(columns)} FROM rules ORDER BY hits DESC, id")]
@@ -0,0 +1,49 @@
+# email_service/search.py
+import re
+from db import queries
+from config import SEARCH_PAGE_SIZE, SEARCH_MAX_RANKED
+
+# A "quoted phrase" or a bare term, optionally ending in * for a prefix search
+TERMS = re.compile(r'"([^"]*)"(\*?)|(\S+)')
+
+
+def match_query(text):
+    """Turn what a user typed into an FTS5 MATCH expression.
+
+    Every term and "phrase" must appear (AND); a trailing * searches by prefix. Terms are
+    quoted, so punctuation in addresses or subjects cannot be read as FTS5 syntax.
+    """
+    terms = []
+    for phrase, phrase_prefix, term in TERMS.findall(text or ''):
+        prefix = phrase_prefix
+        if term:
+            phrase, prefix = term.rstrip('*').replace('"', ''), '*' if term.endswith('*') else ''
+        if phrase.strip():
+            terms.append(f'"{phrase}"{prefix}')
+    return ' '.join(terms)
+
+
+def search_emails(conn, text, page=1, per_page=SEARCH_PAGE_SIZE, max_ranked=SEARCH_MAX_RANKED):
+    """One page of the emails matching text, best bm25 rank first.
+
+    bm25 is computed for every row it orders, so only the newest max_ranked matches are
+    ranked and paged through ('ranked'); 'total' still counts every match. A search for
+    a word in most emails then costs the same as one matching max_ranked emails.
+    """
+    page, per_page = max(1, page), max(1, per_page)
+    result = {'query': text, 'page': page, 'per_page': per_page, 'total': 0, 'ranked': 0, 'results': []}
+    query = match_query(text)
+    if not query:
+        return result
+
+    result['total'] = conn.execute(queries.COUNT_SEARCH, (query,)).fetchone()[0]
+    result['ranked'] = min(result['total'], max_ranked)
+    cursor = conn.execute(queries.SEARCH_EMAILS, (query, max_ranked, per_page, (page - 1) * per_page))
+    columns = [column[0] for column in cursor.description]
+    result['results'] = [dict(zip(columns, row)) for row in cursor]
+    return result
+
+
+def rebuild_search_index(conn):
+    """Re-index every stored email, e.g. after a VACUUM renumbered rowids. The caller commits."""
+    conn.execute("INSERT INTO emails_fts (emails_fts) VALUES ('rebuild')")
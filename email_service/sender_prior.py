@@ -0,0 +1,171 @@
+# email_service/sender_prior.py
+import re
+import threading
+from datetime import datetime
+from cachetools import LRUCache
+from config import (SENDER_PRIOR_CACHE_SIZE, SENDER_PRIOR_MIN_EMAILS, SENDER_PRIOR_MIN_MANUAL,
+                    SENDER_PRIOR_CONFIDENCE)
+
+SENDER_ADDRESS_PATTERN = re.compile(r'[\w.+-]+@[\w.-]+')
+SENDER_DOMAIN_PATTERN = re.compile(r'@([\w.-]+)')
+
+
+def sender_domain(sender):
+    """The domain of a From header like 'Shop <deals@mail.shop.com>', or '' if there is none."""
+    match = SENDER_DOMAIN_PATTERN.search(sender or '')
+    return match.group(1).lower().rstrip('.>') if match else ''
+
+
+def sender_keys(sender):
+    """The sender_stats keys of a From header: the address and '@domain', most specific first."""
+    match = SENDER_ADDRESS_PATTERN.search(sender or '')
+    if not match:
+        return []
+    address = match.group(0).lower().rstrip('.')
+    return [address, '@' + sender_domain(address)]
+
+
+class SenderPrior:
+    """Category counts of everything stored from one sender address or domain."""
+
+    def __init__(self, key, counts=None, manual=None, emails=0, last_seen=None):
+        self.key = key
+        self.counts = counts or {}      # category -> emails stored with that category
+        self.manual = manual or {}      # category -> manual corrections to that category
+        self.emails = emails
+        self.last_seen = last_seen
+
+    def shares(self):
+        """Each category's share of the sender's mail, with manual corrections outweighing stored categories."""
+        manual_total = sum(self.manual.values())
+        source = self.manual if manual_total >= SENDER_PRIOR_MIN_MANUAL else self.counts
+        total = sum(source.values())
+        return {category: count / total for category, count in source.items() if count > 0} if total else {}
+
+    def shortcut(self, min_emails=SENDER_PRIOR_MIN_EMAILS, min_manual=SENDER_PRIOR_MIN_MANUAL,
+                 confidence=SENDER_PRIOR_CONFIDENCE):
+        """A categorize_email-shaped result when the sender is predictable enough to skip scoring, else None.
+
+        A sender qualifies with min_manual manual corrections or min_emails stored emails,
+        provided one category holds at least the confidence share of them.
+        """
+        if sum(self.manual.values()) < min_manual and self.emails < min_emails:
+            return None
+        shares = self.shares()
+        if not shares:
+            return None
+        ranked = sorted(shares.items(), key=lambda x: x[1], reverse=True)
+        primary, share = ranked[0]
+        if share < confidence:
+            return None
+        return {
+            'primary_category': primary,
+            'secondary_categories': [category for category, _ in ranked[1:3]],
+            'confidence': share,
+            'all_categories': dict(ranked),
+            'source': 'sender_prior',
+        }
+
+
+class SenderPriors:
+    """Per-sender and per-domain category statistics, kept in sender_stats and an in-memory LRU.
+
+    Counts are written as UPSERT increments, so the fetcher and the Streamlit pages can
+    update the same sender without losing each other's writes. Cached entries are
+    updated in place by this process and dropped when a correction comes in.
+    The LRU is not thread-safe, so cache access goes through a lock; database
+    reads happen outside it.
+    """
+
+    def __init__(self, db, cache_size=SENDER_PRIOR_CACHE_SIZE):
+        self.db = db
+        self.cache = LRUCache(maxsize=cache_size)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, sender, conn=None):
+        """The most specific prior known for the sender (address, then domain), or None."""
+        for key in sender_keys(sender):
+            prior = self._get(key, conn)
+            if prior.emails or prior.manual:
+                return prior
+        return None
+
+    def _get(self, key, conn=None):
+        with self.lock:
+            prior = self.cache.get(key)
+            if prior is not None:
+                self.hits += 1
+                return prior
+            self.misses += 1
+        prior = load_prior(conn, key) if conn is not None else self._load(key)
+        with self.lock:
+            return self.cache.setdefault(key, prior)
+
+    def _load(self, key):
+        conn = self.db.connect()
+        try:
+            return load_prior(conn, key)
+        finally:
+            conn.close()
+
+    def observe(self, conn, email):
+        """Count a newly stored email under its sender and domain. The caller commits.
+
+        Emails categorized by the sender shortcut are skipped, so a prior never
+        reinforces its own predictions.
+        """
+        keys = sender_keys(email.get('sender_email'))
+        if not keys or not email.get('category') or email.get('category_source') == 'sender_prior':
+            return
+        seen = datetime.now().isoformat()
+        increment_counts(conn, keys, email['category'], 'count')
+        conn.executemany('''INSERT INTO senders (sender, emails, last_seen) VALUES (?, 1, ?)
+                            ON CONFLICT(sender) DO UPDATE SET emails = emails + 1, last_seen = excluded.last_seen''',
+                         [(key, seen) for key in keys])
+        with self.lock:
+            for key in keys:
+                prior = self.cache.get(key)
+                if prior is not None:
+                    # A new dict rather than an in-place update, for threads reading shares()
+                    prior.counts = {**prior.counts, email['category']: prior.counts.get(email['category'], 0) + 1}
+                    prior.emails += 1
+                    prior.last_seen = seen
+
+    def forget(self, sender):
+        """Drop cached priors of a sender, e.g. after a manual correction written elsewhere."""
+        with self.lock:
+            for key in sender_keys(sender):
+                self.cache.pop(key, None)
+
+
+def load_prior(conn, key):
+    prior = SenderPrior(key)
+    for category, count, manual in conn.execute(
+            "SELECT category, count, manual FROM sender_stats WHERE sender = ?", (key,)):
+        if count:
+            prior.counts[category] = count
+        if manual:
+            prior.manual[category] = manual
+    row = conn.execute("SELECT emails, last_seen FROM senders WHERE sender = ?", (key,)).fetchone()
+    if row:
+        prior.emails, prior.last_seen = row
+    return prior
+
+
+def increment_counts(conn, keys, category, column, amount=1):
+    conn.executemany(f'''INSERT INTO sender_stats (sender, category, count, manual) VALUES (?, ?, ?, ?)
+                         ON CONFLICT(sender, category) DO UPDATE SET {column} = {column} + excluded.{column}''',
+                     [(key, category, amount if column == 'count' else 0, amount if column == 'manual' else 0)
+                      for key in keys])
+
+
+def observe_correction(conn, sender, category, previous=None):
+    """Move a sender's manual count from previous to category. The caller commits."""
+    keys = sender_keys(sender)
+    if not keys or previous == category:
+        return
+    if previous:
+        increment_counts(conn, keys, previous, 'manual', -1)
+    increment_counts(conn, keys, category, 'manual')
@@ -0,0 +1,105 @@
+# taskeroo/email_service/test_backfill.py
+
+import base64
+import sqlite3
+import time
+import pytest
+from unittest.mock import Mock, patch
+from db.database import Database
+from email_service.backfill import partition_range, run_backfill
+from email_service.batch_fetcher import BatchFetcher
+from email_service.email_service import EmailService
+
+
+@pytest.fixture
+def email_service(tmpdir):
+    service = Mock()
+    service.db = Database(str(tmpdir.join('test_taskeroo.db')))
+    service.build_range_query.side_effect = lambda start, end: f'{start}..{end}'
+    service.fetch_emails.return_value = 5
+    return service
+
+
+def test_partition_range_by_day_and_week():
+    assert partition_range('2024-07-30', '2024-08-01') == [
+        ('2024-07-30', '2024-07-31'), ('2024-07-31', '2024-08-01'), ('2024-08-01', '2024-08-02')
+    ]
+    assert partition_range('2024-07-01', '2024-07-10', unit='week') == [
+        ('2024-07-01', '2024-07-08'), ('2024-07-08', '2024-07-11')
+    ]
+
+
+def test_partition_range_rejects_reversed_range():
+    with pytest.raises(ValueError):
+        partition_range('2024-07-10', '2024-07-01')
+
+
+def test_backfill_records_partitions_and_throughput(email_service):
+    results = run_backfill(email_service, '2024-07-01', '2024-07-03', workers=2)
+
+    assert len(results) == 3
+    assert all(result['message_count'] == 5 for result in results)
+    assert all('messages_per_second' in result for result in results)
+    assert email_service.db.completed_partitions() == {
+        ('2024-07-01', '2024-07-02'), ('2024-07-02', '2024-07-03'), ('2024-07-03', '2024-07-04')
+    }
+
+
+def test_backfill_resumes_after_interruption(email_service):
+    email_service.fetch_emails.side_effect = [5, RuntimeError('connection reset')]
+    run_backfill(email_service, '2024-07-01', '2024-07-02', workers=1)
+    assert email_service.db.completed_partitions() == {('2024-07-01', '2024-07-02')}
+
+    email_service.fetch_emails.side_effect = None
+    email_service.fetch_emails.reset_mock()
+    results = run_backfill(email_service, '2024-07-01', '2024-07-02', workers=1)
+
+    assert [result['partition_start'] for result in results] == ['2024-07-02']
+    email_service.fetch_emails.assert_called_once_with(query='2024-07-02..2024-07-03', failed={})
+
+
+def test_partitions_with_failed_downloads_are_retried(email_service):
+    def fetch_emails(query, failed):
+        if query.startswith('2024-07-02'):
+            failed['m9'] = RuntimeError('404')
+        return 5
+    email_service.fetch_emails.side_effect = fetch_emails
+
+    results = run_backfill(email_service, '2024-07-01', '2024-07-02', workers=2)
+
+    assert sorted(result['failed_count'] for result in results) == [0, 1]
+    assert email_service.db.completed_partitions() == {('2024-07-01', '2024-07-02')}
+
+
+def make_message(message_id):
+    body = base64.urlsafe_b64encode(f'Your order {message_id} has shipped'.encode()).decode()
+    return {'id': message_id, 'threadId': message_id, 'snippet': '', 'internalDate': '123456789',
+            'labelIds': ['INBOX'],
+            'payload': {'mimeType': 'text/plain', 'body': {'data': body},
+                        'headers': [{'name': 'Subject', 'value': f'Order {message_id} shipped'},
+                                    {'name': 'From', 'value': 'orders@shop.example.com'}]}}
+
+
+def test_threaded_backfill_stores_every_email(tmpdir):
+    db = Database(str(tmpdir.join('test_taskeroo.db')))
+    service = EmailService.parser({'shopping': ['order']}, db=db)
+    service.service = Mock()
+    service.engine = None
+
+    def transport(message_ids, **get_kwargs):
+        time.sleep(0.0005 * len(message_ids))  # network wait, so the workers interleave
+        return {message_id: (make_message(message_id), None) for message_id in message_ids}
+    service.batch_fetcher = BatchFetcher(None, transport=transport)
+
+    # 4 day partitions of 500 messages each, listed only in the Inbox
+    ids_by_query = {service.build_range_query(start, end): [f'{start}-{i}' for i in range(500)]
+                    for start, end in partition_range('2024-07-01', '2024-07-04')}
+    list_ids = lambda service, query='', label_ids=None, engine=None: [] if label_ids else ids_by_query[query]
+
+    with patch('email_service.email_service.iter_message_ids', side_effect=list_ids):
+        results = run_backfill(service, '2024-07-01', '2024-07-04', workers=4)
+
+    assert sorted(result['message_count'] for result in results) == [500] * 4
+    conn = sqlite3.connect(db.db_path)
+    assert conn.execute("SELECT COUNT(*) FROM emails").fetchone()[0] == 2000
+    conn.close()
@@ -0,0 +1,121 @@
+# taskeroo/email_service/test_batch_fetcher.py
+
+import pytest
+from unittest.mock import Mock
+from googleapiclient.errors import HttpError
+from email_service.batch_fetcher import BatchFetcher, GmailBatchTransport, chunked
+
+
+def http_error(status):
+    return HttpError(Mock(status=status, reason='error'), b'{}')
+
+
+def make_message(message_id):
+    return {
+        'id': message_id,
+        'snippet': f'Snippet {message_id}',
+        'internalDate': '123456789',
+        'labelIds': ['INBOX'],
+        'payload': {'headers': [{'name': 'Subject', 'value': f'Subject {message_id}'}]}
+    }
+
+
+class FakeTransport:
+    """Local stand-in for the Gmail batch endpoint that fails chosen IDs a set number of times."""
+
+    def __init__(self, failures=None):
+        self.failures = failures or {}
+        self.calls = []
+        self.get_kwargs = []
+
+    def __call__(self, message_ids, **get_kwargs):
+        self.calls.append(list(message_ids))
+        self.get_kwargs.append(get_kwargs)
+        results = {}
+        for message_id in message_ids:
+            errors = self.failures.get(message_id, [])
+            if errors:
+                results[message_id] = (None, errors.pop(0))
+            else:
+                results[message_id] = (make_message(message_id), None)
+        return results
+
+
+def test_chunked_splits_any_iterable():
+    assert list(chunked((str(i) for i in range(5)), 2)) == [['0', '1'], ['2', '3'], ['4']]
+
+
+def test_fetch_groups_ids_into_batches():
+    transport = FakeTransport()
+    fetcher = BatchFetcher(None, batch_size=2, transport=transport, sleep=lambda _: None)
+
+    messages = list(fetcher.fetch(['1', '2', '3']))
+
+    assert [m['id'] for m in messages] == ['1', '2', '3']
+    assert transport.calls == [['1', '2'], ['3']]
+
+
+def test_batch_size_is_capped_at_gmail_limit():
+    fetcher = BatchFetcher(None, batch_size=500, transport=FakeTransport())
+    assert fetcher.batch_size == 100
+
+
+def test_only_failed_sub_requests_are_retried():
+    transport = FakeTransport(failures={'2': [http_error(429)], '3': [http_error(503)]})
+    fetcher = BatchFetcher(None, batch_size=10, transport=transport, sleep=lambda _: None)
+
+    messages = fetcher.fetch_chunk(['1', '2', '3'])
+
+    assert sorted(m['id'] for m in messages) == ['1', '2', '3']
+    assert transport.calls == [['1', '2', '3'], ['2', '3']]
+    assert fetcher.failed == {}
+
+
+def test_non_retryable_errors_are_recorded_not_retried():
+    not_found = http_error(404)
+    transport = FakeTransport(failures={'2': [not_found]})
+    fetcher = BatchFetcher(None, transport=transport, sleep=lambda _: None)
+
+    messages = fetcher.fetch_chunk(['1', '2'])
+
+    assert [m['id'] for m in messages] == ['1']
+    assert transport.calls == [['1', '2']]
+    assert fetcher.failed == {'2': not_found}
+
+
+def test_failures_go_to_the_callers_dict():
+    not_found = http_error(404)
+    fetcher = BatchFetcher(None, transport=FakeTransport(failures={'2': [not_found]}), sleep=lambda _: None)
+
+    failed = {}
+    assert [m['id'] for m in fetcher.fetch(['1', '2'], failed)] == ['1']
+    assert failed == {'2': not_found}
+    assert fetcher.failed == {}
+
+
+def test_gives_up_after_max_retries():
+    transport = FakeTransport(failures={'1': [http_error(500)] * 5})
+    fetcher = BatchFetcher(None, max_retries=2, transport=transport, sleep=lambda _: None)
+
+    assert fetcher.fetch_chunk(['1']) == []
+    assert len(transport.calls) == 3
+    assert '1' in fetcher.failed
+
+
+def test_gmail_batch_transport_collects_callback_results():
+    service = Mock()
+    batch = service.new_batch_http_request.return_value
+
+    def execute(http=None):
+        callback = service.new_batch_http_request.call_args.kwargs['callback']
+        callback('1', make_message('1'), None)
+        callback('2', None, http_error(404))
+
+    batch.execute.side_effect = execute
+
+    results = GmailBatchTransport(service)(['1', '2'], format='full')
+
+    assert results['1'][0]['id'] == '1'
+    assert results['2'][1].resp.status == 404
+    assert batch.add.call_count == 2
+    service.users.return_value.messages.return_value.get.assert_any_call(userId='me', id='2', format='full')
@@ -0,0 +1,91 @@
+# taskeroo/email_service/test_categorization_memo.py
+
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock, patch
+from db.database import Database
+from email_service.categorization_memo import CategorizationMemo, normalize
+from email_service.email_service import EmailService
+from email_service.keyword_matcher import KeywordMatcher
+
+KEYWORDS = {'shopping': ['order', 'shipped'], 'subscriptions': ['daily', 'digest']}
+
+
+def digest(day, count):
+    return {'subject': f'Your Daily Digest for Oct {day}', 'email_body': f'{count} new stories -- read more',
+            'sender_email': 'digest@news.com', 'label_ids': 'INBOX,UNREAD'}
+
+
+def test_normalize_lowercases_and_masks_digits():
+    assert normalize('Order #1234 -- SHIPPED!', mask_digits=True) == b'order #0000 -- shipped!'
+    assert normalize('Order #1234', mask_digits=False) == b'order #1234'
+
+
+def test_templated_mail_shares_a_key_unless_keywords_have_digits():
+    memo = CategorizationMemo(KeywordMatcher(KEYWORDS))
+    assert memo.key(digest(16, 12)) == memo.key(digest(17, 30))
+    assert memo.key(digest(16, 12)) != memo.key({**digest(16, 12), 'label_ids': 'INBOX'})
+
+    with_digits = CategorizationMemo(KeywordMatcher({**KEYWORDS, 'promotional': ['50 off']}))
+    assert with_digits.key(digest(16, 12)) != with_digits.key(digest(17, 30))
+
+
+def test_scores_are_computed_once_per_template():
+    memo = CategorizationMemo(KeywordMatcher(KEYWORDS))
+    compute = Mock(return_value={'subscriptions': 2})
+
+    assert memo.scores(digest(16, 12), compute) == {'subscriptions': 2}
+    assert memo.scores(digest(17, 30), compute) == {'subscriptions': 2}
+    assert compute.call_count == 1
+    assert memo.stats()['hits'] == 1 and memo.stats()['misses'] == 1
+
+
+def test_persisted_scores_survive_restarts_and_keyword_changes_invalidate_them(tmpdir):
+    db = Database(str(tmpdir.join("test_taskeroo.db")))
+    memo = CategorizationMemo(KeywordMatcher(KEYWORDS), db)
+    memo.scores(digest(16, 12), lambda email: {'subscriptions': 2})
+    conn = db.connect()
+    memo.flush(conn)
+    conn.commit()
+    conn.close()
+
+    restarted = CategorizationMemo(KeywordMatcher(KEYWORDS), db)
+    assert restarted.scores(digest(18, 45), Mock(side_effect=AssertionError)) == {'subscriptions': 2}
+    assert restarted.stats()['db_hits'] == 1
+    # Stored entries were loaded in one query on first use; later misses never touch the database
+    with patch.object(db, 'connect', side_effect=AssertionError):
+        assert restarted.scores({**digest(18, 45), 'subject': 'Weekly'}, lambda email: {}) == {}
+
+    edited = CategorizationMemo(KeywordMatcher({**KEYWORDS, 'news': ['stories']}), db)
+    assert edited.scores(digest(18, 45), lambda email: {'news': 1}) == {'news': 1}
+    assert edited.prune() == 1
+
+
+def test_categorize_email_results_match_with_and_without_the_memo():
+    service = EmailService.parser(KEYWORDS)
+    first = service.categorize_email(digest(16, 12))
+    second = service.categorize_email(digest(17, 30))
+
+    assert first == second == EmailService.parser(KEYWORDS).categorize_email(digest(17, 30))
+    assert first['primary_category'] == 'subscriptions'
+    assert service.memo.stats()['hits'] == 1
+
+
+def test_threads_scoring_and_flushing_persist_every_entry_once():
+    db = Mock()
+    db.load_memo_scores.return_value = {}
+    memo = CategorizationMemo(KeywordMatcher(KEYWORDS), db, cache_size=16)
+
+    def score(worker):
+        for i in range(50):
+            memo.scores({'subject': f'worker {"abcd"[worker]} email {"x" * i}'}, lambda email: {'shopping': 1})
+            if i % 10 == 9:
+                memo.flush(None)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(score, range(4)))
+    memo.flush(None)
+
+    saved = [key for call in db.save_memo_scores.call_args_list for key, _, _ in call.args[0]]
+    assert len(saved) == len(set(saved)) == 200
+    assert memo.stats()['misses'] == 200
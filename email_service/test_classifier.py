@@ -0,0 +1,81 @@
+# taskeroo/email_service/test_classifier.py
+
+import sqlite3
+import pytest
+from db.database import Database
+from email_service.classifier import NaiveBayesClassifier, record_correction, retrain, sender_domain
+
+TRAINING = [
+    ({'subject': 'Your order has shipped', 'email_body': 'Track your package', 'sender_email': 'Shop <orders@shop.com>',
+      'label_ids': 'INBOX,CATEGORY_UPDATES'}, 'shopping'),
+    ({'subject': 'Order delivered', 'email_body': 'Your package was delivered', 'sender_email': 'orders@shop.com',
+      'label_ids': 'INBOX'}, 'shopping'),
+    ({'subject': 'Statement available', 'email_body': 'Your monthly statement and balance', 'sender_email': 'alerts@bank.com',
+      'label_ids': 'INBOX,IMPORTANT'}, 'financial'),
+    ({'subject': 'Payment received', 'email_body': 'Thanks for your payment', 'sender_email': 'billing@bank.com',
+      'label_ids': 'INBOX'}, 'financial'),
+]
+
+
+@pytest.fixture
+def conn(tmpdir):
+    db = Database(str(tmpdir.join("test_taskeroo.db")))
+    conn = sqlite3.connect(db.db_path)
+    yield conn
+    conn.close()
+
+
+def test_sender_domain():
+    assert sender_domain('Shop <Deals@Mail.Shop.com>') == 'mail.shop.com'
+    assert sender_domain('no address') == ''
+
+
+def test_untrained_classifier_predicts_nothing():
+    assert NaiveBayesClassifier().predict(TRAINING[0][0]) == (None, 0.0)
+
+
+def test_predicts_from_incremental_updates():
+    classifier = NaiveBayesClassifier()
+    for email, category in TRAINING:
+        classifier.update(email, category)
+
+    category, confidence = classifier.predict({'subject': 'Package shipped', 'sender_email': 'orders@shop.com'})
+    assert category == 'shopping'
+    assert 0.5 < confidence <= 1.0
+    assert classifier.predict_many([{'subject': 'New statement', 'sender_email': 'alerts@bank.com'}])[0][0] == 'financial'
+
+
+def test_persisted_deltas_reload_to_the_same_model(conn):
+    classifier = NaiveBayesClassifier()
+    for email, category in TRAINING:
+        classifier.update(email, category, conn=conn)
+    conn.commit()
+
+    loaded = NaiveBayesClassifier.load(conn)
+    probe = {'subject': 'Your balance', 'email_body': 'payment due', 'sender_email': 'billing@bank.com'}
+    assert loaded.predict(probe) == pytest.approx(classifier.predict(probe))
+
+
+def test_record_correction_unlearns_the_previous_manual_category(conn):
+    conn.execute("INSERT INTO emails (id, subject, email_body, sender_email, label_ids) VALUES "
+                 "('m1', 'Flight itinerary', 'Your booking', 'trips@air.com', 'INBOX')")
+    conn.commit()
+
+    assert record_correction(conn, 'm1', 'shopping')
+    assert record_correction(conn, 'm1', 'travel')
+    assert not record_correction(conn, 'missing', 'travel')
+
+    classes = dict(conn.execute("SELECT category, documents FROM classifier_classes").fetchall())
+    assert classes == {'shopping': 0, 'travel': 1}
+    assert conn.execute("SELECT manually_updated_category, is_manual FROM emails WHERE id = 'm1'").fetchone() == ('travel', 1)
+    assert NaiveBayesClassifier.load(conn).predict({'subject': 'Flight booking'})[0] == 'travel'
+
+
+def test_retrain_rebuilds_from_manual_categories(conn):
+    conn.execute("INSERT INTO emails (id, subject, is_manual, manually_updated_category) VALUES "
+                 "('m1', 'Team meetup', 1, 'social'), ('m2', 'Weekly digest', 0, NULL)")
+    conn.execute("INSERT INTO classifier_classes (category, documents, tokens) VALUES ('stale', 5, 50)")
+    conn.commit()
+
+    assert retrain(conn) == 1
+    assert dict(conn.execute("SELECT category, documents FROM classifier_classes").fetchall()) == {'social': 1}
@@ -15,6 +15,8 @@ def mock_gmail_client():
 @pytest.fixture
 def mock_database():
     with patch('db.database.Database', autospec=True) as mock:
+        # Nothing memoized yet
+        mock.return_value.load_memo_scores.return_value = {}
         yield mock
 
 @pytest.fixture
@@ -181,22 +183,34 @@ def test_store_email(email_service, mock_database):
         'is_important': False,
         'user_feedback': None,
         'secondary_categories': None,
-        'all_categories': None
+        'all_categories': None,
+        'thread_id': 't1',
+        'message_id': '<1@example.com>',
+        'list_id': None,
+        'list_unsubscribe': None,
+        'minhash': None,
+        'cluster_id': '1'
     }
 
     # Ensure the database connect method is called once before passing it to store_email
     with patch.object(email_service.db, 'connect', return_value=mock_conn) as mock_connect:
-        # Call the store_email method
+        # Queue the email and write it
         email_service.store_email(email, mock_conn)
+        mock_conn.executemany.assert_not_called()
+        email_service.flush_emails()
         
-    # Ensure the cursor execute method is called with the correct SQL statement and parameters
-    expected_sql = '''INSERT OR REPLACE INTO emails (id, subject, snippet, date, label_ids, sender_email, email_body, attachment_info, received_time, category, user_tags, is_manual, manually_updated_category, reviewed, ml_category, confidence_score, is_read, is_important, user_feedback, secondary_categories, all_categories) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)'''
+    # Ensure the email is written with one UPSERT that leaves the user-owned columns alone
+    expected_sql = '''INSERT INTO emails (id, subject, snippet, date, label_ids, sender_email, email_body, attachment_info, received_time, category, user_tags, is_manual, manually_updated_category, reviewed, ml_category, confidence_score, is_read, is_important, user_feedback, secondary_categories, all_categories, thread_id, message_id, list_id, list_unsubscribe, ml_confidence, minhash, cluster_id, body_length, label_mask) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET'''
     
     # Normalize the SQL query strings by removing extra whitespace
-    actual_sql = mock_cursor.execute.call_args[0][0]
+    actual_sql, rows = mock_conn.executemany.call_args_list[0][0]
     actual_sql = ''.join(actual_sql.split())
     expected_sql = ''.join(expected_sql.split())
-    assert actual_sql == expected_sql, f"Expected SQL: {expected_sql}, but got: {actual_sql}"
+    assert actual_sql.startswith(expected_sql), f"Expected SQL: {expected_sql}, but got: {actual_sql}"
+    for column in ['manually_updated_category', 'reviewed', 'user_feedback', 'is_manual', 'user_tags']:
+        assert f'{column}=excluded' not in actual_sql
+    assert rows[0][0] == '1'
+    mock_conn.commit.assert_called_once()
         
 
 
@@ -213,3 +227,174 @@ def test_fetch_emails_no_messages(email_service, mock_gmail_client, mock_databas
         # Ensure store_email is not called
         mock_store_email.assert_not_called()
 
+
+
+def test_fetch_emails_stores_batched_messages(email_service, mock_gmail_client, mock_database):
+    from email_service.test_batch_fetcher import FakeTransport
+
+    mock_gmail_client.return_value.users.return_value.messages.return_value.list.return_value.execute.side_effect = [
+        {'messages': [{'id': '1'}, {'id': '2'}]},  # Inbox messages
+        {'messages': [{'id': '3'}]}                # Trash messages
+    ]
+    transport = FakeTransport()
+    email_service.batch_fetcher.transport = transport
+    email_service.batch_fetcher.batch_size = 2
+
+    with patch.object(email_service, 'store_email') as mock_store_email:
+        emails = list(email_service.iter_emails(date='2024-07-25'))
+
+    assert [email['id'] for email in emails] == ['1', '2', '3']
+    assert transport.calls == [['1', '2'], ['3']]
+    assert mock_store_email.call_count == 3
+
+
+def test_fetch_emails_follows_next_page_token(email_service, mock_gmail_client, mock_database):
+    from email_service.test_batch_fetcher import FakeTransport
+
+    list_mock = mock_gmail_client.return_value.users.return_value.messages.return_value.list
+    list_mock.return_value.execute.side_effect = [
+        {'messages': [{'id': '1'}], 'nextPageToken': 'page-2'},  # Inbox, page 1
+        {'messages': [{'id': '2'}]},                             # Inbox, page 2
+        {'messages': [{'id': '3'}]}                              # Trash
+    ]
+    email_service.batch_fetcher.transport = FakeTransport()
+
+    with patch.object(email_service, 'store_email') as mock_store_email:
+        count = email_service.fetch_emails(date='2024-07-25')
+
+    assert count == 3
+    assert mock_store_email.call_count == 3
+    assert list_mock.call_args_list[1].kwargs['pageToken'] == 'page-2'
+    assert list_mock.call_args_list[2].kwargs['labelIds'] == ['TRASH']
+
+
+def test_fetch_emails_only_refreshes_labels_of_known_messages(mock_gmail_client, tmpdir):
+    from email_service.test_batch_fetcher import FakeTransport
+
+    db = Database(str(tmpdir.join('test_taskeroo.db')))
+    conn = db.connect()
+    conn.execute("INSERT INTO emails (id, subject, label_ids, is_read) VALUES ('1', 'Known', 'INBOX,UNREAD', 0)")
+    conn.commit()
+    conn.close()
+
+    with patch('email_service.email_service.Database', return_value=db):
+        service = EmailService({'token': 'test-token'})
+    mock_gmail_client.return_value.users.return_value.messages.return_value.list.return_value.execute.side_effect = [
+        {'messages': [{'id': '1'}, {'id': '2'}]},  # Inbox messages
+        {'messages': [{'id': '2'}]}                # Trash listing repeats a message
+    ]
+    transport = FakeTransport()
+    service.batch_fetcher.transport = transport
+
+    with patch.object(service, 'store_email') as mock_store_email:
+        count = service.fetch_emails(date='2024-07-25')
+
+    assert count == 1
+    assert mock_store_email.call_args[0][0]['id'] == '2'
+    assert transport.calls == [['1'], ['2']]
+    assert transport.get_kwargs[0] == {'format': 'minimal', 'fields': 'id,labelIds'}
+    assert transport.get_kwargs[1]['format'] == 'full'
+    assert 'payload' in transport.get_kwargs[1]['fields']
+
+    conn = db.connect()
+    assert conn.execute("SELECT label_ids, is_read FROM emails WHERE id = '1'").fetchone() == ('INBOX', 1)
+    conn.close()
+
+
+def encode(text, encoding='utf-8'):
+    import base64
+    return base64.urlsafe_b64encode(text.encode(encoding)).decode()
+
+
+def test_get_email_body_prefers_plain_text(email_service):
+    payload = {
+        'mimeType': 'multipart/alternative',
+        'body': {'size': 0},
+        'parts': [
+            {'mimeType': 'text/html', 'body': {'data': encode('<p>Hello</p>')}},
+            {'mimeType': 'multipart/related', 'parts': [
+                {'mimeType': 'text/plain', 'body': {'data': encode('Hello')}}
+            ]}
+        ]
+    }
+
+    with patch.object(email_service, 'decode_body', wraps=email_service.decode_body) as mock_decode:
+        assert email_service.get_email_body(payload) == 'Hello'
+    mock_decode.assert_called_once()
+
+
+def test_get_email_body_falls_back_to_html(email_service):
+    payload = {'mimeType': 'multipart/alternative', 'parts': [
+        {'mimeType': 'text/html', 'body': {'data': encode('<p>Hello</p>')}}
+    ]}
+    assert email_service.get_email_body(payload) == '<p>Hello</p>'
+
+
+def test_get_email_body_skips_text_attachments(email_service):
+    payload = {'mimeType': 'multipart/mixed', 'parts': [
+        {'mimeType': 'text/html', 'filename': '', 'body': {'data': encode('<p>Hello</p>')}},
+        {'mimeType': 'text/plain', 'filename': 'notes.txt', 'body': {'attachmentId': 'a1', 'size': 42}},
+        {'mimeType': 'text/plain', 'filename': 'inline.txt', 'body': {'data': encode('Attached')}}
+    ]}
+    assert email_service.get_email_body(payload) == '<p>Hello</p>'
+
+
+def test_decode_body_stops_at_the_limit(email_service):
+    text = 'héllo wörld ' * 100000
+    assert email_service.decode_body(encode(text), limit=1000, mime_type='text/plain') == text[:1000]
+
+
+def test_decode_body_honours_the_part_charset(email_service):
+    part = {
+        'mimeType': 'text/plain',
+        'headers': [{'name': 'Content-Type', 'value': 'text/plain; charset="ISO-8859-1"'}],
+        'body': {'data': encode('Café', 'latin-1')}
+    }
+    assert email_service.get_email_body(part) == 'Café'
+
+
+def test_decode_body_still_parses_mime_messages(email_service):
+    raw = 'Content-Type: text/plain; charset=utf-8\n\nHello from MIME'
+    assert email_service.decode_body(encode(raw)) == 'Hello from MIME'
+
+
+def test_parse_email_indexes_headers_once(email_service):
+    msg = {
+        'id': '1',
+        'threadId': 't1',
+        'snippet': 'Weekly deals',
+        'internalDate': '123456789',
+        'labelIds': ['INBOX', 'CATEGORY_PROMOTIONS'],
+        'payload': {
+            'mimeType': 'text/plain',
+            'headers': [
+                {'name': 'Subject', 'value': 'Deals'},
+                {'name': 'FROM', 'value': 'Shop <deals@shop.example.com>'},
+                {'name': 'Date', 'value': 'Thu, 25 Jul 2024 10:00:00 +0000'},
+                {'name': 'Message-ID', 'value': '<abc@shop.example.com>'},
+                {'name': 'List-Id', 'value': 'Shop Deals <Deals.Shop.Example.com>'},
+                {'name': 'List-Unsubscribe', 'value': '<mailto:unsubscribe@shop.example.com>'},
+                {'name': 'Subject', 'value': 'Duplicate subject'}
+            ],
+            'body': {'data': encode('Weekly deals')}
+        }
+    }
+
+    email = email_service.parse_email(msg)
+
+    assert email['subject'] == 'Deals'
+    assert email['sender_email'] == 'Shop <deals@shop.example.com>'
+    assert email['thread_id'] == 't1'
+    assert email['message_id'] == '<abc@shop.example.com>'
+    assert email['list_id'] == 'deals.shop.example.com'
+    assert email['list_unsubscribe'] == '<mailto:unsubscribe@shop.example.com>'
+
+def test_categorize_email_matches_keywords_on_word_boundaries(email_service):
+    email = {'subject': 'Back at the office', 'email_body': 'Your order shipped today, 20% off next time',
+             'sender_email': 'orders@amazon.com', 'label_ids': 'INBOX', 'is_read': True}
+
+    result = email_service.categorize_email(email)
+
+    assert result['all_categories']['promotional'] == 1  # "off", not "office"
+    assert result['all_categories']['shopping'] == 3
+    assert result['primary_category'] == 'shopping'
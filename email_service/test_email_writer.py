@@ -0,0 +1,88 @@
+# taskeroo/email_service/test_email_writer.py
+
+import sqlite3
+from unittest.mock import patch
+import pytest
+from db.database import Database
+from email_service.email_service import EmailService
+from email_service.email_writer import EmailWriter
+
+KEYWORDS = {'promotional': ['sale']}
+
+
+def row(email_id, subject='Big sale', body='Everything must go this weekend at the big store sale'):
+    return {'id': email_id, 'subject': subject, 'snippet': '', 'date': '', 'label_ids': 'INBOX',
+            'sender_email': 'deals@shop.com', 'email_body': body, 'attachment_info': 'No',
+            'received_time': email_id, 'category': 'promotional', 'user_tags': None, 'is_manual': 0,
+            'manually_updated_category': None, 'reviewed': 0, 'ml_category': None, 'confidence_score': 1.0,
+            'is_read': False, 'is_important': False, 'user_feedback': None, 'secondary_categories': '',
+            'all_categories': '{}', 'thread_id': None, 'message_id': None, 'list_id': None, 'list_unsubscribe': None}
+
+
+@pytest.fixture
+def db(tmpdir):
+    return Database(str(tmpdir.join("test_taskeroo.db")))
+
+
+def test_batches_are_written_in_one_transaction(db):
+    service = EmailService.parser(KEYWORDS, db=db)
+    conn = sqlite3.connect(db.db_path)
+    writer = EmailWriter(service, conn, batch_size=3, flush_ms=60000)
+
+    for email_id in ['m1', 'm2']:
+        writer.add(row(email_id))
+    assert conn.execute("SELECT COUNT(*) FROM emails").fetchone()[0] == 0
+
+    writer.add(row('m3'))
+    writer.add(row('m4', subject='Lunch', body='Are we still on for lunch tomorrow'))
+    assert writer.written == 3
+    assert writer.flush() == 1
+
+    # Near-duplicates in the same batch still share a cluster
+    clusters = dict(conn.execute("SELECT id, cluster_id FROM emails"))
+    assert clusters == {'m1': 'm1', 'm2': 'm1', 'm3': 'm1', 'm4': 'm4'}
+    conn.close()
+
+
+def test_slow_batches_are_flushed_after_flush_ms(db):
+    service = EmailService.parser(KEYWORDS, db=db)
+    conn = sqlite3.connect(db.db_path)
+    writer = EmailWriter(service, conn, batch_size=100, flush_ms=500)
+
+    with patch('email_service.email_writer.time.monotonic', side_effect=[10.0, 10.1, 10.6]):
+        writer.add(row('m1'))
+        assert writer.written == 0
+        writer.add(row('m2'))
+    assert writer.written == 2
+    conn.close()
+
+
+def test_fetch_loop_flushes_a_waiting_batch_without_new_emails(db):
+    service = EmailService.parser(KEYWORDS, db=db)
+    conn = sqlite3.connect(db.db_path)
+    with patch('email_service.email_writer.time.monotonic', side_effect=[10.0, 10.1, 10.2, 11.5]):
+        service.store_email(row('m1'), conn)
+        assert service.flush_due_emails(conn) == 0
+        assert service.flush_due_emails(conn) == 1
+    assert conn.execute("SELECT COUNT(*) FROM emails").fetchone()[0] == 1
+    assert service.flush_due_emails(conn) == 0
+    conn.close()
+
+
+def test_refetch_keeps_user_columns(db):
+    service = EmailService.parser(KEYWORDS, db=db)
+    conn = sqlite3.connect(db.db_path)
+    service.store_email(row('m1'), conn)
+    service.flush_emails()
+    conn.execute('''UPDATE emails SET manually_updated_category = 'shopping', is_manual = 1, reviewed = 1,
+                    user_feedback = 'good', user_tags = 'later' WHERE id = 'm1' ''')
+    conn.commit()
+
+    refetched = dict(row('m1'), subject='Bigger sale', category='updates')
+    service.store_email(refetched, conn)
+    service.flush_emails()
+
+    assert conn.execute('''SELECT subject, category, manually_updated_category, is_manual, reviewed, user_feedback,
+                           user_tags FROM emails WHERE id = 'm1' ''').fetchone() == \
+        ('Bigger sale', 'updates', 'shopping', 1, 1, 'good', 'later')
+    conn.close()
@@ -0,0 +1,135 @@
+# taskeroo/email_service/test_fetch_engine.py
+
+import json
+import threading
+import time
+import httplib2
+import pytest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from googleapiclient.errors import HttpError
+from googleapiclient.http import HttpRequest
+from googleapiclient.model import JsonModel
+from email_service.batch_fetcher import BatchFetcher
+from email_service.fetch_engine import FetchEngine, TokenBucket, backoff_delay
+from email_service.test_batch_fetcher import FakeTransport
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def stub_server():
+    """Local Gmail stand-in that answers 429 to the first `throttle` requests."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            server.hits += 1
+            if server.hits <= server.throttle:
+                self.send_response(429)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(b'{"error": {"code": 429, "message": "Rate Limit Exceeded"}}')
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.end_headers()
+            self.wfile.write(json.dumps({'messages': [{'id': '1'}]}).encode())
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.hits = 0
+    server.throttle = 2
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_token_bucket_sleeps_off_quota_debt():
+    clock = FakeClock()
+    bucket = TokenBucket(250, clock=clock, sleep=clock.sleep)
+
+    assert bucket.acquire(250) == 0
+    assert bucket.acquire(125) == pytest.approx(0.5)
+    clock.now += 1.0
+    assert bucket.acquire(100) == 0
+
+
+def test_backoff_delay_is_jittered_and_capped():
+    class MaxRng:
+        def uniform(self, low, high):
+            return high
+
+    assert backoff_delay(0, base=1, cap=8, rng=MaxRng()) == 1
+    assert backoff_delay(2, base=1, cap=8, rng=MaxRng()) == 4
+    assert backoff_delay(10, base=1, cap=8, rng=MaxRng()) == 8
+    assert 0 <= backoff_delay(3, base=1, cap=8) <= 8
+
+
+def test_engine_backs_off_on_429_from_stub_server(stub_server):
+    sleeps = []
+    engine = FetchEngine(quota_per_second=0, sleep=sleeps.append)
+    uri = f'http://127.0.0.1:{stub_server.server_port}/gmail/v1/users/me/messages'
+    request = HttpRequest(httplib2.Http(), JsonModel().response, uri)
+
+    page = engine.execute(request)
+
+    assert page == {'messages': [{'id': '1'}]}
+    assert stub_server.hits == 3
+    assert len(sleeps) == 2
+
+
+def test_engine_gives_up_after_max_retries(stub_server):
+    stub_server.throttle = 10
+    engine = FetchEngine(quota_per_second=0, max_retries=2, sleep=lambda _: None)
+    uri = f'http://127.0.0.1:{stub_server.server_port}/gmail/v1/users/me/messages'
+
+    with pytest.raises(HttpError) as excinfo:
+        engine.execute(HttpRequest(httplib2.Http(), JsonModel().response, uri))
+
+    assert excinfo.value.resp.status == 429
+    assert stub_server.hits == 3
+
+
+def test_engine_map_bounds_concurrency_and_keeps_order():
+    lock = threading.Lock()
+    state = {'running': 0, 'peak': 0}
+
+    def work(item):
+        with lock:
+            state['running'] += 1
+            state['peak'] = max(state['peak'], state['running'])
+        time.sleep(0.01)
+        with lock:
+            state['running'] -= 1
+        return item * 2
+
+    engine = FetchEngine(max_workers=3, quota_per_second=0)
+
+    assert list(engine.map(work, iter(range(10)))) == [i * 2 for i in range(10)]
+    assert 1 < state['peak'] <= 3
+
+
+def test_batch_fetcher_meters_quota_through_engine():
+    engine = FetchEngine(max_workers=2, quota_per_second=0)
+    reserved = []
+    engine.reserve = lambda call_name, count=1: reserved.append((call_name, count))
+    fetcher = BatchFetcher(None, batch_size=2, transport=FakeTransport(), engine=engine)
+
+    messages = list(fetcher.fetch(['1', '2', '3']))
+
+    assert [m['id'] for m in messages] == ['1', '2', '3']
+    assert sorted(reserved) == [('messages.get', 1), ('messages.get', 2)]
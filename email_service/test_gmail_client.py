@@ -0,0 +1,54 @@
+# taskeroo/email_service/test_gmail_client.py
+
+import threading
+import pytest
+from unittest.mock import patch
+from email_service import gmail_client
+
+
+@pytest.fixture(autouse=True)
+def fresh_thread_cache():
+    gmail_client._thread_local.__dict__.clear()
+    yield
+    gmail_client._thread_local.__dict__.clear()
+
+
+def test_discovery_document_is_loaded_once():
+    with patch('email_service.gmail_client.get_static_doc', return_value='{"name": "gmail"}') as mock_doc, \
+         patch('email_service.gmail_client._discovery_document', None):
+        assert gmail_client.discovery_document() == {'name': 'gmail'}
+        assert gmail_client.discovery_document() == {'name': 'gmail'}
+    mock_doc.assert_called_once_with('gmail', 'v1')
+
+
+def test_client_is_reused_within_a_thread():
+    creds = object()
+    with patch('email_service.gmail_client.build_from_document', side_effect=lambda doc, http: object()) as mock_build:
+        first = gmail_client.create_gmail_client(creds)
+        second = gmail_client.create_gmail_client(creds)
+
+    assert first is second
+    mock_build.assert_called_once()
+    assert mock_build.call_args.kwargs['http'] is gmail_client.thread_authorized_http(creds)
+
+
+def test_each_thread_gets_its_own_client_and_connection():
+    creds = object()
+    results = {}
+
+    def build_in_thread(name):
+        results[name] = (gmail_client.create_gmail_client(creds), gmail_client.thread_authorized_http(creds))
+
+    with patch('email_service.gmail_client.build_from_document', side_effect=lambda doc, http: object()):
+        build_in_thread('main')
+        worker = threading.Thread(target=build_in_thread, args=('worker',))
+        worker.start()
+        worker.join()
+
+    assert results['main'][0] is not results['worker'][0]
+    assert results['main'][1] is not results['worker'][1]
+
+
+def test_new_credentials_get_a_new_client():
+    with patch('email_service.gmail_client.build_from_document', side_effect=lambda doc, http: object()):
+        assert gmail_client.create_gmail_client(object()) is not gmail_client.create_gmail_client(object())
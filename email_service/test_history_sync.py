@@ -0,0 +1,125 @@
+# taskeroo/email_service/test_history_sync.py
+
+import sqlite3
+import pytest
+from unittest.mock import patch, Mock
+from googleapiclient.errors import HttpError
+from db.database import Database
+from email_service.email_service import EmailService
+from email_service.history_sync import HistoryChanges, collect_history_changes
+
+
+@pytest.fixture
+def service():
+    service = Mock()
+    service.users.return_value.getProfile.return_value.execute.return_value = {
+        'emailAddress': 'me@example.com', 'historyId': '500'
+    }
+    return service
+
+
+@pytest.fixture
+def email_service(service, tmpdir):
+    db = Database(str(tmpdir.join('test_taskeroo.db')))
+    with patch('email_service.email_service.create_gmail_client', return_value=service), \
+         patch('email_service.email_service.Database', return_value=db):
+        yield EmailService({'token': 'test-token'})
+
+
+def insert_email(db, email_id, label_ids):
+    conn = sqlite3.connect(db.db_path)
+    conn.execute("INSERT INTO emails (id, subject, label_ids, is_read) VALUES (?, ?, ?, ?)",
+                 (email_id, f'Subject {email_id}', label_ids, 0))
+    conn.commit()
+    conn.close()
+
+
+def test_history_changes_keep_the_net_effect():
+    changes = HistoryChanges()
+    changes.add_record({'messagesAdded': [{'message': {'id': '1', 'labelIds': ['INBOX']}}]})
+    changes.add_record({'labelsRemoved': [{'message': {'id': '2', 'labelIds': ['INBOX']}, 'labelIds': ['UNREAD']}]})
+    changes.add_record({'labelsAdded': [{'message': {'id': '1', 'labelIds': ['INBOX', 'STARRED']}}]})
+    changes.add_record({'messagesAdded': [{'message': {'id': '3', 'labelIds': ['SPAM']}}]})
+    changes.add_record({'messagesDeleted': [{'message': {'id': '4'}}]})
+    changes.add_record({'labelsAdded': [{'message': {'id': '4', 'labelIds': ['TRASH']}}]})
+
+    assert changes.added == {'1'}
+    assert changes.deleted == {'4'}
+    assert changes.label_only == {'2': ['INBOX']}
+
+
+def test_collect_history_changes_pages_through_history(service):
+    list_mock = service.users.return_value.history.return_value.list
+    list_mock.return_value.execute.side_effect = [
+        {'history': [{'messagesAdded': [{'message': {'id': '1'}}]}], 'nextPageToken': 'a', 'historyId': '110'},
+        {'history': [{'messagesDeleted': [{'message': {'id': '2'}}]}], 'historyId': '120'}
+    ]
+
+    changes = collect_history_changes(service, '100')
+
+    assert changes.added == {'1'}
+    assert changes.deleted == {'2'}
+    assert changes.history_id == '120'
+    assert list_mock.call_args_list[0].kwargs['startHistoryId'] == '100'
+
+
+def test_sync_incremental_applies_only_history_changes(email_service, service):
+    db = email_service.db
+    db.save_history_id('me@example.com', '100')
+    insert_email(db, 'relabeled', 'INBOX,UNREAD')
+    insert_email(db, 'deleted', 'INBOX')
+    service.users.return_value.history.return_value.list.return_value.execute.return_value = {
+        'history': [
+            {'messagesAdded': [{'message': {'id': 'new'}}]},
+            {'labelsRemoved': [{'message': {'id': 'relabeled', 'labelIds': ['INBOX', 'IMPORTANT']}}]},
+            {'messagesDeleted': [{'message': {'id': 'deleted'}}]}
+        ],
+        'historyId': '150'
+    }
+    email_service.batch_fetcher.transport = Mock(return_value={'new': ({'id': 'new'}, None)})
+
+    with patch.object(email_service, 'build_email_record', side_effect=lambda msg: msg), \
+         patch.object(email_service, 'store_email') as mock_store_email:
+        summary = email_service.sync_incremental()
+
+    assert summary == {'added': 1, 'deleted': 1, 'relabeled': 1, 'failed': 0, 'full_resync': False}
+    assert mock_store_email.call_args[0][0] == {'id': 'new'}
+    assert db.get_history_id('me@example.com') == '150'
+
+    conn = sqlite3.connect(db.db_path)
+    rows = dict(conn.execute("SELECT id, label_ids FROM emails").fetchall())
+    is_read, is_important = conn.execute("SELECT is_read, is_important FROM emails WHERE id = 'relabeled'").fetchone()
+    conn.close()
+    assert rows == {'relabeled': 'INBOX,IMPORTANT'}
+    assert (is_read, is_important) == (1, 1)
+
+
+def test_sync_incremental_falls_back_to_bounded_resync(email_service, service):
+    email_service.db.save_history_id('me@example.com', '1')
+    expired = HttpError(Mock(status=404, reason='Not Found'), b'{}')
+    service.users.return_value.history.return_value.list.return_value.execute.side_effect = expired
+
+    with patch.object(email_service, 'fetch_emails', return_value=3) as mock_fetch:
+        summary = email_service.sync_incremental(resync_days=2)
+
+    mock_fetch.assert_called_once_with(query='newer_than:2d', failed={})
+    assert summary['full_resync'] is True
+    assert email_service.db.get_history_id('me@example.com') == '500'
+
+
+def test_sync_incremental_keeps_the_checkpoint_when_adds_fail(email_service, service):
+    db = email_service.db
+    db.save_history_id('me@example.com', '100')
+    service.users.return_value.history.return_value.list.return_value.execute.return_value = {
+        'history': [{'messagesAdded': [{'message': {'id': 'new'}}]}],
+        'historyId': '150'
+    }
+    not_found = HttpError(Mock(status=404, reason='Not Found'), b'{}')
+    email_service.batch_fetcher.transport = Mock(return_value={'new': (None, not_found)})
+
+    summary = email_service.sync_incremental()
+
+    assert summary['added'] == 0
+    assert summary['failed'] == 1
+    assert db.get_history_id('me@example.com') == '100'
+    assert email_service.batch_fetcher.failed == {}
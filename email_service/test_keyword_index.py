@@ -0,0 +1,55 @@
+# taskeroo/email_service/test_keyword_index.py
+
+import sqlite3
+import pytest
+from db.database import Database
+from email_service.keyword_index import (index_email, unindex_emails, index_missing, emails_matching,
+                                         changed_keywords, affected_ids, keyword_match_counts)
+
+EMAILS = [
+    {'id': 'm1', 'subject': 'Action required: verify your account', 'email_body': '', 'sender_email': 'bank@example.com'},
+    {'id': 'm2', 'subject': 'Required reading', 'email_body': 'No action needed', 'sender_email': 'news@example.com'},
+    {'id': 'm3', 'subject': 'Back at the office', 'email_body': '50% off', 'sender_email': 'shop@example.com'},
+]
+
+
+@pytest.fixture
+def conn(tmpdir):
+    db = Database(str(tmpdir.join("test_taskeroo.db")))
+    conn = sqlite3.connect(db.db_path)
+    for email in EMAILS:
+        conn.execute("INSERT INTO emails (id, subject, email_body, sender_email) VALUES (?, ?, ?, ?)",
+                     (email['id'], email['subject'], email['email_body'], email['sender_email']))
+        index_email(conn, email)
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_emails_matching_uses_whole_words(conn):
+    assert emails_matching(conn, 'off') == {'m3'}
+    assert emails_matching(conn, 'Example.com') == {'m1', 'm2', 'm3'}
+    assert emails_matching(conn, 'refund') == set()
+
+
+def test_phrases_must_appear_in_order(conn):
+    assert emails_matching(conn, 'action required') == {'m1'}
+    assert keyword_match_counts(conn, {'actions': ['action required', 'verify']}) == {'action required': 1, 'verify': 1}
+
+
+def test_unindexed_and_deleted_emails(conn):
+    unindex_emails(conn, ['m3'])
+    assert emails_matching(conn, 'off') == set()
+
+    assert index_missing(conn) == 1
+    assert emails_matching(conn, 'off') == {'m3'}
+
+
+def test_keyword_diff_finds_only_affected_emails(conn):
+    old = {'actions': ['verify', 'update'], 'promotional': ['sale']}
+    new = {'actions': ['verify', 'action required'], 'promotional': ['sale', 'off']}
+
+    assert changed_keywords(old, new) == {'update', 'action required', 'off'}
+    # 'action required' candidates contain both words; re-scoring settles the exact matches
+    assert affected_ids(conn, old, new) == {'m1', 'm2', 'm3'}
+    assert affected_ids(conn, old, old) == set()
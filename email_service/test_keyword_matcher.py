@@ -0,0 +1,51 @@
+# taskeroo/email_service/test_keyword_matcher.py
+
+from email_service.keyword_matcher import KeywordMatcher, keywords_version, tokenize
+
+
+KEYWORDS = {
+    'promotional': ['sale', 'off', 'limited time'],
+    'actions': ['update', 'action required'],
+    'news': ['update', 'breaking news'],
+    'senders': ['Amazon.com'],
+}
+
+
+def test_tokenize_splits_on_non_word_characters():
+    assert tokenize('Orders@Amazon.com: 50% OFF_today') == ['orders', 'amazon', 'com', '50', 'off', 'today']
+    assert tokenize('') == []
+
+
+def test_keywords_match_on_word_boundaries_only():
+    matcher = KeywordMatcher(KEYWORDS)
+
+    assert matcher.category_counts('Back at the office', 'wholesale prices') == {}
+    assert matcher.category_counts('50% off, sale ends soon') == {'promotional': 2}
+
+
+def test_phrases_and_overlapping_keywords_are_found_in_one_pass():
+    matcher = KeywordMatcher(KEYWORDS)
+
+    counts = matcher.category_counts('Breaking news update: action required for a limited time')
+
+    assert counts == {'promotional': 1, 'actions': 2, 'news': 2}
+    assert matcher.matched_keywords('breaking news update') == ['breaking news', 'update']
+
+
+def test_keyword_counts_once_across_fields_and_phrases_do_not_span_fields():
+    matcher = KeywordMatcher(KEYWORDS)
+
+    assert matcher.category_counts('Sale', 'sale', 'SALE') == {'promotional': 1}
+    assert matcher.category_counts('limited', 'time') == {}
+    assert matcher.category_counts('', '', 'orders@amazon.com') == {'senders': 1}
+
+
+def test_counts_follow_keyword_file_order():
+    matcher = KeywordMatcher(KEYWORDS)
+
+    assert list(matcher.category_counts('update', 'sale')) == ['promotional', 'actions', 'news']
+
+
+def test_version_changes_with_keywords():
+    assert keywords_version(KEYWORDS) == KeywordMatcher(dict(KEYWORDS)).version
+    assert keywords_version(KEYWORDS) != keywords_version({**KEYWORDS, 'travel': ['flight']})
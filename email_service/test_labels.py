@@ -0,0 +1,63 @@
+# taskeroo/email_service/test_labels.py
+
+import sqlite3
+import pytest
+from db.database import Database
+from email_service.email_service import EmailService
+from db.migrations import MIGRATION_4_SYSTEM_LABELS
+from email_service.labels import (SYSTEM_LABELS, LABEL_BITS, label_mask, labels_in_mask, split_labels, emails_with_label,
+                                  label_counts, count_with_label)
+
+
+def row(email_id, label_ids):
+    return {'id': email_id, 'subject': f'Subject {email_id}', 'snippet': '', 'date': '', 'label_ids': label_ids,
+            'sender_email': f'{email_id}@example.com', 'email_body': f'Body of {email_id}', 'attachment_info': 'No',
+            'received_time': email_id, 'category': None, 'is_read': 'UNREAD' not in label_ids,
+            'is_important': 'IMPORTANT' in label_ids}
+
+
+@pytest.fixture
+def db(tmpdir):
+    return Database(str(tmpdir.join("test_taskeroo.db")))
+
+
+def test_system_labels_only_append_to_the_migrated_bits():
+    assert SYSTEM_LABELS[:len(MIGRATION_4_SYSTEM_LABELS)] == MIGRATION_4_SYSTEM_LABELS
+    assert len(set(SYSTEM_LABELS)) == len(SYSTEM_LABELS)
+
+
+def test_label_mask_round_trips_system_labels():
+    labels = split_labels('INBOX,,UNREAD,Label_7,CATEGORY_FORUMS')
+    assert labels == ['INBOX', 'UNREAD', 'Label_7', 'CATEGORY_FORUMS']
+    assert label_mask(labels) == LABEL_BITS['INBOX'] | LABEL_BITS['UNREAD'] | LABEL_BITS['CATEGORY_FORUMS']
+    assert labels_in_mask(label_mask(labels)) == ['INBOX', 'UNREAD', 'CATEGORY_FORUMS']
+    assert label_mask(split_labels(None)) == 0
+
+
+def test_labels_follow_stores_relabels_and_deletes(db):
+    service = EmailService.parser({}, db=db)
+    conn = sqlite3.connect(db.db_path)
+    for email_id, label_ids in [('m1', 'INBOX,UNREAD,Label_7'), ('m2', 'INBOX'), ('m3', 'TRASH,Label_7')]:
+        service.store_email(row(email_id, label_ids), conn)
+    service.flush_emails()
+
+    assert conn.execute("SELECT label_mask FROM emails WHERE id = 'm1'").fetchone()[0] == \
+        LABEL_BITS['INBOX'] | LABEL_BITS['UNREAD']
+    assert emails_with_label(conn, 'Label_7') == {'m1', 'm3'}
+    assert label_counts(conn) == {'INBOX': 2, 'Label_7': 2, 'TRASH': 1, 'UNREAD': 1}
+
+    service.update_labels({'m1': ['INBOX'], 'm2': ['INBOX', 'UNREAD', 'Label_9']}, conn)
+    service.delete_emails(['m3'], conn)
+
+    assert count_with_label(conn, 'UNREAD') == 1
+    assert count_with_label(conn, 'TRASH', 'UNREAD') == 1
+    assert emails_with_label(conn, 'Label_7') == set()
+    assert label_counts(conn) == {'INBOX': 2, 'Label_9': 1, 'UNREAD': 1}
+    conn.close()
+
+
+def test_scores_read_the_mask_or_label_ids():
+    service = EmailService.parser({})
+    email = {'subject': '', 'email_body': '', 'sender_email': '', 'label_ids': 'CATEGORY_SOCIAL', 'is_read': True}
+    assert service.score_email(email) == {'Social': 1}
+    assert service.score_email(dict(email, label_mask=LABEL_BITS['CATEGORY_FORUMS'])) == {'Forums': 1}
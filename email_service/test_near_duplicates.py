@@ -0,0 +1,89 @@
+# taskeroo/email_service/test_near_duplicates.py
+
+import sqlite3
+import pytest
+from db.database import Database
+from email_service.classifier import retrain
+from email_service.near_duplicates import (minhash, similarity, assign_cluster, remove_signatures, cluster_missing,
+                                           categorize_cluster, mark_cluster_reviewed, largest_clusters)
+
+BODY = ('Hi there, your package from Acme Store is on its way and should arrive in the next few days. '
+        'Track your shipment any time from your account page. Questions about your order? Reply to this '
+        'email and our support team will get back to you. Thanks for shopping with us!')
+
+SHIPPED = [
+    {'id': 'm1', 'subject': 'Your order 1234 has shipped', 'email_body': BODY + ' Expected Tuesday.',
+     'sender_email': 'orders@acme.com'},
+    {'id': 'm2', 'subject': 'Your order 9876 has shipped', 'email_body': BODY + ' Expected Friday.',
+     'sender_email': 'orders@acme.com'},
+    {'id': 'm3', 'subject': 'Your order 5555 has shipped', 'email_body': BODY.replace('Hi there', 'Hello Sam'),
+     'sender_email': 'orders@acme.com'},
+]
+DIGEST = {'id': 'm4', 'subject': 'Weekly digest', 'sender_email': 'news@example.com',
+          'email_body': 'The top stories in technology and science this week, picked by our editors.'}
+
+
+@pytest.fixture
+def conn(tmpdir):
+    db = Database(str(tmpdir.join("test_taskeroo.db")))
+    conn = sqlite3.connect(db.db_path)
+    yield conn
+    conn.close()
+
+
+def store(conn, email):
+    signature, cluster_id = assign_cluster(conn, email)
+    conn.execute("INSERT INTO emails (id, subject, email_body, sender_email, minhash, cluster_id) VALUES (?, ?, ?, ?, ?, ?)",
+                 (email['id'], email['subject'], email['email_body'], email['sender_email'], signature, cluster_id))
+    conn.commit()
+    return cluster_id
+
+
+def test_signature_similarity_ignores_digits():
+    assert similarity(minhash(SHIPPED[0]), minhash(dict(SHIPPED[0], subject='Your order 42 has shipped'))) == 1.0
+    assert similarity(minhash(SHIPPED[0]), minhash(SHIPPED[1])) >= 0.7
+    assert similarity(minhash(SHIPPED[0]), minhash(DIGEST)) < 0.3
+    assert minhash({'subject': '', 'email_body': None}) is None
+
+
+def test_near_duplicates_share_a_cluster(conn):
+    clusters = [store(conn, email) for email in SHIPPED + [DIGEST]]
+
+    assert clusters == ['m1', 'm1', 'm1', 'm4']
+    assert largest_clusters(conn) == [('m1', 3, 'Your order 1234 has shipped')]
+
+
+def test_removed_emails_are_no_longer_candidates(conn):
+    store(conn, SHIPPED[0])
+    remove_signatures(conn, ['m1'])
+    conn.execute("DELETE FROM emails WHERE id = 'm1'")
+
+    assert store(conn, SHIPPED[1]) == 'm2'
+    assert conn.execute("SELECT COUNT(*) FROM minhash_bands WHERE email_id = 'm1'").fetchone()[0] == 0
+
+
+def test_cluster_missing_clusters_older_emails(conn):
+    for email in SHIPPED + [DIGEST]:
+        conn.execute("INSERT INTO emails (id, subject, email_body, sender_email, received_time) VALUES (?, ?, ?, ?, ?)",
+                     (email['id'], email['subject'], email['email_body'], email['sender_email'], email['id']))
+    conn.commit()
+
+    assert cluster_missing(conn, chunk_size=2) == 4
+    assert cluster_missing(conn) == 0
+    assert dict(conn.execute("SELECT id, cluster_id FROM emails")) == {'m1': 'm1', 'm2': 'm1', 'm3': 'm1', 'm4': 'm4'}
+
+
+def test_cluster_actions_apply_to_every_member(conn):
+    for email in SHIPPED + [DIGEST]:
+        store(conn, email)
+
+    assert categorize_cluster(conn, 'm1', 'shopping') == 3
+    assert mark_cluster_reviewed(conn, 'm1') == 3
+    rows = conn.execute("SELECT id, manually_updated_category, is_manual, reviewed FROM emails ORDER BY id").fetchall()
+    assert rows == [('m1', 'shopping', 1, 1), ('m2', 'shopping', 1, 1), ('m3', 'shopping', 1, 1), ('m4', None, 0, 0)]
+
+    # The classifier learns from one representative, not from every copy
+    assert conn.execute("SELECT documents FROM classifier_classes WHERE category = 'shopping'").fetchone()[0] == 1
+    # and so does a retrain
+    assert retrain(conn) == 1
+    assert conn.execute("SELECT documents FROM classifier_classes WHERE category = 'shopping'").fetchone()[0] == 1
@@ -0,0 +1,35 @@
+# taskeroo/email_service/test_pagination.py
+
+from unittest.mock import Mock
+from email_service.pagination import iter_message_ids
+
+
+def test_iter_message_ids_walks_every_page():
+    service = Mock()
+    list_mock = service.users.return_value.messages.return_value.list
+    list_mock.return_value.execute.side_effect = [
+        {'messages': [{'id': '1'}, {'id': '2'}], 'nextPageToken': 'a'},
+        {'messages': [{'id': '3'}], 'nextPageToken': 'b'},
+        {'resultSizeEstimate': 0}
+    ]
+
+    ids = list(iter_message_ids(service, query='after:2024/07/25', label_ids=['TRASH'], page_size=2))
+
+    assert ids == ['1', '2', '3']
+    assert list_mock.call_count == 3
+    first_call = list_mock.call_args_list[0].kwargs
+    assert first_call == {'userId': 'me', 'q': 'after:2024/07/25', 'maxResults': 2, 'labelIds': ['TRASH']}
+    assert list_mock.call_args_list[2].kwargs['pageToken'] == 'b'
+
+
+def test_iter_message_ids_is_lazy():
+    service = Mock()
+    list_mock = service.users.return_value.messages.return_value.list
+    list_mock.return_value.execute.side_effect = [
+        {'messages': [{'id': '1'}], 'nextPageToken': 'a'},
+        {'messages': [{'id': '2'}]}
+    ]
+
+    ids = iter_message_ids(service)
+    assert next(ids) == '1'
+    assert list_mock.call_count == 1
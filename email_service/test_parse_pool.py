@@ -0,0 +1,69 @@
+# taskeroo/email_service/test_parse_pool.py
+
+import base64
+from db.database import Database
+from email_service.email_service import EmailService, load_keywords
+from email_service.parse_pool import ParsePool
+
+
+def make_message(i):
+    body = base64.urlsafe_b64encode(f'Your order {i} has shipped, payment received'.encode()).decode()
+    return {
+        'id': str(i),
+        'threadId': f't{i}',
+        'snippet': f'Order {i}',
+        'internalDate': '123456789',
+        'labelIds': ['INBOX', 'UNREAD'] if i % 2 else ['INBOX', 'IMPORTANT'],
+        'payload': {
+            'mimeType': 'text/plain',
+            'headers': [{'name': 'Subject', 'value': f'Order {i} shipped'},
+                        {'name': 'From', 'value': 'orders@shop.example.com'}],
+            'body': {'data': body}
+        }
+    }
+
+
+def test_parse_pool_matches_inline_parsing_in_order():
+    keywords = load_keywords()
+    messages = [make_message(i) for i in range(10)]
+    expected = [EmailService.parser(keywords).build_email_record(msg) for msg in messages]
+
+    with ParsePool(keywords, workers=2, chunk_size=3) as pool:
+        records = list(pool.map(iter(messages)))
+
+    assert records == expected
+
+
+def test_build_email_records_uses_the_pool_when_enabled():
+    service = EmailService.parser(load_keywords())
+    assert service.enable_parse_pool(workers=0) is None
+
+    service.enable_parse_pool(workers=2, chunk_size=4)
+    try:
+        records = list(service.build_email_records(make_message(i) for i in range(5)))
+    finally:
+        service.close()
+
+    assert [record['id'] for record in records] == ['0', '1', '2', '3', '4']
+    assert service.parse_pool is None
+
+
+def test_pool_records_get_the_sender_shortcut_like_inline_ones(tmpdir):
+    db = Database(str(tmpdir.join('test_taskeroo.db')))
+    service = EmailService.parser(load_keywords(), db=db)
+    conn = db.connect()
+    for _ in range(20):
+        service.sender_priors.observe(conn, {'sender_email': 'orders@shop.example.com', 'category': 'personal'})
+    conn.commit()
+    conn.close()
+    messages = [make_message(i) for i in range(5)]
+    expected = list(service.build_email_records(iter(messages)))
+
+    service.enable_parse_pool(workers=2, chunk_size=2)
+    try:
+        records = list(service.build_email_records(iter(messages)))
+    finally:
+        service.close()
+
+    assert {record['category'] for record in records} == {'personal'}
+    assert records == expected
@@ -0,0 +1,82 @@
+# taskeroo/email_service/test_recategorize.py
+
+import json
+import sqlite3
+from db.database import Database
+from email_service.email_service import EmailService
+from email_service.recategorize import recategorize_all, recategorize_changed, JOB_NAME
+
+KEYWORDS = {'shopping': ['order', 'shipped'], 'financial': ['invoice', 'payment']}
+
+
+def make_db(tmpdir, count=5):
+    db = Database(str(tmpdir.join("test_taskeroo.db")))
+    conn = sqlite3.connect(db.db_path)
+    for i in range(count):
+        subject = 'Your order shipped' if i % 2 else 'Invoice and payment due'
+        conn.execute("INSERT INTO emails (id, subject, email_body, sender_email, label_ids, is_read, category) "
+                     "VALUES (?, ?, '', 'shop@example.com', 'INBOX', 1, 'stale')", (f'm{i}', subject))
+    conn.commit()
+    conn.close()
+    return db
+
+
+def categories(db):
+    conn = sqlite3.connect(db.db_path)
+    rows = dict(conn.execute("SELECT id, category FROM emails").fetchall())
+    conn.close()
+    return rows
+
+
+def test_recategorize_all_scores_every_email_in_chunks(tmpdir):
+    db = make_db(tmpdir)
+
+    scored = recategorize_all(EmailService.parser(KEYWORDS), db, chunk_size=2)
+
+    assert scored == 5
+    assert categories(db) == {'m0': 'financial', 'm1': 'shopping', 'm2': 'financial',
+                              'm3': 'shopping', 'm4': 'financial'}
+    conn = sqlite3.connect(db.db_path)
+    all_categories = conn.execute("SELECT all_categories FROM emails WHERE id = 'm1'").fetchone()[0]
+    conn.close()
+    assert json.loads(all_categories) == {'shopping': 2}
+    assert db.get_job_state(JOB_NAME)['status'] == 'done'
+
+
+def test_recategorize_all_resumes_after_the_last_committed_chunk(tmpdir):
+    db = make_db(tmpdir)
+    service = EmailService.parser(KEYWORDS)
+    db.save_job_state(JOB_NAME, 'm2', service.matcher.version, 3, 'running')
+
+    assert recategorize_all(service, db, chunk_size=2) == 2
+    assert categories(db) == {'m0': 'stale', 'm1': 'stale', 'm2': 'stale', 'm3': 'shopping', 'm4': 'financial'}
+    assert db.get_job_state(JOB_NAME)['processed'] == 5
+
+
+def test_recategorize_all_starts_over_when_keywords_changed(tmpdir):
+    db = make_db(tmpdir)
+    db.save_job_state(JOB_NAME, 'm2', 'old-version', 3, 'running')
+
+    assert recategorize_all(EmailService.parser(KEYWORDS), db, chunk_size=2) == 5
+
+
+def test_recategorize_changed_only_rescores_emails_with_changed_keywords(tmpdir):
+    db = make_db(tmpdir)
+    recategorize_all(EmailService.parser(KEYWORDS), db)
+    conn = sqlite3.connect(db.db_path)
+    conn.execute("UPDATE emails SET category = 'stale'")
+    conn.commit()
+    conn.close()
+
+    edited = {'shopping': ['order', 'shipped', 'delivered'], 'financial': ['invoice', 'payment', 'due']}
+    assert recategorize_changed(EmailService.parser(edited), db) == 3
+
+    assert categories(db) == {'m0': 'financial', 'm1': 'stale', 'm2': 'financial', 'm3': 'stale', 'm4': 'financial'}
+    assert db.get_applied_keywords() == edited
+
+
+def test_recategorize_changed_scores_everything_the_first_time(tmpdir):
+    db = make_db(tmpdir)
+
+    assert recategorize_changed(EmailService.parser(KEYWORDS), db) == 5
+    assert db.get_applied_keywords() == KEYWORDS
@@ -0,0 +1,75 @@
+# taskeroo/email_service/test_replay.py
+
+import pytest
+from unittest.mock import Mock
+from googleapiclient.errors import HttpError
+from email_service.replay import RecordingService, ReplayService
+
+
+def make_message(message_id):
+    return {'id': message_id, 'labelIds': ['INBOX'], 'snippet': f'Snippet {message_id}'}
+
+
+@pytest.fixture
+def recording(tmpdir):
+    """Record a small session from a fake Gmail service and return the recording path."""
+    path = str(tmpdir.join('session.jsonl'))
+    inner = Mock()
+    messages = inner.users.return_value.messages.return_value
+    messages.list.return_value.execute.return_value = {'messages': [{'id': '1'}, {'id': '2'}]}
+    inner.users.return_value.getProfile.return_value.execute.return_value = {'historyId': '42'}
+
+    def new_batch(callback):
+        batch = Mock()
+        added = []
+        batch.add.side_effect = lambda request, request_id=None: added.append(request_id)
+        batch.execute.side_effect = lambda http=None: [callback(i, make_message(i), None) for i in added]
+        return batch
+
+    inner.new_batch_http_request.side_effect = new_batch
+
+    service = RecordingService(inner, path)
+    service.users().messages().list(userId='me', q='').execute()
+    service.users().getProfile(userId='me').execute()
+    received = {}
+    batch = service.new_batch_http_request(callback=lambda i, response, e: received.update({i: response}))
+    for message_id in ['1', '2']:
+        batch.add(service.users().messages().get(userId='me', id=message_id, format='full'), request_id=message_id)
+    batch.execute()
+    assert received == {'1': make_message('1'), '2': make_message('2')}
+    return path
+
+
+def test_replay_answers_recorded_calls(recording):
+    service = ReplayService(recording)
+
+    assert service.users().messages().list(userId='me', q='').execute() == {'messages': [{'id': '1'}, {'id': '2'}]}
+    assert service.users().getProfile(userId='me').execute() == {'historyId': '42'}
+    assert service.users().messages().get(userId='me', id='1', format='full').execute() == make_message('1')
+
+
+def test_replay_matches_gets_with_a_different_field_mask(recording):
+    service = ReplayService(recording)
+    request = service.users().messages().get(userId='me', id='2', format='full', fields='id,labelIds')
+    assert request.execute() == make_message('2')
+
+
+def test_replay_unknown_calls_are_404(recording):
+    with pytest.raises(HttpError) as excinfo:
+        ReplayService(recording).users().messages().get(userId='me', id='missing').execute()
+    assert excinfo.value.resp.status == 404
+
+
+def test_replay_batches_pay_latency_once_and_inject_errors(recording):
+    sleeps = []
+    service = ReplayService(recording, latency=0.05, error_rate=1.0, sleep=sleeps.append)
+    results = {}
+    batch = service.new_batch_http_request(callback=lambda i, response, e: results.update({i: e}))
+    for message_id in ['1', '2']:
+        batch.add(service.users().messages().get(userId='me', id=message_id), request_id=message_id)
+
+    batch.execute()
+
+    assert sleeps == [0.05]
+    assert all(error.resp.status == 429 for error in results.values())
+    assert service.calls == 2
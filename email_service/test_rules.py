@@ -0,0 +1,117 @@
+# taskeroo/email_service/test_rules.py
+
+import sqlite3
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+from db.database import Database
+from email_service.email_service import EmailService
+from email_service.rules import Rule, RuleSet, add_rule, delete_rule, list_rules
+
+KEYWORDS = {'promotional': ['sale'], 'work': ['meeting']}
+
+EMAIL = {'subject': '[JIRA] Big sale on tickets', 'sender_email': 'Shop <deals@mail.shop.com>',
+         'email_body': 'meeting', 'label_ids': 'INBOX,CATEGORY_PROMOTIONS'}
+
+
+@pytest.fixture
+def db(tmpdir):
+    return Database(str(tmpdir.join("test_taskeroo.db")))
+
+
+def test_rules_match_on_every_condition():
+    rules = RuleSet([
+        Rule(1, 'promotional', domain='shop.com', label='category_promotions'),
+        Rule(2, 'work', subject_prefix='[jira]'),
+        Rule(3, 'social', sender='friend@example.com'),
+        Rule(4, 'updates', domain='shop.com', label='CATEGORY_UPDATES'),
+    ])
+
+    # Subdomains match, labels and subject prefixes are case-insensitive, the oldest rule wins ties
+    assert rules.match(EMAIL).id == 1
+    assert rules.match(dict(EMAIL, sender_email='deals@other.com')).id == 2
+    assert rules.match(dict(EMAIL, subject='Re: [JIRA]', sender_email='Friend@Example.com')).id == 3
+    assert rules.match(dict(EMAIL, subject='Hello', sender_email='deals@notshop.com')) is None
+
+
+def test_only_rules_indexed_under_the_email_are_checked():
+    rules = RuleSet([Rule(i, 'social', sender=f'user{i}@example.com') for i in range(1000)]
+                    + [Rule(1000, 'work', subject_prefix='[jira]', priority=5)])
+
+    assert rules.match(dict(EMAIL, sender_email='user7@example.com')).id == 1000
+    assert dict(rules.checks) == {7: 1, 1000: 1}
+    assert dict(rules.hits) == {1000: 1}
+
+
+def test_rules_need_a_condition(db):
+    with pytest.raises(ValueError):
+        RuleSet([Rule(1, 'work')])
+
+    assert Rule(1, 'work', sender='  ', domain='@Shop.com.').conditions == {'domain': 'shop.com'}
+    with pytest.raises(ValueError):
+        RuleSet([Rule(2, 'work', sender='  ')])
+
+    conn = sqlite3.connect(db.db_path)
+    with pytest.raises(ValueError):
+        add_rule(conn, 'work')
+    with pytest.raises(ValueError):
+        add_rule(conn, 'work', sender='  ', label='')
+    rule_id = add_rule(conn, 'work', sender=' Boss@Example.com ', subject_prefix='  ')
+    assert [(rule['id'], rule['sender'], rule['subject_prefix']) for rule in list_rules(conn)] == \
+        [(rule_id, 'boss@example.com', None)]
+    conn.close()
+
+
+def test_rules_run_before_keywords_and_count_hits(db):
+    conn = sqlite3.connect(db.db_path)
+    rule_id = add_rule(conn, 'finance', domain='shop.com')
+    unused_id = add_rule(conn, 'work', label='CATEGORY_PROMOTIONS', subject_prefix='invoice')
+    conn.close()
+
+    service = EmailService.parser(KEYWORDS, db=db)
+    assert service.classify(EMAIL)['primary_category'] == 'finance'
+    assert service.classify(dict(EMAIL, sender_email='a@b.com'))['primary_category'] == 'promotional'
+
+    conn = sqlite3.connect(db.db_path)
+    service.rules.flush(conn)
+    conn.commit()
+    counters = {rule['id']: (rule['hits'], rule['checks']) for rule in list_rules(conn)}
+    assert counters == {rule_id: (1, 1), unused_id: (0, 0)}
+
+    assert delete_rule(conn, rule_id)
+    assert not delete_rule(conn, rule_id)
+    conn.close()
+
+
+def test_refresh_picks_up_rules_added_by_another_process(db):
+    service = EmailService.parser(KEYWORDS, db=db)
+    assert service.classify(EMAIL)['primary_category'] == 'promotional'
+    assert service.refresh() is False
+
+    conn = sqlite3.connect(db.db_path)
+    add_rule(conn, 'finance', domain='shop.com')
+    conn.execute("UPDATE rules SET hits = hits + 1")
+    conn.commit()
+    conn.close()
+
+    assert service.refresh() is True
+    assert service.classify(EMAIL)['primary_category'] == 'finance'
+    assert service.refresh() is False
+
+
+def test_counters_survive_concurrent_matches_and_flushes():
+    rules = RuleSet([Rule(1, 'promotional', domain='shop.com')])
+    conn = Mock()
+
+    def match(worker):
+        for i in range(2000):
+            rules.match(EMAIL)
+            if worker == 0 and i % 100 == 0:
+                rules.flush(conn)
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(match, range(4)))
+    rules.flush(conn)
+
+    written = [row for call in conn.executemany.call_args_list for row in call.args[1]]
+    assert sum(row[0] for row in written) == sum(row[1] for row in written) == 8000
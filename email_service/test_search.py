@@ -0,0 +1,59 @@
+# taskeroo/email_service/test_search.py
+
+import sqlite3
+import pytest
+from db.database import Database
+from email_service.search import match_query, search_emails, rebuild_search_index
+
+
+def store(conn, email_id, subject, sender='deals@shop.com', body=''):
+    conn.execute("INSERT INTO emails (id, subject, sender_email, snippet, email_body) VALUES (?, ?, ?, '', ?)",
+                 (email_id, subject, sender, body))
+
+
+@pytest.fixture
+def conn(tmpdir):
+    db = Database(str(tmpdir.join("test_taskeroo.db")))
+    conn = sqlite3.connect(db.db_path)
+    store(conn, 'm1', 'Weekly newsletter', body='Our big summer sale starts today')
+    store(conn, 'm2', 'Summer sale: 50% off', body='Everything must go')
+    store(conn, 'm3', 'Lunch tomorrow?', sender='friend@example.com', body='Are we still on for lunch')
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_match_query_quotes_terms():
+    assert match_query('summer sale') == '"summer" "sale"'
+    assert match_query('"big sale" lun*') == '"big sale" "lun"*'
+    assert match_query('deals@shop.com OR -x') == '"deals@shop.com" "OR" "-x"'
+    assert match_query(' " * ') == ''
+
+
+def test_search_ranks_subject_matches_first_and_pages(conn):
+    result = search_emails(conn, 'summer sale')
+    assert result['total'] == 2
+    assert [email['id'] for email in result['results']] == ['m2', 'm1']
+
+    second_page = search_emails(conn, 'summer sale', page=2, per_page=1)
+    assert [email['id'] for email in second_page['results']] == ['m1']
+    assert [email['id'] for email in search_emails(conn, 'friend@example.com')['results']] == ['m3']
+    assert search_emails(conn, '')['total'] == 0
+
+    # Only the newest matches are ranked once there are more than max_ranked
+    newest = search_emails(conn, 'summer sale', max_ranked=1)
+    assert (newest['total'], newest['ranked']) == (2, 1)
+    assert [email['id'] for email in newest['results']] == ['m2']
+
+
+def test_triggers_keep_the_index_current(conn):
+    conn.execute("UPDATE emails SET subject = 'Lunch moved', reviewed = 1 WHERE id = 'm2'")
+    conn.execute("DELETE FROM emails WHERE id = 'm3'")
+    conn.commit()
+
+    assert [email['id'] for email in search_emails(conn, 'lunch')['results']] == ['m2']
+    assert [email['id'] for email in search_emails(conn, 'sale')['results']] == ['m1']
+
+    rebuild_search_index(conn)
+    conn.commit()
+    assert search_emails(conn, 'lunch')['total'] == 1
@@ -0,0 +1,115 @@
+# taskeroo/email_service/test_sender_prior.py
+
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from unittest.mock import patch
+from db.database import Database
+from email_service.email_service import EmailService
+from email_service.classifier import record_correction
+from email_service.sender_prior import SenderPriors, SenderPrior, sender_keys
+
+KEYWORDS = {'shopping': ['order', 'shipped'], 'financial': ['invoice', 'payment']}
+
+
+@pytest.fixture
+def db(tmpdir):
+    return Database(str(tmpdir.join("test_taskeroo.db")))
+
+
+def observe_many(db, priors, sender, category, count):
+    conn = db.connect()
+    for _ in range(count):
+        priors.observe(conn, {'sender_email': sender, 'category': category})
+    conn.commit()
+    conn.close()
+
+
+def test_sender_keys():
+    assert sender_keys('Shop <Orders@Shop.com>') == ['orders@shop.com', '@shop.com']
+    assert sender_keys('undisclosed') == []
+
+
+def test_shortcut_needs_enough_consistent_mail():
+    assert SenderPrior('a@x.com', counts={'shopping': 5}, emails=5).shortcut(min_emails=20) is None
+    assert SenderPrior('a@x.com', counts={'shopping': 15, 'news': 5}, emails=20).shortcut(min_emails=20) is None
+
+    shortcut = SenderPrior('a@x.com', counts={'shopping': 19, 'news': 1}, emails=20).shortcut(min_emails=20)
+    assert shortcut['primary_category'] == 'shopping'
+    assert shortcut['confidence'] == 0.95
+    assert shortcut['secondary_categories'] == ['news']
+
+
+def test_observe_updates_the_cache_and_the_table(db):
+    priors = SenderPriors(db)
+    assert priors.lookup('orders@shop.com') is None
+
+    observe_many(db, priors, 'Shop <orders@shop.com>', 'shopping', 3)
+
+    assert priors.lookup('orders@shop.com').counts == {'shopping': 3}
+    assert SenderPriors(db).lookup('orders@shop.com').emails == 3
+    # A new address falls back to its domain's prior
+    assert SenderPriors(db).lookup('deals@shop.com').key == '@shop.com'
+    assert priors.hits > 0
+
+
+def test_manual_corrections_outweigh_stored_categories(db):
+    priors = SenderPriors(db)
+    observe_many(db, priors, 'news@paper.com', 'news', 30)
+    conn = db.connect()
+    for i in range(2):
+        conn.execute("INSERT INTO emails (id, subject, sender_email) VALUES (?, 'Weekly', 'news@paper.com')", (f'm{i}',))
+        record_correction(conn, f'm{i}', 'subscriptions')
+    conn.close()
+
+    prior = SenderPriors(db).lookup('news@paper.com')
+    assert prior.manual == {'subscriptions': 2}
+    assert prior.shortcut()['primary_category'] == 'subscriptions'
+
+
+def test_classify_skips_keyword_scoring_for_settled_senders(db):
+    service = EmailService.parser(KEYWORDS, db=db)
+    observe_many(db, service.sender_priors, 'orders@shop.com', 'shopping', 20)
+
+    with patch.object(service, 'categorize_email') as categorize:
+        result = service.classify({'subject': 'Invoice', 'sender_email': 'orders@shop.com'})
+    categorize.assert_not_called()
+    assert result['primary_category'] == 'shopping'
+
+    # Below the threshold the prior is only a feature of the keyword score
+    observe_many(db, service.sender_priors, 'billing@bank.com', 'financial', 3)
+    result = service.classify({'subject': 'Your order', 'email_body': '', 'sender_email': 'billing@bank.com'})
+    assert result['all_categories'] == {'shopping': 1, 'financial': 1.0, 'Important (Non-urgent)': 0.5}
+
+
+def test_shortcut_results_are_not_counted_back_into_the_prior(db):
+    service = EmailService.parser(KEYWORDS, db=db)
+    observe_many(db, service.sender_priors, 'orders@shop.com', 'shopping', 20)
+    email = {'subject': 'Invoice', 'sender_email': 'orders@shop.com'}
+    email.update(service.categorization_columns(service.classify(email)))
+    assert email['category_source'] == 'sender_prior'
+
+    conn = db.connect()
+    service.sender_priors.observe(conn, email)
+    service.sender_priors.observe(conn, dict(email, category_source='keywords'))
+    conn.commit()
+    conn.close()
+    prior = service.sender_priors.lookup('orders@shop.com')
+    assert (prior.counts, prior.emails) == ({'shopping': 21}, 21)
+
+
+def test_lookups_from_many_threads_share_the_cache(db):
+    priors = SenderPriors(db, cache_size=4)
+    observe_many(db, priors, 'orders@shop.com', 'shopping', 3)
+    senders = [f'user{i}@site{i % 6}.com' for i in range(6)] + ['orders@shop.com']
+
+    def look_up(_):
+        for sender in senders * 10:
+            priors.lookup(sender)
+            priors.forget('user0@site0.com')
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(look_up, range(4)))
+
+    assert priors.lookup('orders@shop.com').counts == {'shopping': 3}
+    assert len(priors.cache) <= 4
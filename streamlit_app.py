@@ -1,7 +1,10 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
+from db.database import Database, connect
+from db import queries
+from config import DB_PATH
 from streamlit_float import float_init, float_css_helper
+from email_service.classifier import record_correction
 
 # Set page config at the very beginning
 st.set_page_config(layout="wide")
@@ -11,45 +14,26 @@ float_init()
 
 # Function to get a database connection
 def get_db_connection():
-    return sqlite3.connect('taskeroo.db')
-
-# Function to update the database schema
-def update_db_schema(conn):
-    cursor = conn.cursor()
-    cursor.execute("PRAGMA table_info(emails)")
-    columns = [column[1] for column in cursor.fetchall()]
-    if 'is_manual' not in columns:
-        cursor.execute("ALTER TABLE emails ADD COLUMN is_manual INTEGER DEFAULT 0")
-    if 'manually_updated_category' not in columns:
-        cursor.execute("ALTER TABLE emails ADD COLUMN manually_updated_category TEXT")
-    if 'reviewed' not in columns:
-        cursor.execute("ALTER TABLE emails ADD COLUMN reviewed INTEGER DEFAULT 0")
-    conn.commit()
-
+    # Pooled WAL connection shared with the fetcher; close() returns it to the pool
+    return connect(DB_PATH)
 
 def fetch_unreviewed_emails(conn, limit=10):
-    return pd.read_sql_query(f"""
-        SELECT id, subject, sender_email, snippet, label_ids, category, 
-               manually_updated_category, is_manual, 
-               COALESCE(manually_updated_category, category) as current_category 
-        FROM emails 
-        WHERE reviewed = 0
-        LIMIT {limit}
-    """, conn)
+    return pd.read_sql_query(queries.UNREVIEWED_EMAILS, conn, params=[limit])
     
 # Function to fetch unique labels from the database
 def fetch_unique_labels(conn):
     cursor = conn.cursor()
-    cursor.execute("SELECT DISTINCT manually_updated_category FROM emails WHERE manually_updated_category IS NOT NULL AND manually_updated_category != ''")
+    cursor.execute(queries.DISTINCT_MANUAL_CATEGORIES)
     manually_updated_categories = [row[0] for row in cursor.fetchall()]
-    cursor.execute("SELECT DISTINCT category FROM emails WHERE category IS NOT NULL AND category != ''")
+    cursor.execute(queries.DISTINCT_STORED_CATEGORIES)
     categories = [row[0] for row in cursor.fetchall()]
     return list(set(manually_updated_categories + categories))
 
 # Function to update email category in the database
 def update_email_category(conn, email_id, new_category):
+    record_correction(conn, email_id, new_category)
     cursor = conn.cursor()
-    cursor.execute("UPDATE emails SET manually_updated_category = ?, is_manual = 1, reviewed = 1 WHERE id = ?", (new_category, email_id))
+    cursor.execute("UPDATE emails SET reviewed = 1 WHERE id = ?", (email_id,))
     conn.commit()
 
 # Function to display a single email
@@ -91,7 +75,6 @@ def email_categorization_page():
              new categories and over time improve the model's performance.")
     
     conn = get_db_connection()
-    update_db_schema(conn)
     labels = fetch_unique_labels(conn)
     
     if 'emails' not in st.session_state:
@@ -131,22 +114,22 @@ def review_page():
     cursor = conn.cursor()
 
     # Total number of emails
-    cursor.execute("SELECT COUNT(*) FROM emails")
+    cursor.execute(queries.COUNT_EMAILS)
     total_emails = cursor.fetchone()[0]
     st.metric("Total Emails", total_emails)
 
     # Number of unreviewed emails
-    cursor.execute("SELECT COUNT(*) FROM emails WHERE reviewed = 0")
+    cursor.execute(queries.COUNT_UNREVIEWED)
     unreviewed_emails = cursor.fetchone()[0]
     st.metric("Unreviewed Emails", unreviewed_emails)
 
     # Number of manually categorized emails
-    cursor.execute("SELECT COUNT(*) FROM emails WHERE is_manual = 1")
+    cursor.execute(queries.COUNT_MANUAL)
     manual_categorized = cursor.fetchone()[0]
     st.metric("Manually Categorized Emails", manual_categorized)
 
     # Number of reviewed emails
-    cursor.execute("SELECT COUNT(*) FROM emails WHERE reviewed = 1")
+    cursor.execute(queries.COUNT_REVIEWED)
     reviewed_emails = cursor.fetchone()[0]
     st.metric("Reviewed Emails", reviewed_emails)
 
@@ -156,35 +139,20 @@ def review_page():
         st.metric("Percentage Manually Categorized", f"{manual_percentage:.2f}%")
 
     # Top 5 categories
-    cursor.execute("""
-        SELECT COALESCE(manually_updated_category, category) as final_category, COUNT(*) as count
-        FROM emails
-        GROUP BY final_category
-        ORDER BY count DESC
-        LIMIT 5
-    """)
-    top_categories = cursor.fetchall()
+    cursor.execute(queries.CATEGORY_COUNTS)
+    top_categories = cursor.fetchmany(5)
     st.subheader("Top 5 Categories")
     for category, count in top_categories:
         st.write(f"- {category}: {count}")
 
     # Number of unique categories
-    cursor.execute("""
-        SELECT COUNT(DISTINCT COALESCE(manually_updated_category, category))
-        FROM emails
-    """)
+    cursor.execute(queries.UNIQUE_CATEGORIES)
     unique_categories = cursor.fetchone()[0]
     st.metric("Unique Categories", unique_categories)
 
     # Recent manual categorizations
     st.subheader("Recent Manual Categorizations")
-    recent_manual = pd.read_sql_query("""
-        SELECT subject, sender_email, manually_updated_category
-        FROM emails
-        WHERE is_manual = 1
-        ORDER BY id DESC
-        LIMIT 5
-    """, conn)
+    recent_manual = pd.read_sql_query(queries.RECENT_MANUAL, conn, params=[5])
     st.dataframe(recent_manual)
 
     conn.close()
@@ -196,6 +164,8 @@ def stats_page():
 
 # Main app
 def main():
+    # Bring the schema and its indexes up to date before any page queries it
+    Database(DB_PATH)
     st.sidebar.title("Navigation")
     page = st.sidebar.radio("Go to", ["Teach", "Review", "Stats"])
     
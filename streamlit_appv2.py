@@ -6,7 +6,9 @@ from streamlit_extras.stateful_button import button
 from streamlit_extras.chart_container import chart_container
 from streamlit_option_menu import option_menu
 import pandas as pd
-import sqlite3
+from db.database import Database, connect
+from db import queries
+from config import DB_PATH, SEARCH_PAGE_SIZE
 from streamlit_float import float_init, float_css_helper
 import html
 import plotly.graph_objects as go
@@ -15,7 +17,14 @@ from urllib.parse import urlparse
 import datetime
 from collections import Counter
 import re
+import json
 from ui_review_emails import review_emails_page  # Add this import at the top
+from email_service.email_service import load_keywords
+from email_service.keyword_index import emails_matching, keyword_match_counts
+from email_service.classifier import record_correction
+from email_service.near_duplicates import categorize_cluster, mark_cluster_reviewed
+from email_service.search import search_emails
+from email_service.labels import split_labels, label_counts
 
 # Set page config at the very beginning
 st.set_page_config(layout="wide", page_title="Taskeroo - Email Categorization", page_icon="📧")
@@ -142,63 +151,82 @@ def fetch_unique_labels():
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT DISTINCT category FROM emails")
+        cursor.execute(queries.DISTINCT_CATEGORIES)
         labels = [row[0] for row in cursor.fetchall()]
         return labels
     finally:
         conn.close()
 
 def get_db_connection():
-    return sqlite3.connect('taskeroo.db', check_same_thread=False)
+    # Pooled WAL connection shared with the fetcher; close() returns it to the pool
+    return connect(DB_PATH)
 
-def fetch_unreviewed_emails(limit=10):
+def fetch_unreviewed_emails(limit=10, keyword=None):
     conn = get_db_connection()
     try:
-        query = f"""
-        SELECT id, subject, sender_email, snippet, 
-        label_ids, category, manually_updated_category, is_manual
-        FROM emails 
-        WHERE reviewed = 0
-        ORDER BY id
-        LIMIT {limit}
-        """
-        return pd.read_sql_query(query, conn)
+        # Narrow to emails containing the keyword via the keyword index
+        keyword_filter = queries.KEYWORD_FILTER if keyword else ""
+        params = [json.dumps(sorted(emails_matching(conn, keyword)))] if keyword else []
+        # One email per near-duplicate cluster, biggest clusters first
+        query = queries.UNREVIEWED_CLUSTERS.format(keyword_filter=keyword_filter)
+        return pd.read_sql_query(query, conn, params=params + [limit])
     finally:
         conn.close()
 
-def update_email_category(email_id, new_category):
+def fetch_keyword_matches(keyword, limit=50):
     conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE emails 
-            SET manually_updated_category = ?, is_manual = 1
-            WHERE id = ?
-        """, (new_category, email_id))
-        conn.commit()
+        email_ids = sorted(emails_matching(conn, keyword))
+        emails = pd.read_sql_query(queries.KEYWORD_MATCHES, conn, params=[json.dumps(email_ids), limit])
+        return len(email_ids), emails
     finally:
         conn.close()
 
-def mark_email_as_reviewed(email_id):
+def fetch_keyword_match_counts():
     conn = get_db_connection()
     try:
-        cursor = conn.cursor()
-        cursor.execute("UPDATE emails SET reviewed = 1 WHERE id = ?", (email_id,))
-        conn.commit()
+        counts = keyword_match_counts(conn, load_keywords())
+        return pd.DataFrame(sorted(counts.items(), key=lambda x: x[1], reverse=True), columns=['keyword', 'count'])
+    finally:
+        conn.close()
+
+def update_email_category(email_id, new_category, cluster_id=None):
+    conn = get_db_connection()
+    try:
+        # Stores the manual category and teaches the ml_category classifier, for the whole cluster if any
+        if cluster_id:
+            categorize_cluster(conn, cluster_id, new_category)
+        else:
+            record_correction(conn, email_id, new_category)
+    finally:
+        conn.close()
+
+def mark_email_as_reviewed(email_id, cluster_id=None):
+    conn = get_db_connection()
+    try:
+        if cluster_id:
+            mark_cluster_reviewed(conn, cluster_id)
+        else:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE emails SET reviewed = 1 WHERE id = ?", (email_id,))
+            conn.commit()
     finally:
         conn.close()
 
-def mark_all_as_reviewed(email_ids):
+def mark_all_as_reviewed(emails):
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        cursor.executemany("UPDATE emails SET reviewed = 1 WHERE id = ?", [(id,) for id in email_ids])
+        cluster_ids = [cluster_id for cluster_id in emails['cluster_id'] if pd.notna(cluster_id)]
+        cursor.executemany("UPDATE emails SET reviewed = 1 WHERE cluster_id = ?", [(id,) for id in cluster_ids])
+        cursor.executemany("UPDATE emails SET reviewed = 1 WHERE id = ?", [(id,) for id in emails['id']])
         conn.commit()
     finally:
         conn.close()
 
 def display_email(email, categories, index):
     email_id = email['id']
+    cluster_id = email['cluster_id'] if pd.notna(email['cluster_id']) and email['cluster_size'] > 1 else None
     widget_key = f"category_{email_id}"
 
     if f"category_{email_id}" not in st.session_state:
@@ -209,7 +237,7 @@ def display_email(email, categories, index):
 
     def update_category():
         new_category = st.session_state[f"select_{widget_key}"]
-        update_email_category(email_id, new_category)
+        update_email_category(email_id, new_category, cluster_id)
         st.session_state[f"category_{email_id}"]['current'] = new_category
         st.session_state.emails.loc[index, 'manually_updated_category'] = new_category
 
@@ -236,7 +264,7 @@ def display_email(email, categories, index):
             <div class="email-header">
                 <div class="email-subject">{html.escape(email["subject"])}</div>
                 <div class="email-labels">
-                    {''.join([f'<span class="email-label">{html.escape(label.strip())}</span>' for label in email['label_ids'].split(',') if email['label_ids']])}
+                    {''.join([f'<span class="email-label">{html.escape(label)}</span>' for label in split_labels(email['label_ids'])])}
                 </div>
             </div>
             <div class="email-sender">
@@ -244,6 +272,7 @@ def display_email(email, categories, index):
             </div>
             <div class="email-snippet">{html.escape(email["snippet"][:100])}...</div>
             {category_display}
+            {f'<span class="email-label">{email["cluster_size"] - 1} similar emails</span>' if cluster_id else ''}
         </div>
         """, unsafe_allow_html=True)
 
@@ -259,13 +288,13 @@ def display_email(email, categories, index):
             on_change=update_category,
         )
     with col2:
-        st.checkbox("Mark as Reviewed", key=f"review_{widget_key}", on_change=lambda: mark_as_reviewed(email_id, index))
+        st.checkbox("Mark as Reviewed", key=f"review_{widget_key}", on_change=lambda: mark_as_reviewed(email_id, index, cluster_id))
     
     # Re-render the email card after any changes
     render_email_card()
 
-def mark_as_reviewed(email_id, index):
-    mark_email_as_reviewed(email_id)
+def mark_as_reviewed(email_id, index, cluster_id=None):
+    mark_email_as_reviewed(email_id, cluster_id)
     st.session_state.emails.drop(index, inplace=True)
     #st.rerun()
 
@@ -273,9 +302,12 @@ def email_categorization_page():
     st.title('📧 Teach Email Categories')
     
     labels = fetch_unique_labels()
+    keyword = st.text_input("Only show emails matching keyword", key="teach_keyword").strip() or None
     
-    if 'emails' not in st.session_state or st.session_state.emails.empty:
-        st.session_state.emails = fetch_unreviewed_emails()
+    if ('emails' not in st.session_state or st.session_state.emails.empty
+            or st.session_state.get('emails_keyword') != keyword):
+        st.session_state.emails = fetch_unreviewed_emails(keyword=keyword)
+        st.session_state.emails_keyword = keyword
     
     if st.session_state.emails.empty:
         st.info("🎉 Great job! You've categorized all available emails. Check back later for more.")
@@ -284,8 +316,8 @@ def email_categorization_page():
             display_email(email, labels, index)
 
     if st.button("Mark All As Reviewed & Get Next Batch", type="primary"):
-        mark_all_as_reviewed(st.session_state.emails['id'].tolist())
-        st.session_state.emails = fetch_unreviewed_emails()
+        mark_all_as_reviewed(st.session_state.emails)
+        st.session_state.emails = fetch_unreviewed_emails(keyword=keyword)
         st.rerun()
 
 def email_stats_page():
@@ -303,52 +335,23 @@ def email_stats_page():
     conn = get_db_connection()
     try:
         # Category distribution
-        category_df = pd.read_sql_query("""
-            SELECT 
-                COALESCE(manually_updated_category, category) as final_category, 
-                COUNT(*) as count
-            FROM emails
-            GROUP BY final_category
-            ORDER BY count DESC
-        """, conn)
+        category_df = pd.read_sql_query(queries.CATEGORY_COUNTS, conn)
 
         # Top senders
-        top_senders = pd.read_sql_query("""
-            SELECT sender_email, COUNT(*) as count
-            FROM emails
-            GROUP BY sender_email
-            ORDER BY count DESC
-            LIMIT 10
-        """, conn)
+        top_senders = pd.read_sql_query(queries.TOP_SENDERS, conn, params=[10])
 
         # Time-based analysis
-        time_stats = pd.read_sql_query("""
-            SELECT 
-                date,
-                COUNT(*) as email_count
-            FROM emails
-            GROUP BY date
-            ORDER BY date
-        """, conn)
+        time_stats = pd.read_sql_query(queries.EMAILS_PER_DATE, conn)
         
         # Additional stats
-        manual_updates = pd.read_sql_query("SELECT COUNT(*) as count FROM emails WHERE is_manual = 1", conn).iloc[0]['count']
-        unique_stats = pd.read_sql_query("""
-            SELECT 
-                COUNT(DISTINCT sender_email) as unique_senders,
-                COUNT(DISTINCT COALESCE(manually_updated_category, category)) as unique_categories
-            FROM emails
-        """, conn)
-        emails_with_attachments = pd.read_sql_query("""
-            SELECT COUNT(*) as count
-            FROM emails
-            WHERE attachment_info IS NOT NULL AND attachment_info != ''
-        """, conn).iloc[0]['count']
-        avg_email_length = pd.read_sql_query("""
-            SELECT AVG(LENGTH(email_body)) as avg_length
-            FROM emails
-        """, conn).iloc[0]['avg_length']
-        subject_words = pd.read_sql_query("SELECT subject FROM emails", conn)
+        manual_updates = pd.read_sql_query(queries.COUNT_MANUAL, conn).iloc[0]['count']
+        # Each distinct count walks its own index instead of one scan of the whole table
+        unique_senders = pd.read_sql_query(queries.UNIQUE_SENDERS, conn).iloc[0]['unique_senders']
+        unique_categories = pd.read_sql_query(queries.UNIQUE_CATEGORIES, conn).iloc[0]['unique_categories']
+        emails_with_attachments = pd.read_sql_query(queries.COUNT_WITH_ATTACHMENTS, conn).iloc[0]['count']
+        avg_email_length = pd.read_sql_query(queries.AVERAGE_BODY_LENGTH, conn).iloc[0]['avg_length']
+        subject_words = pd.read_sql_query(queries.SUBJECTS, conn)
+        labels_df = pd.DataFrame(list(label_counts(conn).items()), columns=['label', 'count'])
 
     finally:
         conn.close()
@@ -367,13 +370,18 @@ def email_stats_page():
     st.subheader("Additional Statistics")
     col1, col2, col3 = st.columns(3)
     col1.metric("Manual Updates", f"{manual_updates:,}")
-    col2.metric("Unique Senders", f"{unique_stats['unique_senders'].iloc[0]:,}")
-    col3.metric("Unique Categories", f"{unique_stats['unique_categories'].iloc[0]:,}")
+    col2.metric("Unique Senders", f"{unique_senders:,}")
+    col3.metric("Unique Categories", f"{unique_categories:,}")
 
     col1, col2 = st.columns(2)
     col1.metric("Emails with Attachments", f"{emails_with_attachments:,}")
     col2.metric("Avg Email Length", f"{avg_email_length:.0f} characters")
 
+    # Emails per Gmail label, from the label bitmask and email_labels
+    st.subheader("Emails per Label")
+    fig = px.bar(labels_df.head(20), x='label', y='count', title='Emails per Label')
+    st.plotly_chart(fig)
+
     # Most common words in subject
     words = [word.lower() for subject in subject_words['subject'] for word in re.findall(r'\w+', subject)]
     word_counts = Counter(words).most_common(10)
@@ -383,6 +391,18 @@ def email_stats_page():
     fig = px.bar(common_words_df, x='word', y='count', title='Top 10 Words in Subject Lines')
     st.plotly_chart(fig)
 
+    # Keyword matches, answered from the keyword index
+    st.subheader("Keyword Matches")
+    keyword_counts = fetch_keyword_match_counts()
+    fig = px.bar(keyword_counts.head(15), x='keyword', y='count', title='Emails Matching Each Keyword')
+    st.plotly_chart(fig)
+
+    keyword = st.text_input("Which emails matched keyword", key="stats_keyword").strip()
+    if keyword:
+        match_count, matches = fetch_keyword_matches(keyword)
+        st.metric(f"Emails matching '{keyword}'", f"{match_count:,}")
+        st.dataframe(matches)
+
     # Derived stats
     st.subheader("Derived Statistics")
     if total_emails > 0:
@@ -396,13 +416,46 @@ def email_stats_page():
         estimated_time_to_complete = unreviewed_emails * 0.5  # Assuming 30 seconds per email
         st.metric("Estimated Time to Complete Review", f"{estimated_time_to_complete:.1f} minutes")
 
+def search_page():
+    st.title("🔎 Search Emails")
+    query = st.text_input("Search subject, sender and body", key="search_query",
+                          help='All words must match. Quote "a phrase", end a word with * to match by prefix.').strip()
+    if not query:
+        return
+
+    page = st.session_state.get('search_page', 1)
+    if st.session_state.get('search_last_query') != query:
+        page = 1
+    st.session_state.search_last_query = query
+
+    conn = get_db_connection()
+    try:
+        result = search_emails(conn, query, page, SEARCH_PAGE_SIZE)
+    finally:
+        conn.close()
+
+    pages = max(1, -(-result['ranked'] // SEARCH_PAGE_SIZE))
+    newest = f" (the newest {result['ranked']:,} ranked)" if result['ranked'] < result['total'] else ''
+    st.write(f"{result['total']:,} matches{newest}, page {page} of {pages}")
+    if result['results']:
+        st.dataframe(pd.DataFrame(result['results']).drop(columns=['rank']), use_container_width=True)
+
+    col1, col2 = st.columns(2)
+    if col1.button("Previous", disabled=page <= 1):
+        st.session_state.search_page = page - 1
+        st.rerun()
+    if col2.button("Next", disabled=page >= pages):
+        st.session_state.search_page = page + 1
+        st.rerun()
+    st.session_state.search_page = page
+
 def get_email_stats():
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT COUNT(*) FROM emails")
+        cursor.execute(queries.COUNT_EMAILS)
         total_emails = cursor.fetchone()[0]
-        cursor.execute("SELECT COUNT(*) FROM emails WHERE reviewed = 0")
+        cursor.execute(queries.COUNT_UNREVIEWED)
         unreviewed_emails = cursor.fetchone()[0]
         reviewed_emails = total_emails - unreviewed_emails
         review_progress = (reviewed_emails / total_emails) * 100 if total_emails > 0 else 0
@@ -411,13 +464,15 @@ def get_email_stats():
         conn.close()
 
 def main():
+    # Bring the schema and its indexes up to date before any page queries it
+    Database(DB_PATH)
     total_emails, unreviewed_emails, review_progress = get_email_stats()
     
     with st.sidebar:
         selected = option_menu(
             "Main Menu",
-            ["Teach", "Stats", "Review Emails"],  # Add "Review" to the menu options
-            icons=['pencil-square', 'graph-up', 'envelope-open'],  # Add an icon for Review
+            ["Teach", "Stats", "Review Emails", "Search"],  # Add "Review" to the menu options
+            icons=['pencil-square', 'graph-up', 'envelope-open', 'search'],  # Add an icon for Review
             menu_icon="cast",
             default_index=0,
             key="main_menu"
@@ -438,6 +493,8 @@ def main():
         email_stats_page()
     elif selected == "Review Emails":  # Add this condition
         review_emails_page()
+    elif selected == "Search":
+        search_page()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
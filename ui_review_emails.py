@@ -1,25 +1,19 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
 import html
 import json
 from config import MAX_FETCH_EMAILS, DB_PATH
+from db.database import connect
+from db import queries
 
 def get_db_connection():
-    return sqlite3.connect(DB_PATH, check_same_thread=False)
+    # Pooled WAL connection shared with the fetcher; close() returns it to the pool
+    return connect(DB_PATH)
 
 def fetch_reviewed_emails(offset=0):
     conn = get_db_connection()
     try:
-        query = f"""
-        SELECT *
-        FROM emails 
-        WHERE reviewed = 1
-        ORDER BY id DESC
-        LIMIT {MAX_FETCH_EMAILS}
-        OFFSET {offset}
-        """
-        return pd.read_sql_query(query, conn)
+        return pd.read_sql_query(queries.REVIEWED_EMAILS, conn, params=[MAX_FETCH_EMAILS, offset])
     finally:
         conn.close()
         
@@ -39,6 +33,7 @@ def display_reviewed_email(email):
             <tr><td>Label IDs</td><td>{html.escape(str(email["label_ids"]))}</td></tr>
             <tr><td>Category</td><td>{html.escape(str(email["category"]))}</td></tr>
             <tr><td>ML Category</td><td>{html.escape(str(email["ml_category"]))}</td></tr>
+            <tr><td>ML Confidence</td><td>{email["ml_confidence"]}</td></tr>
             <tr><td>Confidence Score</td><td>{email["confidence_score"]}</td></tr>
             <tr><td>Secondary Categories</td><td>{html.escape(str(email["secondary_categories"]))}</td></tr>
             <tr><td>All Categories</td><td>{html.escape(str(email["all_categories"]))}</td></tr>